@@ -0,0 +1,213 @@
+"""
+Headless entry point: python -m BackUpManeger <command> [options]
+
+    incremental [--force]        incremental backup of handle_path into temp_save_path
+    external DEST                full backup to DEST (a drive or folder)
+    cleanup [--dry-run]          apply the retention policy
+    verify [ARCHIVE ...]         re-read archives (or snapshots) and check their checksums
+    scrub [--all]                verify archives that are due (or all of them)
+    list                         catalogued backups
+    restore DEST PATH [PATH ...] restore files or folders from the merged backups (or the newest snapshot)
+    daemon [--external]          keep running and do all of the above on schedule
+    agent [--listen ADDRESS]     serve backup requests from workstations (run on the storage host)
+    audit [filters]              recent audit log events, newest first
+
+incremental --agent ADDRESS hands the backup to an agent with the files
+that changed since the last run, from a local index of handle_path, or
+with --paths listing them explicitly. Both sides read
+agent_secret from the configuration; an agent listening on a network
+address refuses to start without one, and only writes external backups
+and restores under agent_dest_roots.
+"""
+import sys
+import time
+import argparse
+import datetime
+
+from .engine import BackupEngine, CONFIG_PATH
+from .daemon import BackupDaemon, log
+from .agent import AgentJob, AgentError, agent_incremental_job, create_server, DEFAULT_ADDRESS
+from .auditlog import format_record
+
+
+def progress_printer():
+    last = [None]
+
+    def on_status(text):
+        if text != last[0]:
+            last[0] = text
+            log(text)
+    return on_status
+
+
+def run_job(engine, job):
+    try:
+        success, message = engine.run_job(job, on_status=progress_printer())
+    except KeyboardInterrupt:
+        job.stop()
+        return 1
+    if message:
+        log(message.replace("\n", " "))
+    return 0 if success else 1
+
+
+def cmd_incremental(engine, args):
+    if not args.force and time.time() < engine.incremental_due():
+        due = datetime.datetime.fromtimestamp(engine.incremental_due())
+        log(f"Not due until {due:%Y-%m-%d %H:%M}, use --force to run anyway")
+        return 0
+    engine.log_audit("Check Regular Backup", "Triggered", "Command line")
+    address = args.agent or engine.config.get("agent_address")
+    if address:
+        # The agent cleans up on its side after a successful backup
+        if not args.paths:
+            return run_job(engine, agent_incremental_job(engine, address, "Command line"))
+        request = {"op": "incremental", "reason": "Command line", "paths": args.paths,
+                   "user": engine.config.get("current_username")}
+        return run_job(engine, AgentJob(address, request, engine.config.get("agent_secret")))
+    code = run_job(engine, engine.incremental_job("Command line", paths=args.paths))
+    if code == 0:
+        engine.cleanup()
+    return code
+
+
+def cmd_external(engine, args):
+    return run_job(engine, engine.external_job(args.dest))
+
+
+def cmd_cleanup(engine, args):
+    plan = engine.cleanup(dry_run=args.dry_run)
+    print(plan.report())
+    return 0
+
+
+def cmd_verify(engine, args):
+    results = engine.verify(args.archives or None)
+    if not results:
+        log("Nothing to verify")
+        return 1
+    bad = 0
+    for name, problems in results.items():
+        print(f"{'CORRUPT' if problems else 'OK':8} {name}")
+        for arcname, problem in problems:
+            print(f"         {arcname}: {problem}")
+        bad += bool(problems)
+    return 1 if bad else 0
+
+
+def cmd_scrub(engine, args):
+    return run_job(engine, engine.scrub_job(0 if args.all else None))
+
+
+def cmd_list(engine, args):
+    catalog = engine.get_catalog().sync(engine.get_snapshot_store())
+    for entry in catalog.sorted_entries():
+        date = datetime.datetime.fromtimestamp(entry["mtime"]).strftime("%Y-%m-%d %H:%M")
+        state = "corrupt" if entry.get("problems") else ""
+        print(f"{date}  {entry['size'] / (1024 * 1024):10.2f} MB  {entry['files']:7} files  {entry['type']:11} {entry['name']} {state}")
+    return 0
+
+
+def cmd_restore(engine, args):
+    return run_job(engine, engine.restore_job(args.paths, args.dest, args.source))
+
+
+def cmd_daemon(engine, args):
+    BackupDaemon(engine, external=args.external).serve()
+    return 0
+
+
+def cmd_agent(engine, args):
+    address = args.listen or engine.config.get("agent_listen", DEFAULT_ADDRESS)
+    try:
+        server = create_server(engine, address)
+    except (AgentError, OSError) as e:
+        log(f"Unable to start the backup agent: {e}")
+        return 1
+    log(f"Backup agent listening on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_audit(engine, args):
+    since = datetime.datetime.strptime(args.since, "%Y-%m-%d").timestamp() if args.since else None
+    records = engine.query_audit(user=args.user, action=args.action, status=args.status, since=since, limit=args.limit)
+    for record in reversed(records):
+        print(format_record(record))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m BackUpManeger", description="Headless loud2 backup manager")
+    parser.add_argument("--config", default=CONFIG_PATH, help="configuration.json to use")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("incremental", help="incremental backup into temp_save_path")
+    p.add_argument("--force", action="store_true", help="run even if the 48h interval has not passed")
+    p.add_argument("--agent", help="backup agent address (socket path or host:port), overrides agent_address")
+    p.add_argument("--paths", nargs="+", help="only check these files or folders, relative to handle_path")
+    p.set_defaults(func=cmd_incremental)
+
+    p = commands.add_parser("external", help="full backup to a drive or folder")
+    p.add_argument("dest")
+    p.set_defaults(func=cmd_external)
+
+    p = commands.add_parser("cleanup", help="apply the retention policy")
+    p.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    p.set_defaults(func=cmd_cleanup)
+
+    p = commands.add_parser("verify", help="check archive checksums")
+    p.add_argument("archives", nargs="*", help="archive or snapshot names, all catalogued ones by default")
+    p.set_defaults(func=cmd_verify)
+
+    p = commands.add_parser("scrub", help="throttled verification of archives that are due")
+    p.add_argument("--all", action="store_true", help="verify every archive regardless of when it was last checked")
+    p.set_defaults(func=cmd_scrub)
+
+    p = commands.add_parser("list", help="list catalogued backups")
+    p.set_defaults(func=cmd_list)
+
+    p = commands.add_parser("restore", help="restore files or folders")
+    p.add_argument("--source", help="backup folder, temp_save_path by default")
+    p.add_argument("dest")
+    p.add_argument("paths", nargs="+", help="paths relative to the backed up project")
+    p.set_defaults(func=cmd_restore)
+
+    p = commands.add_parser("daemon", help="run scheduled backups until stopped")
+    p.add_argument("--external", action="store_true", help="full backup to removable drives when they are plugged in")
+    p.set_defaults(func=cmd_daemon)
+
+    p = commands.add_parser("agent", help="serve backup requests on the storage host")
+    p.add_argument("--listen", help=f"socket path or host:port, default {DEFAULT_ADDRESS}")
+    p.set_defaults(func=cmd_agent)
+
+    p = commands.add_parser("audit", help="show audit log events")
+    p.add_argument("--user")
+    p.add_argument("--action", help='e.g. "Incremental Backup"')
+    p.add_argument("--status", help="e.g. Failed")
+    p.add_argument("--since", help="YYYY-MM-DD")
+    p.add_argument("--limit", type=int, default=50, help="most recent events to show (default 50)")
+    p.set_defaults(func=cmd_audit)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        engine = BackupEngine.from_file(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Unable to read configuration {args.config}: {e}", file=sys.stderr)
+        return 2
+    try:
+        return args.func(engine, args)
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+import os
+import hmac
+import json
+import socket
+import threading
+import socketserver
+
+try:
+    from .engine import Job
+    from .fileindex import FileIndex, INDEX_FILE_NAME
+except ImportError:
+    from engine import Job
+    from fileindex import FileIndex, INDEX_FILE_NAME
+
+# POSIX storage hosts listen on a Unix socket; elsewhere on loopback TCP
+DEFAULT_ADDRESS = "/tmp/loud2_backup_agent.sock" if hasattr(socket, "AF_UNIX") else "127.0.0.1:47820"
+SOCKET_MODE = 0o660
+CONNECT_TIMEOUT = 10.0
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+# Operations that write to a destination named in the request
+DEST_OPS = ("external", "restore")
+# Workstation's own index of handle_path, for the manifest of changed paths
+DEFAULT_MANIFEST_INDEX = os.path.join(os.path.expanduser("~"), ".loud2_backup", INDEX_FILE_NAME)
+
+
+class AgentError(Exception):
+    pass
+
+
+def parse_address(address):
+    # "/path/to.sock" or "unix:/path/to.sock" -> (AF_UNIX, path); "host:port" -> (AF_INET, (host, port))
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    if address.startswith("/"):
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def send_message(sock_file, message):
+    sock_file.write((json.dumps(message) + "\n").encode("utf-8"))
+    sock_file.flush()
+
+
+# ---------------------------------------------------------------------------
+# Server (runs on the storage host)
+# ---------------------------------------------------------------------------
+class AgentHandler(socketserver.StreamRequestHandler):
+    """
+    One request per connection: a JSON line naming the operation, answered by
+    a stream of JSON event lines ending with {"event": "done"}. While the job
+    runs the client may send "pause", "resume" or "cancel"; closing the
+    connection cancels too.
+    """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        server = self.server
+        if not isinstance(request, dict) or not server.authorized(request):
+            peer = self.client_address[0] if isinstance(self.client_address, tuple) else "local socket"
+            server.engine.log_audit("Backup Agent", "Rejected", f"Unauthorized request from {peer}")
+            send_message(self.wfile, {"event": "done", "success": False, "message": "Not authorized"})
+            return
+        try:
+            job = server.build_job(request)
+        except (KeyError, ValueError) as e:
+            send_message(self.wfile, {"event": "done", "success": False, "message": f"Bad request: {e}"})
+            return
+
+        write_lock = threading.Lock()
+
+        def emit(event, **fields):
+            fields["event"] = event
+            with write_lock:
+                try:
+                    send_message(self.wfile, fields)
+                except OSError:
+                    job.stop()
+
+        job.progress.connect(lambda value: emit("progress", value=value))
+        job.status.connect(lambda text: emit("status", text=text))
+        job.audit.connect(lambda action, status, details: emit("audit", action=action, status=status, details=details))
+        job.audit.connect(server.engine.log_audit)
+        job.done.connect(lambda success, message: emit("result", success=success, message=message, skipped=job.skipped))
+
+        threading.Thread(target=self.read_controls, args=(job,), daemon=True).start()
+
+        # One job at a time on the storage host, later requests wait their turn
+        with server.job_lock:
+            emit("status", text="Running on backup agent...")
+            server.current = job
+            try:
+                job.run()
+                if job.kind == "incremental" and job.is_running:
+                    server.engine.cleanup(job.temp_path)
+            except Exception as e:
+                emit("result", success=False, message=f"Agent error: {e}")
+            finally:
+                server.current = None
+        emit("done")
+
+    def read_controls(self, job):
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:
+                line = b""
+            if not line:
+                job.stop()
+                return
+            try:
+                op = json.loads(line).get("op")
+            except ValueError:
+                continue
+            if op == "cancel":
+                job.stop()
+            elif op == "pause":
+                job.pause()
+            elif op == "resume":
+                job.resume()
+
+
+class _AgentServerMixin:
+    """
+    Every request carries the agent_secret of the configuration. Requests
+    that write to a "dest" of their own are only run when dest lies under
+    one of agent_dest_roots; without roots they are refused from the
+    network and only the local socket may send them.
+    """
+    daemon_threads = True
+    # Reachable from other machines, set by create_server
+    remote = False
+
+    def setup_agent(self, engine):
+        self.engine = engine
+        self.job_lock = threading.Lock()
+        self.current = None
+        self.secret = engine.config.get("agent_secret") or ""
+        self.dest_roots = [os.path.realpath(root) for root in engine.config.get("agent_dest_roots", [])]
+
+    def authorized(self, request):
+        if not self.secret:
+            return not self.remote
+        return hmac.compare_digest(str(request.get("secret", "")).encode("utf-8"), self.secret.encode("utf-8"))
+
+    def check_dest(self, dest):
+        real = os.path.realpath(dest)
+        for root in self.dest_roots:
+            if real == root or real.startswith(root.rstrip(os.sep) + os.sep):
+                return dest
+        if self.dest_roots:
+            raise ValueError(f"{dest} is outside agent_dest_roots")
+        if self.remote:
+            raise ValueError("destinations are only accepted over the network with agent_dest_roots set")
+        return dest
+
+    def build_job(self, request):
+        # Paths in requests are relative to the backed up project, so the
+        # workstation's drive letters never need to exist on the storage host
+        op = request["op"]
+        if op in DEST_OPS:
+            self.check_dest(request["dest"])
+        if op == "incremental":
+            return self.engine.incremental_job(request.get("reason", "Agent request"),
+                                               paths=request.get("paths"), username=request.get("user"))
+        if op == "external":
+            return self.engine.external_job(request["dest"])
+        if op == "scrub":
+            return self.engine.scrub_job(request.get("interval_hours"))
+        if op == "restore":
+            return self.engine.restore_job(request["paths"], request["dest"])
+        raise ValueError(f"unknown operation {op!r}")
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class UnixAgentServer(_AgentServerMixin, socketserver.ThreadingUnixStreamServer):
+        pass
+
+
+class TcpAgentServer(_AgentServerMixin, socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+def create_server(engine, address=DEFAULT_ADDRESS):
+    """
+    Agent server listening on address. Raises AgentError when it would be
+    reachable from the network without an agent_secret configured.
+    """
+    family, target = parse_address(address)
+    if family == socket.AF_INET:
+        remote = target[0] not in LOOPBACK_HOSTS
+        if remote and not engine.config.get("agent_secret"):
+            raise AgentError(f"Set agent_secret in the configuration to listen on {address}")
+        server = TcpAgentServer(target, AgentHandler)
+        server.remote = remote
+    else:
+        if os.path.exists(target):
+            os.remove(target)
+        server = UnixAgentServer(target, AgentHandler)
+        os.chmod(target, SOCKET_MODE)
+    server.setup_agent(engine)
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Client (runs on the workstation)
+# ---------------------------------------------------------------------------
+class AgentJob(Job):
+    """
+    Job that runs on the backup agent. Only the request and the event stream
+    cross the network; the agent reads and writes the files on its own disks.
+    secret is the agent_secret the agent was configured with.
+    """
+
+    def __init__(self, address, request, secret=None):
+        super().__init__()
+        self.address = address
+        self.request = request
+        self.secret = secret
+        self.kind = request["op"]
+        self.sock = None
+        self.sock_file = None
+        self.send_lock = threading.Lock()
+
+    def connect(self):
+        family, target = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(target)
+        except OSError as e:
+            sock.close()
+            raise AgentError(f"Backup agent not reachable at {self.address}: {e}")
+        sock.settimeout(None)
+        return sock
+
+    def send(self, message):
+        with self.send_lock:
+            if self.sock_file is not None:
+                try:
+                    send_message(self.sock_file, message)
+                except OSError:
+                    pass
+
+    def run(self):
+        try:
+            self.sock = self.connect()
+            self.sock_file = self.sock.makefile("rwb")
+            self.send(dict(self.request, secret=self.secret) if self.secret else self.request)
+            result = None
+            for line in self.sock_file:
+                event = json.loads(line)
+                kind = event.pop("event")
+                if kind == "progress":
+                    self.progress.emit(event["value"])
+                elif kind == "status":
+                    self.status.emit(event["text"])
+                elif kind == "audit":
+                    # Already written to the audit log on the agent side
+                    self.status.emit(f"{event['action']}: {event['status']}")
+                elif kind == "result":
+                    result = (event["success"], event["message"])
+                    self.skipped = event.get("skipped", False)
+                elif kind == "done":
+                    # Rejected requests end with their reason on the done event
+                    if "success" in event:
+                        result = (event["success"], event["message"])
+                    break
+            if result is not None:
+                self.completed(result[0])
+                self.done.emit(*result)
+            elif self.is_running:
+                self.done.emit(False, "Backup agent closed the connection")
+        except (AgentError, OSError, ValueError) as e:
+            self.audit.emit("Backup Agent", "Failed", str(e))
+            self.done.emit(False, str(e))
+        finally:
+            if self.sock is not None:
+                self.sock.close()
+            self.finished.emit()
+
+    def completed(self, success):
+        # The agent reported its result, before done is emitted
+        pass
+
+    def stop(self):
+        super().stop()
+        self.send({"op": "cancel"})
+
+    def pause(self):
+        super().pause()
+        self.send({"op": "pause"})
+
+    def resume(self):
+        super().resume()
+        self.send({"op": "resume"})
+
+
+class AgentIncrementalJob(AgentJob):
+    """
+    Incremental backup on the agent, sent with the paths that changed since
+    the last one so the agent only stats those. The changes come from this
+    workstation's own FileIndex of handle_path, which is committed once the
+    agent reports success; a failed run sends the same paths again. Without
+    an index yet the request goes without paths and the agent scans it all.
+    """
+
+    def __init__(self, address, request, index, rules=None, trust_dir_mtime=False, secret=None):
+        super().__init__(address, request, secret)
+        self.index = index
+        self.rules = rules
+        self.trust_dir_mtime = trust_dir_mtime
+        self.scan = None
+
+    def run(self):
+        self.status.emit("Scanning project for changes...")
+        first_run = not self.index.exists()
+        try:
+            self.scan = self.index.scan(trust_dir_mtime=self.trust_dir_mtime, should_stop=self.should_stop,
+                                        rules=self.rules)
+        except OSError as e:
+            print(f"Change scan failed, the agent scans everything: {e}")
+        if not self.is_running:
+            self.status.emit("Backup Cancelled.")
+            self.audit.emit("Incremental Backup", "Cancelled", self.request.get("reason", ""))
+            self.finished.emit()
+            return
+        if self.scan is not None and not first_run:
+            self.request["paths"] = sorted({rel for rel, _, _ in self.scan.changed} | set(self.scan.deleted))
+        super().run()
+
+    def completed(self, success):
+        # A skipped backup wrote nothing: keep the changes for the next request
+        if success and not self.skipped and self.scan is not None:
+            os.makedirs(os.path.dirname(self.index.index_path), exist_ok=True)
+            self.index.commit(self.scan)
+
+
+def agent_incremental_job(engine, address, reason="", username=None):
+    # AgentIncrementalJob for the engine's handle_path, index in agent_manifest_index
+    config = engine.config
+    index = FileIndex(config.get("agent_manifest_index", DEFAULT_MANIFEST_INDEX), config.get("handle_path"))
+    request = {"op": "incremental", "reason": reason, "user": username or config.get("current_username")}
+    return AgentIncrementalJob(address, request, index, rules=engine.get_rules(),
+                               trust_dir_mtime=config.get("index_trust_dir_mtime", False),
+                               secret=config.get("agent_secret"))
@@ -0,0 +1,522 @@
+import os
+import json
+import time
+import zlib
+import struct
+import hashlib
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .throttle import io_priority
+except ImportError:
+    from throttle import io_priority
+
+# ---------------------------------------------------------------------------
+# Parallel zip writer
+# ---------------------------------------------------------------------------
+# Files are cut into blocks that are deflated independently on a thread pool
+# (zlib releases the GIL) and written back in order by a single writer thread,
+# pigz style: every block but the last ends on a sync flush, and each block is
+# primed with the last 32 KB of the previous one so the ratio stays close to a
+# single-stream deflate. The result is a plain zip that zipfile and any other
+# tool reads normally.
+
+BLOCK_SIZE = 1024 * 1024
+DICT_SIZE = 32 * 1024
+COMPRESS_LEVEL = 6
+
+# Already compressed formats, deflating them only burns CPU
+STORE_EXTENSIONS = {
+    ".exr", ".jpg", ".jpeg", ".png", ".usdc", ".zip", ".abc",
+    ".mp4", ".mov", ".gz", ".7z", ".rar", ".bgeo.sc", ".sc", ".tx", ".rat",
+}
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+# Reserve a zip64 extra in the local header above this size: deflate can grow
+# incompressible data slightly, so leave some headroom under 4 GB
+ZIP64_LOCAL_THRESHOLD = ZIP64_LIMIT - 64 * 1024 * 1024
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<IHHHHIIH")
+END_RECORD64 = struct.Struct("<IQHHIIQQQQ")
+END_LOCATOR64 = struct.Struct("<IIQI")
+
+LOCAL_SIG = 0x04034b50
+CENTRAL_SIG = 0x02014b50
+END_SIG = 0x06054b50
+END64_SIG = 0x06064b50
+LOCATOR64_SIG = 0x07064b50
+
+FLAG_UTF8 = 0x800
+CREATE_SYSTEM = 0 if os.name == "nt" else 3
+
+
+def should_store(arcname, store_extensions=STORE_EXTENSIONS):
+    name = arcname.lower()
+    return any(name.endswith(ext) for ext in store_extensions)
+
+
+def dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def deflate_block(data, level, zdict, final):
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class ArchiveMember:
+    # One per member stays in memory until the central directory is written
+    __slots__ = ("arcname", "name_bytes", "method", "mtime", "mode", "zip64_local",
+                 "offset", "crc", "size", "compress_size", "sha256")
+
+    def __init__(self, arcname, method, mtime, mode, size_hint=0):
+        self.arcname = arcname
+        self.name_bytes = arcname.encode("utf-8")
+        self.method = method
+        self.mtime = mtime
+        self.mode = mode
+        self.zip64_local = size_hint >= ZIP64_LOCAL_THRESHOLD
+        self.offset = 0
+        self.crc = 0
+        self.size = 0
+        self.compress_size = 0
+        self.sha256 = None
+
+    def to_dict(self):
+        return {
+            "name": self.arcname,
+            "offset": self.offset,
+            "method": self.method,
+            "crc": self.crc,
+            "size": self.size,
+            "compress_size": self.compress_size,
+            "mtime": self.mtime,
+            "mode": self.mode,
+            "sha256": self.sha256,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        member = cls(data["name"], data["method"], data["mtime"], data["mode"])
+        for key in ("offset", "crc", "size", "compress_size", "sha256"):
+            setattr(member, key, data[key])
+        return member
+
+
+class ArchiveWriter:
+    def __init__(self, path, workers=None, level=COMPRESS_LEVEL, block_size=BLOCK_SIZE,
+                 store_extensions=STORE_EXTENSIONS, read_limiter=None, write_limiter=None, priority=None):
+        # read_limiter/write_limiter: optional throttle.RateLimiter for source reads and archive writes;
+        # priority: I/O priority of the writer thread (throttle.io_priority)
+        self.path = path
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter
+        self.priority = priority
+        self.level = level
+        self.block_size = block_size
+        self.store_extensions = store_extensions
+        self.workers = workers or os.cpu_count() or 4
+        self.members = []
+
+        self.f = self._open_file()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="deflate")
+        # Bounds memory: at most this many raw/compressed blocks are in flight
+        self.tasks = queue.Queue(maxsize=self.workers * 4)
+        self.error = None
+        self.closed = False
+        self.writer = threading.Thread(target=self._write_loop, name="archive-writer", daemon=True)
+        self.writer.start()
+
+    def _open_file(self):
+        return open(self.path, "wb", buffering=BLOCK_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # -------------------------
+    # Producer side (caller thread)
+    # -------------------------
+    def _put(self, task):
+        while True:
+            if self.error:
+                raise self.error
+            try:
+                self.tasks.put(task, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def add_file(self, file_path, arcname, level=None, should_stop=None):
+        st = os.stat(file_path)
+        level = self.level if level is None else level
+        store = level == 0 or should_store(arcname, self.store_extensions)
+        member = ArchiveMember(arcname, METHOD_STORED if store else METHOD_DEFLATED,
+                               st.st_mtime, st.st_mode, st.st_size)
+
+        crc = 0
+        size = 0
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as src:
+            self._put(("begin", member))
+            block = self._read(src, should_stop)
+            zdict = None
+            while True:
+                next_block = self._read(src, should_stop) if block else b""
+                final = not next_block
+                crc = zlib.crc32(block, crc)
+                sha.update(block)
+                size += len(block)
+                if store:
+                    self._put(("data", block))
+                else:
+                    self._put(("data", self.pool.submit(deflate_block, block, level, zdict, final)))
+                    zdict = block[-DICT_SIZE:] if block else None
+                if final:
+                    break
+                if should_stop and should_stop():
+                    raise InterruptedError("Archive cancelled")
+                block = next_block
+
+        member.sha256 = sha.hexdigest()
+        self._put(("end", member, crc, size))
+        return member
+
+    def _read(self, src, should_stop):
+        block = src.read(self.block_size)
+        if self.read_limiter and block:
+            self.read_limiter.consume(len(block), should_stop)
+        return block
+
+    def writestr(self, arcname, data, level=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        level = self.level if level is None else level
+        member = ArchiveMember(arcname, METHOD_DEFLATED if level else METHOD_STORED,
+                               time.time(), 0o100644, len(data))
+        member.sha256 = hashlib.sha256(data).hexdigest()
+        self._put(("begin", member))
+        self._put(("data", deflate_block(data, level, None, True) if level else data))
+        self._put(("end", member, zlib.crc32(data), len(data)))
+        return member
+
+    # -------------------------
+    # Writer thread
+    # -------------------------
+    def _write_loop(self):
+        with io_priority(self.priority):
+            self._write_tasks()
+
+    def _write_tasks(self):
+        current = None
+        compress_size = 0
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            if self.error:
+                continue
+            try:
+                kind = task[0]
+                if kind == "begin":
+                    current = task[1]
+                    compress_size = 0
+                    current.offset = self.f.tell()
+                    self.f.write(self._local_header(current))
+                elif kind == "data":
+                    data = task[1]
+                    if not isinstance(data, (bytes, bytearray)):
+                        data = data.result()
+                    if self.write_limiter:
+                        self.write_limiter.consume(len(data))
+                    self.f.write(data)
+                    compress_size += len(data)
+                elif kind == "end":
+                    member, crc, size = task[1], task[2], task[3]
+                    member.crc = crc
+                    member.size = size
+                    member.compress_size = compress_size
+                    self._patch_local_header(member)
+                    self.members.append(member)
+                    self._member_written(member)
+            except BaseException as e:
+                self.error = e
+
+    def _member_written(self, member):
+        # Hook for subclasses (checkpointing), runs on the writer thread
+        pass
+
+    def _local_header(self, member):
+        dos_time, dos_date = dos_datetime(member.mtime)
+        extra = b""
+        if member.zip64_local:
+            extra = struct.pack("<HHQQ", 1, 16, 0, 0)
+            sizes = (ZIP64_LIMIT, ZIP64_LIMIT)
+            version = 45
+        else:
+            sizes = (0, 0)
+            version = 20
+        header = LOCAL_HEADER.pack(LOCAL_SIG, version, FLAG_UTF8, member.method, dos_time, dos_date,
+                                   0, sizes[0], sizes[1], len(member.name_bytes), len(extra))
+        return header + member.name_bytes + extra
+
+    def _patch_local_header(self, member):
+        end = self.f.tell()
+        if member.zip64_local:
+            self.f.seek(member.offset + 14)
+            self.f.write(struct.pack("<I", member.crc))
+            self.f.seek(member.offset + LOCAL_HEADER.size + len(member.name_bytes) + 4)
+            self.f.write(struct.pack("<QQ", member.size, member.compress_size))
+        else:
+            if member.size >= ZIP64_LIMIT or member.compress_size >= ZIP64_LIMIT:
+                raise OverflowError(f"{member.arcname} grew past 4 GB without a zip64 header")
+            self.f.seek(member.offset + 14)
+            self.f.write(struct.pack("<III", member.crc, member.compress_size, member.size))
+        self.f.seek(end)
+
+    # -------------------------
+    # Finish
+    # -------------------------
+    def _central_directory(self):
+        records = []
+        for member in self.members:
+            dos_time, dos_date = dos_datetime(member.mtime)
+            zip64_fields = []
+            size, compress_size, offset = member.size, member.compress_size, member.offset
+            if size >= ZIP64_LIMIT:
+                zip64_fields.append(size)
+                size = ZIP64_LIMIT
+            if compress_size >= ZIP64_LIMIT:
+                zip64_fields.append(compress_size)
+                compress_size = ZIP64_LIMIT
+            if offset >= ZIP64_LIMIT:
+                zip64_fields.append(offset)
+                offset = ZIP64_LIMIT
+            extra = b""
+            version = 20
+            if zip64_fields:
+                extra = struct.pack(f"<HH{len(zip64_fields)}Q", 1, 8 * len(zip64_fields), *zip64_fields)
+                version = 45
+            header = CENTRAL_HEADER.pack(
+                CENTRAL_SIG, (CREATE_SYSTEM << 8) | version, version, FLAG_UTF8, member.method,
+                dos_time, dos_date, member.crc, compress_size, size,
+                len(member.name_bytes), len(extra), 0, 0, 0, (member.mode & 0xFFFF) << 16, offset
+            )
+            records.append(header + member.name_bytes + extra)
+        return b"".join(records)
+
+    def _write_end(self):
+        cd_offset = self.f.tell()
+        central = self._central_directory()
+        self.f.write(central)
+        cd_size = len(central)
+        count = len(self.members)
+
+        if count >= ZIP64_COUNT_LIMIT or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            end64_offset = self.f.tell()
+            self.f.write(END_RECORD64.pack(END64_SIG, 44, (CREATE_SYSTEM << 8) | 45, 45, 0, 0,
+                                           count, count, cd_size, cd_offset))
+            self.f.write(END_LOCATOR64.pack(LOCATOR64_SIG, 0, end64_offset, 1))
+            self.f.write(END_RECORD.pack(END_SIG, 0, 0, ZIP64_COUNT_LIMIT, ZIP64_COUNT_LIMIT,
+                                         ZIP64_LIMIT, ZIP64_LIMIT, 0))
+        else:
+            self.f.write(END_RECORD.pack(END_SIG, 0, 0, count, count, cd_size, cd_offset, 0))
+
+    def _stop_writer(self):
+        while True:
+            try:
+                self.tasks.put(None, timeout=0.5)
+                break
+            except queue.Full:
+                if not self.writer.is_alive():
+                    break
+        self.writer.join()
+        self.pool.shutdown(wait=True)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._stop_writer()
+        try:
+            if self.error:
+                raise self.error
+            self._write_end()
+        finally:
+            self.f.close()
+
+    def abort(self):
+        # Stops writing and leaves whatever was written on disk; caller decides to delete it
+        if self.closed:
+            return
+        self.closed = True
+        self.error = self.error or InterruptedError("Archive aborted")
+        self._stop_writer()
+        self.f.close()
+
+
+# ---------------------------------------------------------------------------
+# Resumable archive
+# ---------------------------------------------------------------------------
+PARTIAL_SUFFIX = ".partial"
+JOURNAL_SUFFIX = ".journal"
+CHECKPOINT_INTERVAL = 5.0
+CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+
+class ResumableArchiveWriter(ArchiveWriter):
+    """
+    Append-only archive with a checkpoint journal.
+
+    Written as <path>.partial. Every few seconds (or 64 MB) the data is fsync'd
+    and the members it holds are appended to <path>.partial.journal. Opening the
+    same path again truncates back to the last checkpoint and carries on from
+    there; close() writes the central directory and renames to <path>.
+    """
+
+    def __init__(self, path, meta=None, **kwargs):
+        self.final_path = path
+        self.journal_path = path + PARTIAL_SUFFIX + JOURNAL_SUFFIX
+        self.meta = meta or {}
+        self.committed = {}
+        self.pending = []
+        self.last_checkpoint = time.monotonic()
+        self.bytes_since_checkpoint = 0
+        self.journal = None
+        super().__init__(path + PARTIAL_SUFFIX, **kwargs)
+
+    @staticmethod
+    def read_journal(journal_path):
+        # Returns (meta, members, resume_offset); a torn last line is ignored
+        meta = {}
+        members = {}
+        resume_offset = 0
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if "meta" in record:
+                    meta = record["meta"]
+                    continue
+                member = ArchiveMember.from_dict(record["member"])
+                members[member.arcname] = member
+                resume_offset = max(resume_offset, record["end"])
+        return meta, members, resume_offset
+
+    def _open_file(self):
+        if os.path.exists(self.path) and os.path.exists(self.journal_path):
+            meta, self.committed, resume_offset = self.read_journal(self.journal_path)
+            self.meta = meta or self.meta
+            self.members.extend(self.committed.values())
+            f = open(self.path, "r+b", buffering=BLOCK_SIZE)
+            f.truncate(resume_offset)
+            f.seek(resume_offset)
+            self.journal = open(self.journal_path, "a", encoding="utf-8")
+            return f
+
+        f = open(self.path, "wb", buffering=BLOCK_SIZE)
+        self.journal = open(self.journal_path, "w", encoding="utf-8")
+        self.journal.write(json.dumps({"meta": self.meta}) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        return f
+
+    def forget(self, arcname):
+        # A committed member changed since the interrupted run; drop it so it is written again
+        member = self.committed.pop(arcname, None)
+        if member is not None:
+            self.members.remove(member)
+
+    def _member_written(self, member):
+        self.pending.append((member, self.f.tell()))
+        self.bytes_since_checkpoint += member.compress_size
+        if (self.bytes_since_checkpoint >= CHECKPOINT_BYTES
+                or time.monotonic() - self.last_checkpoint >= CHECKPOINT_INTERVAL):
+            self.checkpoint()
+
+    def checkpoint(self):
+        if not self.pending:
+            return
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        for member, end in self.pending:
+            self.journal.write(json.dumps({"member": member.to_dict(), "end": end}) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.pending = []
+        self.bytes_since_checkpoint = 0
+        self.last_checkpoint = time.monotonic()
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self.journal.close()
+        os.replace(self.path, self.final_path)
+        os.remove(self.journal_path)
+
+    def abort(self):
+        # Keeps the partial archive and journal so the next run resumes from here
+        if self.closed:
+            return
+        self.closed = True
+        self.error = self.error or InterruptedError("Archive aborted")
+        self._stop_writer()
+        try:
+            self.checkpoint()
+        except OSError as e:
+            print(f"Unable to checkpoint {self.path}: {e}")
+        finally:
+            self.f.close()
+            self.journal.close()
+
+    def discard(self):
+        self.abort()
+        for path in (self.path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def find_partial_archives(folder):
+    # (final_path, meta) for every interrupted ResumableArchiveWriter in folder
+    found = []
+    suffix = PARTIAL_SUFFIX + JOURNAL_SUFFIX
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return found
+    for name in names:
+        if not name.endswith(suffix):
+            continue
+        final_path = os.path.join(folder, name[:-len(suffix)])
+        if not os.path.exists(final_path + PARTIAL_SUFFIX):
+            continue
+        try:
+            meta, _, _ = ResumableArchiveWriter.read_journal(os.path.join(folder, name))
+        except (OSError, ValueError, KeyError):
+            continue
+        found.append((final_path, meta))
+    return sorted(found)
@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import datetime
+import threading
+
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+# Identical events inside this window are counted instead of written again
+DEDUP_SECONDS = 3600
+READ_BLOCK = 64 * 1024
+
+# Lines written before the log became JSON
+LEGACY_PATTERN = re.compile(r"^\[(?P<time>[^\]]+)\] User: (?P<user>.*?) \| Action: (?P<action>.*?) \| Status: (?P<status>.*?) \| Details: (?P<details>.*)$")
+
+
+def parse_line(line):
+    # One log line -> record dict, or None for anything unreadable
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+    match = LEGACY_PATTERN.match(line)
+    if not match:
+        return None
+    record = match.groupdict()
+    try:
+        record["ts"] = datetime.datetime.strptime(record["time"], "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+    return record
+
+
+def iter_lines_reversed(path):
+    # Lines of a file from the last to the first, reading fixed blocks from the end
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return
+    with f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b""
+        while position > 0:
+            size = min(READ_BLOCK, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + tail).split(b"\n")
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode("utf-8", "replace")
+        if tail:
+            yield tail.decode("utf-8", "replace")
+
+
+def format_record(record):
+    text = f"[{record.get('time', '')}] User: {record.get('user', '')} | Action: {record.get('action', '')} | Status: {record.get('status', '')}"
+    if record.get("details"):
+        text += f" | Details: {record['details']}"
+    if record.get("repeated"):
+        text += f" (repeated {record['repeated']} more times)"
+    return text
+
+
+class AuditLog:
+    """
+    JSON-lines audit log. log() only queues the record; a background thread
+    appends it, rotates the file by size or at midnight into path.1 ..
+    path.N, and folds identical events inside dedup_seconds into one line
+    with a "repeated" count. query() reads the files from the end, so recent
+    events come back without reading the whole history.
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT, dedup_seconds=DEDUP_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dedup_seconds = dedup_seconds
+        # key -> [last written ts, times suppressed since]
+        self.recent = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        atexit.register(self.close)
+
+    # -------------------------
+    # Writing
+    # -------------------------
+    def log(self, action, status, details="", user=""):
+        now = time.time()
+        key = (user, action, status, details)
+        with self.lock:
+            seen = self.recent.get(key)
+            if seen is not None and now - seen[0] < self.dedup_seconds:
+                seen[1] += 1
+                return
+            repeated = seen[1] if seen is not None else 0
+            self.recent[key] = [now, 0]
+            self.expire_recent(now)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="auditlog", daemon=True)
+                self.thread.start()
+
+        record = {"ts": now, "time": datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+                  "user": user, "action": action, "status": status, "details": details}
+        if repeated:
+            record["repeated"] = repeated
+        self.queue.put(record)
+
+    def expire_recent(self, now):
+        if len(self.recent) < 256:
+            return
+        for key in [k for k, (ts, count) in self.recent.items() if now - ts >= self.dedup_seconds and not count]:
+            del self.recent[key]
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            batch = [record]
+            # Everything queued meanwhile goes out in the same write
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [r for r in batch if r is not None]
+            if records:
+                try:
+                    self.write(records)
+                except Exception as e:
+                    print(f"Logging failed: {e}")
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def write(self, records):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            for record in records:
+                line = json.dumps(record) + "\n"
+                if self.should_rotate(f, record["ts"]):
+                    f.close()
+                    self.rotate()
+                    f = open(self.path, "a", encoding="utf-8")
+                f.write(line)
+        finally:
+            f.close()
+
+    def should_rotate(self, f, ts):
+        # By size, or when the day changed since the file was last written
+        f.flush()
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return False
+        if st.st_size >= self.max_bytes:
+            return True
+        return datetime.datetime.fromtimestamp(st.st_mtime).date() != datetime.datetime.fromtimestamp(ts).date()
+
+    def rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def flush(self):
+        # Waits until everything queued so far is on disk
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        with self.lock:
+            # Write out the counts of events that were still being folded
+            now = time.time()
+            for (user, action, status, details), (ts, count) in self.recent.items():
+                if count:
+                    self.queue.put({"ts": now, "time": datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+                                    "user": user, "action": action, "status": status, "details": details,
+                                    "repeated": count})
+            self.recent = {}
+            thread = self.thread
+            self.thread = None
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            thread.join()
+
+    # -------------------------
+    # Reading
+    # -------------------------
+    def files(self):
+        # Current file first, then the rotated ones from newest to oldest
+        paths = [self.path] + [f"{self.path}.{i}" for i in range(1, self.backup_count + 1)]
+        return [p for p in paths if os.path.exists(p)]
+
+    def query(self, user=None, action=None, status=None, since=None, until=None, limit=None):
+        """
+        Matching records, newest first. since/until are timestamps; reading
+        stops at the first record older than since or once limit records
+        were found.
+        """
+        results = []
+        for path in self.files():
+            if since is not None and os.path.getmtime(path) < since:
+                break
+            for line in iter_lines_reversed(path):
+                record = parse_line(line)
+                if record is None:
+                    continue
+                ts = record.get("ts", 0)
+                if until is not None and ts > until:
+                    continue
+                if since is not None and ts < since:
+                    return results
+                if user is not None and record.get("user") != user:
+                    continue
+                if action is not None and record.get("action") != action:
+                    continue
+                if status is not None and record.get("status") != status:
+                    continue
+                results.append(record)
+                if limit is not None and len(results) >= limit:
+                    return results
+        return results
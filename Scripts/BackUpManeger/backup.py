@@ -3,8 +3,8 @@ import json
 import os
 import shutil
 import datetime
-import zipfile
-import psutil
+import time
+from collections import deque
 
 try:
     from PySide6.QtWidgets import *
@@ -19,107 +19,346 @@ except:
     from PySide2.QtCore import Signal
     USING_PYQT = False
 
-CONFIG_PATH = r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\Plugins\Custom\laud2\Scripts\BackUpManeger\configuration.json"
+try:
+    from .engine import (BackupEngine, IncrementalBackupJob, RestoreJob, CONFIG_PATH,
+                         SCRUB_CHECK_SECONDS, SCRUB_INTERVAL_HOURS)
+    from .verify import scrub_due
+    from .agent import agent_incremental_job
+    from .devicewatch import create_backend, list_removable, NativeEventBackend
+    from .scheduler import Scheduler, next_weekly_due
+    from .restore import RestoreCatalog, SIZE as RECORD_SIZE, MTIME as RECORD_MTIME
+except ImportError:
+    from engine import (BackupEngine, IncrementalBackupJob, RestoreJob, CONFIG_PATH,
+                        SCRUB_CHECK_SECONDS, SCRUB_INTERVAL_HOURS)
+    from verify import scrub_due
+    from agent import agent_incremental_job
+    from devicewatch import create_backend, list_removable, NativeEventBackend
+    from scheduler import Scheduler, next_weekly_due
+    from restore import RestoreCatalog, SIZE as RECORD_SIZE, MTIME as RECORD_MTIME
+
 ASSETS_DIR = r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\Plugins\Custom\laud2\Scripts\BackUpManeger\assets"
 
+WM_DEVICECHANGE = 0x0219
+
 
-class ExternalBackupWorker(QThread):
+class BackupWorker(QThread):
+    """
+    Runs an engine Job on a QThread and turns its callbacks into Qt signals,
+    which Qt queues over to the GUI thread. The job's own finished is
+    forwarded as completed: QThread.finished only fires once run() has
+    returned, so that is the one to delete the worker or start the next on.
+    """
     progress = Signal(int)
     status = Signal(str)
-    finished = Signal()
-    
-    def __init__(self, source_path, dest_path, username):
+    completed = Signal()
+    # action, status, details -> SafeCopyApp.log_audit on the GUI thread
+    audit = Signal(str, str, str)
+    # success, message -> popup on the GUI thread
+    done = Signal(bool, str)
+
+    def __init__(self, job):
         super().__init__()
-        self.source_path = source_path
-        self.dest_path = dest_path
-        self.username = username
-        self.is_running = True
+        self.job = job
+        job.progress.connect(self.progress.emit)
+        job.status.connect(self.status.emit)
+        job.finished.connect(self.completed.emit)
+        job.audit.connect(self.audit.emit)
+        job.done.connect(self.done.emit)
 
-    def run(self):
-        try:
-            self.status.emit("Calculating size...")
-            total_size = 0
-            file_list = []
-            for dirpath, dirnames, filenames in os.walk(self.source_path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    try:
-                        s = os.path.getsize(fp)
-                        total_size += s
-                        file_list.append((fp, s))
-                    except OSError:
-                        pass
-            
-            if total_size == 0:
-                total_size = 1 # Avoid division by zero
+    @property
+    def kind(self):
+        return self.job.kind
 
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            archive_name = os.path.join(self.dest_path, f"{self.username}_FULL_{timestamp}.zip")
-            
-            self.status.emit("Zipping and Copying...")
-            
-            copied_size = 0
-            start_time = datetime.datetime.now()
-            
-            with zipfile.ZipFile(archive_name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # Add info.json
-                info = {
-                    "backup_date": str(datetime.datetime.now()),
-                    "type": "FULL_EXTERNAL_BACKUP",
-                    "user": self.username,
-                    "files_count": len(file_list),
-                    "source": self.source_path
-                }
-                zipf.writestr("info.json", json.dumps(info, indent=4))
-
-                for file_path, size in file_list:
-                    if not self.is_running: break
-                    
-                    try:
-                        arcname = os.path.relpath(file_path, self.source_path)
-                        zipf.write(file_path, arcname)
-                        
-                        copied_size += size
-                        percentage = int((copied_size / total_size) * 100)
-                        self.progress.emit(percentage)
-                        
-                        # Calculate ETC
-                        elapsed = (datetime.datetime.now() - start_time).total_seconds()
-                        if elapsed > 0 and copied_size > 0:
-                            speed = copied_size / elapsed
-                            remaining_bytes = total_size - copied_size
-                            etc_seconds = remaining_bytes / speed
-                            etc_str = str(datetime.timedelta(seconds=int(etc_seconds)))
-                            self.status.emit(f"Backing up... {percentage}% (ETC: {etc_str})")
-                    except Exception as e:
-                        print(f"Error packing file {file_path}: {e}")
-            
-            if self.is_running:
-                self.status.emit("Backup Completed!")
-            else:
-                self.status.emit("Backup Cancelled.")
-                if os.path.exists(archive_name):
-                    try:
-                        os.remove(archive_name) # Cleanup incomplete file
-                    except:
-                        pass
-            
-        except Exception as e:
-            self.status.emit(f"Error: {str(e)}")
-        finally:
-            self.finished.emit()
+    def run(self):
+        self.job.run()
 
     def stop(self):
-        self.is_running = False
+        self.job.stop()
+
+    def pause(self):
+        self.job.pause()
+
+    def resume(self):
+        self.job.resume()
+
+    def is_paused(self):
+        return self.job.is_paused()
+
+
+class RestoreDialog(QDialog):
+    """
+    Browses the merged catalog of the backup folder. Folders are filled in when
+    first expanded, so opening the dialog costs one cached catalog load.
+    """
+
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.setWindowTitle("Restore From Backup")
+        self.resize(800, 550)
+
+        layout = QVBoxLayout(self)
+        self.tree = QTreeWidget()
+        self.tree.setColumnCount(4)
+        self.tree.setHeaderLabels(["Name", "Size", "Date Modified", "Archive"])
+        self.tree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.tree.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tree.itemExpanded.connect(self.populate)
+        layout.addWidget(self.tree)
+
+        button_row = QHBoxLayout()
+        self.info_label = QLabel(f"{len(catalog.entries)} files in {len(catalog.chain())} archives")
+        self.btn_restore = QPushButton("Restore Selected To...")
+        self.btn_restore.clicked.connect(self.accept)
+        btn_close = QPushButton("Close")
+        btn_close.setObjectName("SecondaryBtn")
+        btn_close.clicked.connect(self.reject)
+        button_row.addWidget(self.info_label)
+        button_row.addStretch()
+        button_row.addWidget(self.btn_restore)
+        button_row.addWidget(btn_close)
+        layout.addLayout(button_row)
+
+        self.add_children(self.tree.invisibleRootItem(), "")
+
+    def add_children(self, parent_item, folder):
+        dirs, files = self.catalog.list_dir(folder)
+        for rel in dirs:
+            item = QTreeWidgetItem(parent_item, [rel.rpartition("/")[2]])
+            item.setData(0, Qt.ItemDataRole.UserRole, rel)
+            # Placeholder so the expand arrow shows; replaced on first expand
+            QTreeWidgetItem(item, [""])
+        for rel in files:
+            archive, record = self.catalog.get(rel)
+            size_mb = record[RECORD_SIZE] / (1024 * 1024)
+            date = "%04d-%02d-%02d %02d:%02d" % tuple(record[RECORD_MTIME][:5])
+            item = QTreeWidgetItem(parent_item, [rel.rpartition("/")[2], f"{size_mb:.2f} MB", date, archive])
+            item.setData(0, Qt.ItemDataRole.UserRole, rel)
+
+    def populate(self, item):
+        if item.childCount() == 1 and item.child(0).data(0, Qt.ItemDataRole.UserRole) is None:
+            item.takeChild(0)
+            self.add_children(item, item.data(0, Qt.ItemDataRole.UserRole))
+
+    def selected_paths(self):
+        return [item.data(0, Qt.ItemDataRole.UserRole) for item in self.tree.selectedItems()]
+
+
+class AuditLogDialog(QDialog):
+    """
+    Recent audit events, newest first. Each filter change is a query() on the
+    audit log, which reads from the end of the file and stops at the limit.
+    """
+    COLUMNS = ["Time", "User", "Action", "Status", "Details"]
+    LIMIT = 500
+
+    def __init__(self, audit_log, parent=None):
+        super().__init__(parent)
+        self.audit_log = audit_log
+        self.setWindowTitle("Audit Log")
+        self.resize(900, 500)
+
+        layout = QVBoxLayout(self)
+        filter_row = QHBoxLayout()
+        self.action_combo = QComboBox()
+        self.action_combo.addItems(["All Actions", "Incremental Backup", "External Backup", "Check Regular Backup",
+                                    "Cleanup", "Verify", "Scrub", "Restore", "Weekly Prompt", "Schedule Update"])
+        self.status_combo = QComboBox()
+        self.status_combo.addItems(["All Statuses", "Success", "Failed", "Error", "Corrupt", "Cancelled", "Skipped", "Triggered"])
+        self.user_only = QCheckBox("Only my events")
+        for combo in (self.action_combo, self.status_combo):
+            combo.currentIndexChanged.connect(self.reload)
+        self.user_only.toggled.connect(self.reload)
+        filter_row.addWidget(self.action_combo)
+        filter_row.addWidget(self.status_combo)
+        filter_row.addWidget(self.user_only)
+        filter_row.addStretch()
+        layout.addLayout(filter_row)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(len(self.COLUMNS) - 1, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table)
+
+        btn_close = QPushButton("Close")
+        btn_close.setObjectName("SecondaryBtn")
+        btn_close.clicked.connect(self.accept)
+        layout.addWidget(btn_close, alignment=Qt.AlignmentFlag.AlignRight)
+
+        self.reload()
+
+    def reload(self):
+        action = self.action_combo.currentText() if self.action_combo.currentIndex() > 0 else None
+        status = self.status_combo.currentText() if self.status_combo.currentIndex() > 0 else None
+        user = self.parent().config.get("current_username") if self.user_only.isChecked() and self.parent() else None
+        records = self.audit_log.query(user=user, action=action, status=status, limit=self.LIMIT)
+
+        self.table.setRowCount(len(records))
+        for row, record in enumerate(records):
+            details = record.get("details", "")
+            if record.get("repeated"):
+                details += f" (repeated {record['repeated']} more times)"
+            values = [record.get("time", ""), record.get("user", ""), record.get("action", ""), record.get("status", ""), details]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if record.get("status") in ("Failed", "Error", "Corrupt"):
+                    item.setForeground(QColor("#e06c6c"))
+                self.table.setItem(row, column, item)
+        self.table.resizeColumnsToContents()
+
+
+class BackupTableModel(QAbstractTableModel):
+    """
+    Rows are catalog entries, newest first. set_entries() diffs against the
+    current rows so only added, removed or changed archives touch the view.
+    """
+    HEADERS = ["Name", "Date Modified", "Size", "Files", "Type"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.rows[index.row()]
+        if role == Qt.ItemDataRole.ForegroundRole and entry.get("problems"):
+            return QColor("#e06c6c")
+        if role == Qt.ItemDataRole.ToolTipRole and entry.get("problems"):
+            return "Failed verification: " + "; ".join(f"{name}: {problem}" for name, problem in entry["problems"][:5])
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        column = index.column()
+        if column == 0:
+            return entry["name"]
+        if column == 1:
+            return datetime.datetime.fromtimestamp(entry["mtime"]).strftime("%Y-%m-%d %H:%M")
+        if column == 2:
+            return f"{entry['size'] / (1024 * 1024):.2f} MB"
+        if column == 3:
+            return str(entry["files"])
+        if entry.get("problems"):
+            return "Corrupt"
+        return entry["type"].capitalize()
+
+    def entry(self, row):
+        return self.rows[row]
+
+    def set_entries(self, entries):
+        new = {e["name"]: e for e in entries}
+
+        # Removed rows, bottom up so the indexes stay valid
+        for row in range(len(self.rows) - 1, -1, -1):
+            if self.rows[row]["name"] not in new:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.rows[row]
+                self.endRemoveRows()
+
+        # Changed rows in place
+        known = {}
+        for row, old in enumerate(self.rows):
+            known[old["name"]] = row
+            if new[old["name"]] != old:
+                self.rows[row] = new[old["name"]]
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+        # Added rows at their sorted position
+        for entry in sorted((e for n, e in new.items() if n not in known), key=lambda e: e["mtime"], reverse=True):
+            row = 0
+            while row < len(self.rows) and self.rows[row]["mtime"] >= entry["mtime"]:
+                row += 1
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rows.insert(row, entry)
+            self.endInsertRows()
+
+
+class DeviceEvents(QObject):
+    # Carries drive changes from the device watch thread to the GUI thread
+    drives_changed = Signal(list)
+
+
+class BackupQueue(QObject):
+    """
+    Runs backup workers one at a time. A job of a kind that is already running
+    or waiting is dropped, so the weekly popup and the 48h timer never stack.
+    """
+    job_started = Signal(object)
+    job_finished = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pending = deque()
+        self.current = None
+
+    def has_job(self, kind):
+        if self.current is not None and self.current.kind == kind:
+            return True
+        return any(w.kind == kind for w in self.pending)
+
+    def is_busy(self):
+        return self.current is not None
+
+    def enqueue(self, worker):
+        if self.has_job(worker.kind):
+            return False
+        self.pending.append(worker)
+        self._start_next()
+        return True
+
+    def cancel_all(self):
+        self.pending.clear()
+        if self.current is not None:
+            self.current.stop()
+
+    def _start_next(self):
+        if self.current is not None or not self.pending:
+            return
+        worker = self.pending.popleft()
+        self.current = worker
+        worker.finished.connect(lambda: self._on_finished(worker))
+        self.job_started.emit(worker)
+        worker.start()
+
+    def _on_finished(self, worker):
+        # QThread.finished: the thread has exited, so the worker can be deleted
+        if worker is not self.current:
+            return
+        self.current = None
+        self.job_finished.emit(worker)
+        self._start_next()
+
 
 class SafeCopyApp(QWidget):
     def __init__(self):
         super().__init__()
         self.config = self.load_config()
+        # All backup work goes through the headless engine; this window only drives it
+        self.engine = BackupEngine(self.config, CONFIG_PATH)
         self.snooze_until = None
         self.snooze_levels = [120, 60, 30, 10, 5] 
         self.current_snooze_level_index = 0
         self.last_external_backup_drive = None
+
+        self.scrubber = None
+        self.last_scrub_check = 0
+
+        self.backup_queue = BackupQueue(self)
+        self.backup_queue.job_started.connect(self.on_job_started)
+        self.backup_queue.job_finished.connect(self.on_job_finished)
         
         self.initUI()
         self.init_timer()
@@ -297,9 +536,10 @@ QProgressBar::chunk {
         backups_group = QGroupBox("Existing Backups")
         backups_layout = QVBoxLayout()
         
-        self.backups_table = QTableWidget()
-        self.backups_table.setColumnCount(3)
-        self.backups_table.setHorizontalHeaderLabels(["Name", "Date Modified", "Size"])
+        self.backups_model = BackupTableModel(self)
+        self.backups_table = QTableView()
+        self.backups_table.setModel(self.backups_model)
+        self.backups_table.verticalHeader().setVisible(False)
         self.backups_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         self.backups_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.backups_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
@@ -307,13 +547,22 @@ QProgressBar::chunk {
         button_row = QHBoxLayout()
         self.btn_refresh = QPushButton("Refresh List")
         self.btn_refresh.setObjectName("SecondaryBtn")
-        self.btn_refresh.clicked.connect(self.refresh_backups_list)
+        self.btn_refresh.clicked.connect(lambda: self.refresh_backups_list(rescan=True))
         
         self.btn_open_folder = QPushButton("Open Backup Folder")
         self.btn_open_folder.clicked.connect(self.open_backup_folder)
+
+        self.btn_restore = QPushButton("Restore...")
+        self.btn_restore.clicked.connect(self.open_restore_dialog)
+
+        self.btn_preview_cleanup = QPushButton("Preview Cleanup")
+        self.btn_preview_cleanup.setObjectName("SecondaryBtn")
+        self.btn_preview_cleanup.clicked.connect(self.preview_cleanup)
         
         button_row.addWidget(self.btn_refresh)
         button_row.addWidget(self.btn_open_folder)
+        button_row.addWidget(self.btn_restore)
+        button_row.addWidget(self.btn_preview_cleanup)
         
         backups_layout.addWidget(self.backups_table)
         backups_layout.addLayout(button_row)
@@ -340,6 +589,11 @@ QProgressBar::chunk {
         plan_group.setLayout(plan_layout)
         
         right_panel.addWidget(plan_group)
+
+        self.btn_audit_log = QPushButton("Audit Log...")
+        self.btn_audit_log.setObjectName("SecondaryBtn")
+        self.btn_audit_log.clicked.connect(self.open_audit_log)
+        right_panel.addWidget(self.btn_audit_log)
         right_panel.addStretch()
         
         middle_layout.addWidget(backups_group, stretch=2)
@@ -358,9 +612,21 @@ QProgressBar::chunk {
         
         self.btn_backup_now = QPushButton("Run Incremental Backup Now")
         self.btn_backup_now.clicked.connect(lambda: self.check_regular_backup(force=True))
+
+        self.btn_pause = QPushButton("Pause")
+        self.btn_pause.setObjectName("SecondaryBtn")
+        self.btn_pause.setEnabled(False)
+        self.btn_pause.clicked.connect(self.toggle_pause)
+
+        self.btn_cancel = QPushButton("Cancel")
+        self.btn_cancel.setObjectName("SecondaryBtn")
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.clicked.connect(self.cancel_backup)
         
         footer_layout.addWidget(self.status_bar_label)
         footer_layout.addWidget(self.progress_bar)
+        footer_layout.addWidget(self.btn_pause)
+        footer_layout.addWidget(self.btn_cancel)
         footer_layout.addWidget(self.btn_backup_now)
         
         main_layout.addLayout(footer_layout)
@@ -411,58 +677,146 @@ QProgressBar::chunk {
         self.set_icon(self.disk_status_icon, "disk_scanning.png")
 
     def init_timer(self):
+        # Nothing polls: a single-shot timer sleeps until the next scheduled job
+        # and drive changes arrive from the device watch backend
+        self.scheduler = Scheduler()
+        self.scheduler.add("incremental", self.incremental_due, self.check_regular_backup)
+        self.scheduler.add("weekly", self.weekly_due, self.check_weekly_popup)
+        self.scheduler.add("scrub", self.scrub_due_time, self.check_scrub)
+
         self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.check_tasks)
-        self.timer.start(5000) # Check every 5 seconds for responsiveness
+
+        self.device_events = DeviceEvents(self)
+        self.device_events.drives_changed.connect(self.detect_external_drives)
+        self.device_watch = create_backend(self.config.get("device_watch_backend", "auto"))
         
         # Initial check
-        QTimer.singleShot(1000, self.check_tasks)
+        QTimer.singleShot(1000, self.start_watching)
+
+    def start_watching(self):
+        self.device_watch.start(self.device_events.drives_changed.emit)
+        self.check_tasks()
 
     def check_tasks(self):
-        self.check_regular_backup()
-        self.check_weekly_popup()
-        self.detect_external_drives()
-
-    def refresh_backups_list(self):
-        self.backups_table.setRowCount(0)
-        path = self.config.get("temp_save_path")
-        if not os.path.exists(path):
+        self.scheduler.run_due()
+        self.arm_scheduler()
+
+    def arm_scheduler(self):
+        if hasattr(self, "timer"):
+            self.timer.start(int(self.scheduler.sleep_seconds() * 1000))
+
+    def incremental_due(self):
+        if self.backup_queue.has_job(IncrementalBackupJob.kind):
+            return None
+        return self.engine.incremental_due()
+
+    def weekly_due(self):
+        scheduled_day = self.config.get("user_schedules", {}).get(self.config.get("current_username"))
+        if not self.config.get("weekly_save_enabled", False) or not scheduled_day or getattr(self, "_popup_active", False):
+            return None
+        return next_weekly_due(scheduled_day, snooze_until=self.snooze_until,
+                               taken_date=getattr(self, "weekly_action_taken", None))
+
+    def scrub_due_time(self):
+        if not self.config.get("scrub_enabled", True) or self.scrubber is not None:
+            return None
+        return self.last_scrub_check + SCRUB_CHECK_SECONDS
+
+    def nativeEvent(self, event_type, message):
+        # Windows reports drive arrival/removal to top-level windows
+        if event_type == b"windows_generic_MSG" and isinstance(self.device_watch, NativeEventBackend):
+            import ctypes.wintypes
+            msg = ctypes.wintypes.MSG.from_address(int(message))
+            if msg.message == WM_DEVICECHANGE:
+                # The drive letter is mounted shortly after the notification
+                QTimer.singleShot(1000, self.device_watch.notify)
+        return super().nativeEvent(event_type, message)
+
+    def check_scrub(self):
+        # Background integrity pass over the local archives, only while no backup runs
+        if not self.config.get("scrub_enabled", True) or self.scrubber is not None:
+            return
+        if self.backup_queue.is_busy() or time.time() - self.last_scrub_check < SCRUB_CHECK_SECONDS:
+            return
+        self.last_scrub_check = time.time()
+
+        path = self.engine.temp_path
+        if not path or not os.path.isdir(path):
+            return
+        interval = self.config.get("scrub_interval_hours", SCRUB_INTERVAL_HOURS)
+        if not scrub_due(self.get_catalog(path).load().sorted_entries(), interval):
+            return
+
+        self.scrubber = BackupWorker(self.engine.scrub_job(interval))
+        self.scrubber.audit.connect(self.log_audit)
+        self.scrubber.finished.connect(self.on_scrub_finished)
+        self.scrubber.start(QThread.Priority.LowestPriority)
+
+    def on_scrub_finished(self):
+        if self.scrubber is None:
+            return
+        self.scrubber.deleteLater()
+        self.scrubber = None
+        self.refresh_backups_list()
+        self.arm_scheduler()
+
+    def get_catalog(self, temp_path=None):
+        return self.engine.get_catalog(temp_path)
+
+    def refresh_backups_list(self, rescan=False):
+        # Reads backup_catalog.json; the folder itself is only listed when asked
+        # to, or the first time when there is no catalog yet
+        path = self.engine.temp_path
+        if not path or not os.path.exists(path):
+            self.backups_model.set_entries([])
             return
 
         try:
-            files = []
-            for f in os.listdir(path):
-                if f.endswith('.zip'):
-                    full_path = os.path.join(path, f)
-                    stats = os.stat(full_path)
-                    files.append({
-                        "name": f,
-                        "time": stats.st_mtime,
-                        "size": stats.st_size
-                    })
-            
-            # Sort by time desc
-            files.sort(key=lambda x: x['time'], reverse=True)
-            
-            self.backups_table.setRowCount(len(files))
-            for i, f in enumerate(files):
-                self.backups_table.setItem(i, 0, QTableWidgetItem(f['name']))
-                
-                dt = datetime.datetime.fromtimestamp(f['time'])
-                self.backups_table.setItem(i, 1, QTableWidgetItem(dt.strftime("%Y-%m-%d %H:%M")))
-                
-                size_mb = f['size'] / (1024 * 1024)
-                self.backups_table.setItem(i, 2, QTableWidgetItem(f"{size_mb:.2f} MB"))
+            catalog = self.get_catalog(path)
+            if rescan or not catalog.exists():
+                catalog.sync(self.get_snapshot_store(path))
+            else:
+                catalog.load()
+            self.backups_model.set_entries(catalog.sorted_entries())
         except Exception as e:
             print(f"Error listing backups: {e}")
 
     def open_backup_folder(self):
-        path = self.config.get("temp_save_path")
+        path = self.engine.temp_path
         if os.path.exists(path):
             QDesktopServices.openUrl(QUrl.fromLocalFile(path))
         else:
             QMessageBox.warning(self, "Error", f"Path does not exist:\n{path}")
 
+    def open_restore_dialog(self):
+        path = self.engine.temp_path
+        if not path or not os.path.isdir(path):
+            QMessageBox.warning(self, "Error", f"Path does not exist:\n{path}")
+            return
+
+        catalog = RestoreCatalog(path).load()
+        if not catalog.entries:
+            QMessageBox.information(self, "Restore", "No backup archives found.")
+            return
+
+        dialog = RestoreDialog(catalog, self)
+        if not dialog.exec():
+            return
+        relpaths = dialog.selected_paths()
+        if not relpaths:
+            return
+
+        dest_path = QFileDialog.getExistingDirectory(self, "Restore To", self.config.get("handle_path", ""))
+        if not dest_path:
+            return
+        if not self.enqueue_worker(BackupWorker(RestoreJob(catalog, relpaths, dest_path))):
+            self.status_bar_label.setText("A restore is already running")
+
+    def open_audit_log(self):
+        AuditLogDialog(self.engine.audit_log, self).exec()
+
     def load_current_schedule(self):
         user = self.config.get("current_username")
         schedules = self.config.get("user_schedules", {})
@@ -481,129 +835,114 @@ QProgressBar::chunk {
         self.save_config()
         QMessageBox.information(self, "Success", f"Backup schedule for {user} updated to {self.day_combo.currentText()}.")
         self.log_audit("Schedule Update", "Success", f"Changed to {self.day_combo.currentText()}")
+        self.arm_scheduler()
 
     def log_audit(self, action, status, details=""):
-        try:
-            log_path = self.config.get("audit_log_path", "audit.dat")
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            user = self.config.get("current_username", "Unknown")
-            message = f"[{timestamp}] User: {user} | Action: {action} | Status: {status} | Details: {details}\n"
-            
-            with open(log_path, "a") as f:
-                f.write(message)
-        except Exception as e:
-            print(f"Logging failed: {e}")
+        self.engine.log_audit(action, status, details)
 
     def check_regular_backup(self, force=False):
         # Implementation for 2-day incremental backup logic
         try:
-            temp_path = self.config.get("temp_save_path")
-            if not os.path.exists(temp_path):
-                os.makedirs(temp_path)
-
-            state_file = os.path.join(temp_path, "backup_state.json")
-            last_backup_time = 0
-            
-            if os.path.exists(state_file):
-                with open(state_file, 'r') as f:
-                    state = json.load(f)
-                    last_backup_time = state.get("last_backup_timestamp", 0)
+            if self.backup_queue.has_job(IncrementalBackupJob.kind):
+                return
 
             # Check if 2 days (48 hours) have passed
-            if force or (datetime.datetime.now().timestamp() - last_backup_time) >= (48 * 3600):
-                self.status_bar_label.setText("Performing Incremental Backup...")
+            if force or time.time() >= self.engine.incremental_due():
                 self.log_audit("Check Regular Backup", "Triggered", "Manual or 48h threshold triggered")
-                self.perform_incremental_backup(temp_path, state_file)
-                self.cleanup_old_backups(temp_path)
-                self.status_bar_label.setText("Idle")
-                self.refresh_backups_list()
+                self.perform_incremental_backup(reason="Manual or 48h threshold")
             
         except Exception as e:
             self.status_bar_label.setText(f"Error: {e}")
             self.log_audit("Check Regular Backup", "Error", str(e))
 
-    def perform_incremental_backup(self, temp_path, state_file):
-        try:
-            source_path = self.config.get("handle_path")
-            current_timestamp = datetime.datetime.now().timestamp()
-            
-            last_backup = 0
-            if os.path.exists(state_file):
-                try:
-                    with open(state_file, 'r') as f:
-                        state = json.load(f)
-                    last_backup = state.get("last_backup_timestamp", 0)
-                except:
-                    pass
-            
-            files_to_backup = []
-            for dirpath, _, filenames in os.walk(source_path):
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    if os.path.getmtime(fp) > last_backup:
-                        files_to_backup.append(fp)
-            
-            if not files_to_backup:
-                self.update_backup_state(state_file, current_timestamp)
-                self.log_audit("Incremental Backup", "Skipped", "No modified files found")
-                QMessageBox.information(self, "Backup", "No files modified since last backup.")
-                return
+    def get_backend(self):
+        return self.engine.get_backend()
 
-            zip_name = f"{self.config.get('current_username')}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-            zip_path = os.path.join(temp_path, zip_name)
-            
-            self.progress_bar.setVisible(True)
-            self.progress_bar.setRange(0, len(files_to_backup))
-            self.progress_bar.setValue(0)
-            
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for i, file_path in enumerate(files_to_backup):
-                    arcname = os.path.relpath(file_path, source_path)
-                    zf.write(file_path, arcname)
-                    self.progress_bar.setValue(i + 1)
-                    QApplication.processEvents()
-                
-                # Add info.json inside zip
-                info = {
-                    "backup_date": str(datetime.datetime.now()),
-                    "user": self.config.get("current_username"),
-                    "files_count": len(files_to_backup),
-                    "source": source_path
-                }
-                zf.writestr("info.json", json.dumps(info, indent=4))
-
-            self.update_backup_state(state_file, current_timestamp)
-            self.log_audit("Incremental Backup", "Success", f"Created {zip_name} with {len(files_to_backup)} files")
-            self.progress_bar.setVisible(False)
-            QMessageBox.information(self, "Backup", f"Backup Successful!\nCreated {zip_name}")
+    def get_snapshot_store(self, temp_path=None):
+        return self.engine.get_snapshot_store(temp_path)
 
-        except Exception as e:
-            print(f"Backup failed: {e}")
-            self.log_audit("Incremental Backup", "Failed", str(e))
-            QMessageBox.critical(self, "Error", f"Backup failed: {e}")
+    def perform_incremental_backup(self, reason=""):
+        # Queued on a background worker that also applies retention; the list refreshes when it finishes
+        address = self.config.get("agent_address")
+        if address:
+            # Server-local mode: the agent on the storage host reads and archives, only events come back
+            job = agent_incremental_job(self.engine, address, reason)
+        else:
+            job = self.engine.incremental_job(reason, cleanup=True)
+        worker = BackupWorker(job)
+        if self.enqueue_worker(worker):
+            self.status_bar_label.setText("Incremental Backup queued...")
+        return worker
+
+    # -------------------------
+    # Background jobs
+    # -------------------------
+    def enqueue_worker(self, worker):
+        worker.progress.connect(self.update_progress)
+        worker.status.connect(self.update_status)
+        worker.audit.connect(self.log_audit)
+        worker.done.connect(self.on_worker_done)
+        return self.backup_queue.enqueue(worker)
+
+    def on_job_started(self, worker):
+        if self.scrubber is not None:
+            self.scrubber.pause()
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.btn_pause.setEnabled(True)
+        self.btn_cancel.setEnabled(True)
+        self.btn_pause.setText("Pause")
+
+    def on_job_finished(self, worker):
+        if not self.backup_queue.is_busy():
+            if self.scrubber is not None:
+                self.scrubber.resume()
             self.progress_bar.setVisible(False)
+            self.btn_pause.setEnabled(False)
+            self.btn_cancel.setEnabled(False)
+        if worker.kind == IncrementalBackupJob.kind:
+            # Cleanup already ran in the job, or on the storage host for the agent
+            self.refresh_backups_list()
+        worker.deleteLater()
+        self.arm_scheduler()
 
-    def update_backup_state(self, state_file, timestamp):
-        with open(state_file, 'w') as f:
-            json.dump({"last_backup_timestamp": timestamp}, f)
+    def on_worker_done(self, success, message):
+        if success:
+            QMessageBox.information(self, "Backup", message)
+        else:
+            QMessageBox.critical(self, "Error", message)
 
-    def cleanup_old_backups(self, temp_path):
-        max_backups = self.config.get("max_backups", 10)
-        files = [os.path.join(temp_path, f) for f in os.listdir(temp_path) if f.endswith('.zip') and not f.startswith("FULL_BACKUP")]
-        files.sort(key=os.path.getmtime)
-        
-        deleted_count = 0
-        while len(files) > max_backups:
-            f_to_del = files[0]
-            try:
-                os.remove(f_to_del)
-                files.pop(0)
-                deleted_count += 1
-            except:
-                pass
-            
-        if deleted_count > 0:
-            self.log_audit("Cleanup", "Success", f"Deleted {deleted_count} old backups (Limit: {max_backups})")
+    def toggle_pause(self):
+        worker = self.backup_queue.current
+        if worker is None:
+            return
+        if worker.is_paused():
+            worker.resume()
+            self.btn_pause.setText("Pause")
+        else:
+            worker.pause()
+            self.btn_pause.setText("Resume")
+            self.status_bar_label.setText("Paused")
+
+    def cancel_backup(self):
+        self.backup_queue.cancel_all()
+        self.status_bar_label.setText("Cancelling...")
+
+    def cleanup_old_backups(self, temp_path=None, dry_run=False):
+        return self.engine.cleanup(temp_path, dry_run)
+
+    def preview_cleanup(self):
+        path = self.engine.temp_path
+        if not path or not os.path.isdir(path):
+            QMessageBox.warning(self, "Error", f"Path does not exist:\n{path}")
+            return
+        plan = self.cleanup_old_backups(path, dry_run=True)
+        msg = QMessageBox(self)
+        msg.setWindowTitle("Retention Preview")
+        msg.setText(f"{len(plan.prune_names())} archives would be deleted, "
+                    f"{plan.bytes_reclaimed / (1024 * 1024):.2f} MB reclaimed.")
+        msg.setDetailedText(plan.report())
+        msg.exec()
 
     def check_weekly_popup(self):
         if not self.config.get("weekly_save_enabled", False):
@@ -652,13 +991,10 @@ QProgressBar::chunk {
         self._popup_active = False
         
         if msg.clickedButton() == backup_btn:
-            self.status_bar_label.setText("Performing Weekly Backup...")
-            QApplication.processEvents()
-            self.perform_incremental_backup(self.config.get("temp_save_path"), os.path.join(self.config.get("temp_save_path"), "backup_state.json"))
+            self.perform_incremental_backup(reason="Weekly backup")
             self.snooze_until = None
             self.current_snooze_level_index = 0
             self.weekly_action_taken = datetime.date.today()
-            self.status_bar_label.setText("Idle")
         elif msg.clickedButton() == snooze_btn:
             minutes = self.snooze_levels[self.current_snooze_level_index]
             self.snooze_until = datetime.datetime.now() + datetime.timedelta(minutes=minutes)
@@ -669,14 +1005,10 @@ QProgressBar::chunk {
             self.snooze_until = datetime.datetime.now() + datetime.timedelta(minutes=60)
             self.log_audit("Weekly Prompt", "Cancelled", "User cancelled")
 
-    def detect_external_drives(self):
-        drives = []
-        try:
-            for partition in psutil.disk_partitions():
-                if 'removable' in partition.opts:
-                    drives.append(partition.mountpoint)
-        except:
-            pass
+    def detect_external_drives(self, drives=None):
+        # Called by the device watch with the current removable drives
+        if drives is None:
+            drives = list_removable()
         
         if drives:
             drive_letter = drives[0]
@@ -702,14 +1034,11 @@ QProgressBar::chunk {
             self.last_external_backup_drive = None
 
     def start_external_backup(self, drive_letter):
-        self.progress_bar.setVisible(True)
         self.status_bar_label.setText(f"Backing up to {drive_letter}...")
         
-        self.worker = ExternalBackupWorker(self.config.get("handle_path"), drive_letter, self.config.get("current_username"))
-        self.worker.progress.connect(self.update_progress)
-        self.worker.status.connect(self.update_status)
-        self.worker.finished.connect(self.backup_finished)
-        self.worker.start()
+        self.worker = BackupWorker(self.engine.external_job(drive_letter))
+        if not self.enqueue_worker(self.worker):
+            self.status_bar_label.setText("An external backup is already running")
 
     def update_progress(self, val):
         self.progress_bar.setValue(val)
@@ -717,10 +1046,16 @@ QProgressBar::chunk {
     def update_status(self, text):
         self.status_bar_label.setText(text)
 
-    def backup_finished(self):
-        self.progress_bar.setVisible(False)
-        self.status_bar_label.setText("External Backup Finished")
-        QMessageBox.information(self, "Backup", "External Backup Completed Successfully")
+    def closeEvent(self, event):
+        self.device_watch.stop()
+        if self.scrubber is not None:
+            self.scrubber.stop()
+            self.scrubber.wait()
+        self.backup_queue.cancel_all()
+        if self.backup_queue.current is not None:
+            self.backup_queue.current.wait()
+        self.engine.close()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,294 @@
+"""
+Throughput benchmark: python -m BackUpManeger.benchmark [--scale N] [--output FILE]
+
+Generates a synthetic project (many small .json/.usda, mid-size .ma/.hip,
+a few large .exr/.usdc) in a temp folder and times scan, full, incremental,
+external, restore and cleanup through BackupEngine. Prints one JSON document
+with files/s, MB/s, CPU time and peak RSS per stage, for trend tracking on a
+build box. Nothing here needs a display.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import threading
+
+# The engine does not import Qt, but anything that does must not look for a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import psutil
+
+from .engine import BackupEngine, BACKEND_ZIP, BACKEND_CHUNKS, BACKEND_LINKS
+from .fileindex import FileIndex
+
+BENCHMARK_VERSION = 1
+RSS_SAMPLE_SECONDS = 0.02
+
+# name -> (files at scale 1, min bytes, max bytes, extensions, compressible)
+PROFILES = {
+    "small": (2000, 1024, 16 * 1024, (".json", ".usda"), True),
+    "mid": (60, 256 * 1024, 4 * 1024 * 1024, (".ma", ".hip"), True),
+    "large": (4, 16 * 1024 * 1024, 64 * 1024 * 1024, (".exr", ".usdc"), False),
+}
+# Share of small and mid files rewritten before the incremental run
+MODIFY_FRACTION = 0.05
+
+STAGES = ("scan", "full", "rescan", "incremental", "external", "restore", "cleanup")
+
+
+# -------------------------
+# Synthetic project
+# -------------------------
+def _text_payload(rng, size):
+    # Repetitive ASCII, roughly as compressible as .usda/.ma files
+    words = [rng.choice(("def", "Xform", "over", "float3", "xformOp:translate", "asset", "prim", "= (0, 0, 0)", "{", "}"))
+             for _ in range(64)]
+    line = (" ".join(words) + "\n").encode("ascii")
+    return (line * (size // len(line) + 1))[:size]
+
+
+def _binary_payload(rng, size):
+    return rng.randbytes(size)
+
+
+def generate_project(root, scale=1.0, seed=1):
+    """
+    Writes the synthetic tree under root; returns {profile: {"files", "bytes"}}
+    and the list of relpaths per profile. Same seed and scale, same tree.
+    """
+    rng = random.Random(seed)
+    stats = {}
+    paths = {}
+    for name, (count, min_size, max_size, extensions, compressible) in PROFILES.items():
+        count = max(1, int(count * scale))
+        stats[name] = {"files": 0, "bytes": 0}
+        paths[name] = []
+        for i in range(count):
+            ext = extensions[i % len(extensions)]
+            if name == "small":
+                rel = f"Assets/asset_{i // 20:03d}/Export/{name}_{i:05d}{ext}"
+            elif name == "mid":
+                rel = f"Shots/SQ{i // 10:03d}/SH{i:04d}/Scenefiles/{name}_{i:04d}{ext}"
+            else:
+                rel = f"Shots/SQ{i // 10:03d}/SH{i:04d}/Renders/{name}_{i:04d}{ext}"
+            size = rng.randint(min_size, max_size)
+            write_file(os.path.join(root, *rel.split("/")), rng, size, compressible)
+            stats[name]["files"] += 1
+            stats[name]["bytes"] += size
+            paths[name].append(rel)
+    return stats, paths
+
+
+def write_file(path, rng, size, compressible):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(_text_payload(rng, size) if compressible else _binary_payload(rng, size))
+
+
+def modify_project(root, paths, fraction=MODIFY_FRACTION, seed=2):
+    # Rewrites a share of the small and mid files plus one large file; returns (files, bytes)
+    rng = random.Random(seed)
+    touched = []
+    for name in ("small", "mid"):
+        touched += rng.sample(paths[name], max(1, int(len(paths[name]) * fraction)))
+    touched.append(paths["large"][0])
+    total = 0
+    for rel in touched:
+        path = os.path.join(root, *rel.split("/"))
+        size = os.path.getsize(path)
+        write_file(path, rng, size, not rel.endswith((".exr", ".usdc")))
+        total += size
+    return len(touched), total
+
+
+# -------------------------
+# Measuring
+# -------------------------
+class Measure:
+    """
+    Context manager timing one stage: wall and CPU time, plus the peak RSS
+    seen by a sampling thread while the stage runs.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.process = psutil.Process()
+        self.peak_rss = 0
+        self.sampling = threading.Event()
+        self.result = {"stage": name}
+
+    def sample(self):
+        while not self.sampling.wait(RSS_SAMPLE_SECONDS):
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.peak_rss = self.process.memory_info().rss
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        self.cpu_start = sum(self.process.cpu_times()[:2])
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall_start
+        cpu = sum(self.process.cpu_times()[:2]) - self.cpu_start
+        self.sampling.set()
+        self.thread.join()
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+        self.result.update({"wall_seconds": round(wall, 4), "cpu_seconds": round(cpu, 4),
+                            "peak_rss_mb": round(self.peak_rss / (1024 * 1024), 2)})
+        return False
+
+    def set_work(self, files, total_bytes, **extra):
+        wall = max(self.result["wall_seconds"], 1e-9)
+        self.result.update({"files": files, "bytes": total_bytes,
+                            "files_per_second": round(files / wall, 2),
+                            "mb_per_second": round(total_bytes / (1024 * 1024) / wall, 2)})
+        self.result.update(extra)
+
+
+def run_engine_job(engine, job):
+    success, message = engine.run_job(job)
+    if not success:
+        raise RuntimeError(message or f"{job.kind} failed")
+    return message
+
+
+def next_second():
+    # Archive names carry the time to the second; keep stages from colliding
+    time.sleep(1.05 - (time.time() % 1.0))
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def run_benchmark(work_dir, scale=1.0, seed=1, backend=BACKEND_ZIP, workers=None, stages=STAGES):
+    source = os.path.join(work_dir, "source")
+    backups = os.path.join(work_dir, "backups")
+    config = {
+        "handle_path": source,
+        "temp_save_path": backups,
+        "audit_log_path": os.path.join(work_dir, "audit.jsonl"),
+        "current_username": "bench",
+        "backup_backend": backend,
+        "compression_workers": workers,
+    }
+    engine = BackupEngine(config)
+
+    started = time.perf_counter()
+    dataset, paths = generate_project(source, scale, seed)
+    total_files = sum(s["files"] for s in dataset.values())
+    total_bytes = sum(s["bytes"] for s in dataset.values())
+    dataset = {"files": total_files, "bytes": total_bytes, "generate_seconds": round(time.perf_counter() - started, 2),
+               "profiles": dataset}
+
+    results = []
+
+    def stage(name):
+        return name in stages
+
+    if stage("scan"):
+        # Cold scan with no index, as on the first run
+        with Measure("scan") as m:
+            scan = FileIndex(os.path.join(work_dir, "scan_index.json.gz"), source).scan()
+        m.set_work(len(scan.files), scan.total_bytes)
+        results.append(m.result)
+
+    # Everything after this needs a backup to exist
+    with Measure("full") as m:
+        run_engine_job(engine, engine.incremental_job("Benchmark"))
+    m.set_work(total_files, total_bytes)
+    if stage("full"):
+        results.append(m.result)
+
+    if stage("rescan") and backend == BACKEND_ZIP:
+        # Nothing changed: the cost of the periodic check; snapshots keep no file index
+        with Measure("rescan") as m:
+            scan = FileIndex.for_state_file(engine.state_file, source).scan()
+        m.set_work(len(scan.files), scan.total_bytes, changed=len(scan.changed))
+        results.append(m.result)
+
+    if stage("incremental"):
+        changed_files, changed_bytes = modify_project(source, paths)
+        next_second()
+        with Measure("incremental") as m:
+            run_engine_job(engine, engine.incremental_job("Benchmark"))
+        m.set_work(changed_files, changed_bytes)
+        results.append(m.result)
+
+    if stage("external"):
+        next_second()
+        with Measure("external") as m:
+            run_engine_job(engine, engine.external_job(os.path.join(work_dir, "external")))
+        m.set_work(total_files, total_bytes)
+        results.append(m.result)
+
+    if stage("restore") and backend == BACKEND_ZIP:
+        restore_dir = os.path.join(work_dir, "restore")
+        with Measure("restore") as m:
+            run_engine_job(engine, engine.restore_job([""], restore_dir))
+        m.set_work(total_files, total_bytes)
+        results.append(m.result)
+
+    if stage("cleanup"):
+        # A second chain on the same day leaves the first one to the retention policy
+        config["full_backup_interval_days"] = 1e-9
+        modify_project(source, paths, seed=3)
+        next_second()
+        run_engine_job(engine, engine.incremental_job("Benchmark"))
+        config.pop("full_backup_interval_days")
+        with Measure("cleanup") as m:
+            plan = engine.cleanup()
+        m.set_work(len(plan.prune_names()), plan.bytes_reclaimed)
+        results.append(m.result)
+
+    engine.close()
+    return {
+        "version": BENCHMARK_VERSION,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"scale": scale, "seed": seed, "backend": backend, "workers": workers},
+        "dataset": dataset,
+        "stages": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m BackUpManeger.benchmark", description="Backup throughput benchmark")
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset size multiplier, 1.0 is about 300 MB")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=(BACKEND_ZIP, BACKEND_CHUNKS, BACKEND_LINKS), default=BACKEND_ZIP)
+    parser.add_argument("--workers", type=int, help="compression workers, engine default if omitted")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--work-dir", help="where to build the dataset (left in place), a temp folder by default")
+    parser.add_argument("--keep", action="store_true", help="keep the temp folder afterwards")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="loud2_bench_")
+    try:
+        report = run_benchmark(work_dir, args.scale, args.seed, args.backend, args.workers, args.stages)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import os
+import json
+import zipfile
+import threading
+
+CATALOG_FILE_NAME = "backup_catalog.json"
+CATALOG_VERSION = 1
+
+TYPE_FULL = "full"
+TYPE_INCREMENTAL = "incremental"
+TYPE_SNAPSHOT = "snapshot"
+
+# Workers record archives from their thread while the GUI prunes from its own
+_lock = threading.Lock()
+
+
+def archive_type(name):
+    return TYPE_FULL if "_FULL_" in name or name.startswith("FULL_BACKUP") else TYPE_INCREMENTAL
+
+
+def read_archive_entry(path):
+    # Fallback for archives the catalog does not know yet: one stat and the central directory
+    st = os.stat(path)
+    name = os.path.basename(path)
+    entry = {"name": name, "size": st.st_size, "mtime": st.st_mtime, "files": 0,
+             "source": "", "user": "", "type": archive_type(name)}
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = zf.namelist()
+            entry["files"] = len([n for n in names if n != "info.json" and not n.endswith("/")])
+            if "info.json" in names:
+                info = json.loads(zf.read("info.json"))
+                entry["source"] = info.get("source", "")
+                entry["user"] = info.get("user", "")
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Unable to read {path}: {e}")
+    return entry
+
+
+def snapshot_entry(store, name):
+    manifest = store.load_manifest(name)
+    return {"name": name, "size": manifest["stats"]["bytes_stored"],
+            "mtime": os.path.getmtime(store.manifest_path(name)), "files": len(manifest["files"]),
+            "source": manifest.get("source", ""), "user": manifest.get("user", ""), "type": TYPE_SNAPSHOT}
+
+
+class BackupCatalog:
+    """
+    backup_catalog.json next to the archives: one entry per archive with
+    name, size, mtime, file count, source, user and type, written by whoever
+    creates or deletes an archive so listing the folder needs a single read.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, CATALOG_FILE_NAME)
+        self.entries = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == CATALOG_VERSION:
+            self.entries = data.get("archives", {})
+        return self
+
+    def save(self):
+        data = {"version": CATALOG_VERSION, "archives": self.entries}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def sorted_entries(self, newest_first=True):
+        return sorted(self.entries.values(), key=lambda e: e["mtime"], reverse=newest_first)
+
+    def current_chain(self):
+        # Names of the newest full archive and the incrementals written after it
+        archives = [e for e in self.sorted_entries(newest_first=False) if e["type"] != TYPE_SNAPSHOT]
+        fulls = [e["mtime"] for e in archives if e["type"] == TYPE_FULL]
+        if not fulls:
+            return []
+        return [e["name"] for e in archives if e["mtime"] >= fulls[-1]]
+
+    def archive_path(self, name):
+        return os.path.join(self.folder, name)
+
+    # -------------------------
+    # Updates
+    # -------------------------
+    def add(self, path, files, source="", user="", type_=None, verified=None, problems=None):
+        # Called right after an archive was finalized; verified is the post-write check time
+        st = os.stat(path)
+        name = os.path.basename(path)
+        entry = {"name": name, "size": st.st_size, "mtime": st.st_mtime, "files": files,
+                 "source": source, "user": user, "type": type_ or archive_type(name)}
+        if verified:
+            entry["verified"] = verified
+            entry["problems"] = [list(p) for p in problems or []]
+        with _lock:
+            self.load()
+            self.entries[name] = entry
+            self.save()
+        return entry
+
+    def add_snapshot(self, store, name):
+        entry = snapshot_entry(store, name)
+        with _lock:
+            self.load()
+            self.entries[name] = entry
+            self.save()
+        return entry
+
+    def remove(self, names):
+        with _lock:
+            self.load()
+            for name in names:
+                self.entries.pop(name, None)
+            self.save()
+
+    def mark_verified(self, name, problems, timestamp):
+        # Scrub result: problems is a list of (arcname, problem), empty when intact
+        with _lock:
+            self.load()
+            entry = self.entries.get(name)
+            if entry is None:
+                return
+            entry["verified"] = timestamp
+            entry["problems"] = [list(p) for p in problems]
+            self.save()
+
+    def delete_archive(self, name):
+        # Removes the file and its entry; a file that is already gone only loses the entry
+        try:
+            os.remove(self.archive_path(name))
+        except FileNotFoundError:
+            pass
+        self.remove([name])
+
+    def sync(self, store=None):
+        """
+        Reconciles the catalog with the folder: one listdir, and a stat only for
+        archives the catalog has not seen (copied in by hand or written by an
+        older version). store: the ChunkStore whose snapshots are listed too.
+        """
+        try:
+            names = {f for f in os.listdir(self.folder) if f.endswith(".zip")}
+        except OSError as e:
+            print(f"Unable to list {self.folder}: {e}")
+            return self
+        snapshots = set(store.list_manifests()) if store else set()
+
+        with _lock:
+            self.load()
+            changed = False
+            for name, entry in list(self.entries.items()):
+                known = snapshots if entry["type"] == TYPE_SNAPSHOT else names
+                if name not in known:
+                    del self.entries[name]
+                    changed = True
+            for name in names - set(self.entries):
+                try:
+                    self.entries[name] = read_archive_entry(self.archive_path(name))
+                    changed = True
+                except OSError:
+                    continue
+            for name in snapshots - set(self.entries):
+                self.entries[name] = snapshot_entry(store, name)
+                changed = True
+            if changed or not self.exists():
+                self.save()
+        return self
@@ -0,0 +1,376 @@
+import os
+import json
+import gzip
+import zlib
+import hashlib
+import datetime
+
+try:
+    from .rules import MODE_METADATA
+except ImportError:
+    from rules import MODE_METADATA
+
+# ---------------------------------------------------------------------------
+# Content-defined chunking
+# ---------------------------------------------------------------------------
+# Boundaries are searched only at candidate bytes (found with bytes.find, so the
+# scan runs at C speed) and confirmed with a crc32 of the window that ends on the
+# candidate. A boundary therefore depends only on local content: inserting bytes
+# in a scene file moves the chunks around it but does not change them.
+
+CHUNK_MIN = 64 * 1024
+CHUNK_AVG = 256 * 1024
+CHUNK_MAX = 1024 * 1024
+
+WINDOW_SIZE = 48
+CANDIDATE_BYTE = b"\n"
+BOUNDARY_MASK = (1 << 9) - 1
+
+READ_SIZE = 4 * 1024 * 1024
+COMPRESS_LEVEL = 3
+
+# Object payload tags (first byte of every object file)
+TAG_RAW = b"r"
+TAG_ZLIB = b"z"
+
+
+def _find_cut(buf, start, eof, min_size=CHUNK_MIN, max_size=CHUNK_MAX, mask=BOUNDARY_MASK):
+    size = len(buf)
+    limit = min(start + max_size, size)
+
+    pos = buf.find(CANDIDATE_BYTE, start + min_size - 1, limit)
+    while pos != -1:
+        window = bytes(buf[pos - WINDOW_SIZE + 1:pos + 1])
+        if zlib.crc32(window) & mask == 0:
+            return pos + 1
+        pos = buf.find(CANDIDATE_BYTE, pos + 1, limit)
+
+    if start + max_size <= size:
+        return start + max_size
+    if eof and size > start:
+        return size
+    return None
+
+
+def iter_chunks(fileobj, min_size=CHUNK_MIN, max_size=CHUNK_MAX, mask=BOUNDARY_MASK):
+    buf = bytearray()
+    eof = False
+    while not eof:
+        data = fileobj.read(READ_SIZE)
+        if data:
+            buf += data
+        else:
+            eof = True
+
+        start = 0
+        while True:
+            cut = _find_cut(buf, start, eof, min_size, max_size, mask)
+            if cut is None:
+                break
+            yield bytes(buf[start:cut])
+            start = cut
+        del buf[:start]
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Chunk store
+# ---------------------------------------------------------------------------
+class ChunkStoreError(Exception):
+    pass
+
+
+class ChunkStore:
+    """
+    Deduplicating backup store.
+
+    root/objects/<ab>/<sha256>     one file per unique chunk
+    root/manifests/<name>.json.gz  one manifest per backup, each a full snapshot
+                                   of the source pointing at chunk hashes
+    """
+
+    def __init__(self, root, compress_level=COMPRESS_LEVEL, read_limiter=None, write_limiter=None):
+        # Optional throttle.RateLimiter for source reads and object writes during backup()
+        self.root = root
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifests_dir = os.path.join(root, "manifests")
+        self.compress_level = compress_level
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    # -------------------------
+    # Objects
+    # -------------------------
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def has_object(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def put_object(self, data):
+        # Returns (digest, stored_bytes); stored_bytes is 0 when the chunk was already known
+        digest = hash_bytes(data)
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+
+        payload = zlib.compress(data, self.compress_level) if self.compress_level else data
+        if self.compress_level and len(payload) < len(data):
+            blob = TAG_ZLIB + payload
+        else:
+            blob = TAG_RAW + data
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.write_limiter:
+            self.write_limiter.consume(len(blob))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+        return digest, len(blob)
+
+    def get_object(self, digest, check=True):
+        try:
+            with open(self.object_path(digest), "rb") as f:
+                blob = f.read()
+        except OSError as e:
+            raise ChunkStoreError(f"Missing chunk {digest}: {e}")
+
+        tag, payload = blob[:1], blob[1:]
+        if tag == TAG_ZLIB:
+            data = zlib.decompress(payload)
+        elif tag == TAG_RAW:
+            data = payload
+        else:
+            raise ChunkStoreError(f"Unknown chunk format in {digest}")
+
+        if check and hash_bytes(data) != digest:
+            raise ChunkStoreError(f"Corrupt chunk {digest}")
+        return data
+
+    def iter_objects(self):
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for entry in os.scandir(prefix_dir):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    yield entry
+
+    # -------------------------
+    # Manifests
+    # -------------------------
+    def manifest_path(self, name):
+        return os.path.join(self.manifests_dir, f"{name}.json.gz")
+
+    def list_manifests(self):
+        names = [f[:-len(".json.gz")] for f in os.listdir(self.manifests_dir) if f.endswith(".json.gz")]
+        # Names start with the user but end with the timestamp, sort on that
+        return sorted(names, key=lambda n: n.rsplit("_", 2)[-2:])
+
+    def load_manifest(self, name):
+        with gzip.open(self.manifest_path(name), "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        path = self.manifest_path(manifest["name"])
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def delete_manifest(self, name):
+        os.remove(self.manifest_path(name))
+
+    def latest_manifest(self):
+        names = self.list_manifests()
+        return self.load_manifest(names[-1]) if names else None
+
+    # -------------------------
+    # Backup
+    # -------------------------
+    def store_file(self, file_path):
+        chunks = []
+        stored = 0
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for data in iter_chunks(f):
+                if self.read_limiter:
+                    self.read_limiter.consume(len(data))
+                sha.update(data)
+                digest, written = self.put_object(data)
+                chunks.append([digest, len(data)])
+                stored += written
+        return {"sha256": sha.hexdigest(), "chunks": chunks}, stored
+
+    def backup(self, source_path, name, user="", previous=None, progress=None, should_stop=None, rules=None):
+        """
+        Snapshot source_path into a new manifest. Files whose size and mtime match
+        the previous manifest reuse its chunk list without being read again.
+        rules: optional rules.BackupRules; excluded folders are not walked and
+        metadata-only files are recorded without content.
+        """
+        if previous is None:
+            previous = self.latest_manifest()
+        prev_files = previous["files"] if previous and previous.get("source") == source_path else {}
+
+        files = {}
+        stats = {"files": 0, "changed_files": 0, "bytes_read": 0, "bytes_stored": 0}
+        dir_policies = {}
+
+        for dirpath, dirnames, filenames in os.walk(source_path):
+            rel_dir = os.path.relpath(dirpath, source_path).replace(os.sep, "/")
+            rel_dir = "" if rel_dir == "." else rel_dir
+            if rules is not None:
+                # Pruning dirnames in place keeps os.walk out of excluded folders
+                kept = rules.select(rel_dir, [(d, True, None) for d in dirnames] + [(f, False, None) for f in filenames],
+                                    dir_policies.pop(rel_dir, {}))
+                dirnames[:] = [entry[0] for entry in kept if entry[1]]
+                dir_policies.update((entry[3], entry[4]) for entry in kept if entry[1])
+                selected = [(entry[0], entry[4]) for entry in kept if not entry[1]]
+            else:
+                selected = [(fname, {}) for fname in filenames]
+
+            for fname, policy in selected:
+                if should_stop and should_stop():
+                    raise ChunkStoreError("Backup cancelled")
+
+                fp = os.path.join(dirpath, fname)
+                arcname = f"{rel_dir}/{fname}" if rel_dir else fname
+                try:
+                    st = os.stat(fp)
+                except OSError:
+                    continue
+
+                old = prev_files.get(arcname)
+                if policy.get("mode") == MODE_METADATA:
+                    files[arcname] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": None,
+                                      "chunks": [], "metadata_only": True}
+                elif old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns and not old.get("metadata_only"):
+                    files[arcname] = old
+                else:
+                    try:
+                        entry, stored = self.store_file(fp)
+                    except OSError as e:
+                        print(f"Error storing file {fp}: {e}")
+                        continue
+                    entry["size"] = st.st_size
+                    entry["mtime_ns"] = st.st_mtime_ns
+                    files[arcname] = entry
+                    stats["changed_files"] += 1
+                    stats["bytes_read"] += st.st_size
+                    stats["bytes_stored"] += stored
+
+                stats["files"] += 1
+                if progress:
+                    progress(stats["files"], arcname)
+
+        manifest = {
+            "name": name,
+            "backup_date": str(datetime.datetime.now()),
+            "type": "CHUNK_SNAPSHOT",
+            "user": user,
+            "source": source_path,
+            "parent": previous["name"] if previous else None,
+            "stats": stats,
+            "files": files,
+        }
+        self.save_manifest(manifest)
+        return manifest
+
+    # -------------------------
+    # Restore
+    # -------------------------
+    def restore(self, name, dest_path, paths=None, strip_prefix=""):
+        # paths: optional list of files or folder prefixes (relative, "/" separated);
+        # strip_prefix: leading folder left out of the restored paths
+        manifest = self.load_manifest(name)
+        restored = 0
+        for arcname, entry in manifest["files"].items():
+            if paths and not any(arcname == p or arcname.startswith(p.rstrip("/") + "/") for p in paths):
+                continue
+            if entry.get("metadata_only"):
+                # Only size and mtime were recorded for this file
+                continue
+
+            out_rel = arcname[len(strip_prefix) + 1:] if strip_prefix else arcname
+            out_path = os.path.join(dest_path, *out_rel.split("/"))
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            sha = hashlib.sha256()
+            with open(out_path, "wb") as f:
+                for digest, _ in entry["chunks"]:
+                    data = self.get_object(digest)
+                    sha.update(data)
+                    f.write(data)
+
+            if sha.hexdigest() != entry["sha256"]:
+                raise ChunkStoreError(f"Restored file does not match manifest: {arcname}")
+            os.utime(out_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            restored += 1
+        return restored
+
+    # -------------------------
+    # Verify
+    # -------------------------
+    def verify(self, names=None, deep=True):
+        # Returns a list of (manifest, path, problem); empty means the store is healthy
+        problems = []
+        checked = {}
+        for name in names or self.list_manifests():
+            manifest = self.load_manifest(name)
+            for arcname, entry in manifest["files"].items():
+                for digest, length in entry["chunks"]:
+                    if digest not in checked:
+                        try:
+                            if deep:
+                                self.get_object(digest)
+                                checked[digest] = None
+                            else:
+                                checked[digest] = None if self.has_object(digest) else "missing chunk"
+                        except ChunkStoreError as e:
+                            checked[digest] = str(e)
+                    if checked[digest]:
+                        problems.append((name, arcname, checked[digest]))
+        return problems
+
+    # -------------------------
+    # Garbage collection
+    # -------------------------
+    def referenced_objects(self):
+        referenced = set()
+        for name in self.list_manifests():
+            for entry in self.load_manifest(name)["files"].values():
+                referenced.update(digest for digest, _ in entry["chunks"])
+        return referenced
+
+    def gc(self, dry_run=False):
+        referenced = self.referenced_objects()
+        removed = 0
+        reclaimed = 0
+        for entry in self.iter_objects():
+            if entry.name in referenced:
+                continue
+            reclaimed += entry.stat().st_size
+            removed += 1
+            if not dry_run:
+                os.remove(entry.path)
+        return removed, reclaimed
+
+    def drop(self, names):
+        # Delete the given manifests, then collect the chunks only they used
+        for name in names:
+            if os.path.exists(self.manifest_path(name)):
+                self.delete_manifest(name)
+        return self.gc()
+
+    def prune(self, keep):
+        # Drop all but the newest `keep` manifests
+        names = self.list_manifests()
+        dropped = names[:-keep] if keep > 0 else names
+        removed, reclaimed = self.drop(dropped)
+        return dropped, removed, reclaimed
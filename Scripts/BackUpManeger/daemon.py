@@ -0,0 +1,119 @@
+import time
+import signal
+import datetime
+import threading
+
+try:
+    from .engine import SCRUB_CHECK_SECONDS
+    from .scheduler import Scheduler
+    from .devicewatch import create_backend
+except ImportError:
+    from engine import SCRUB_CHECK_SECONDS
+    from scheduler import Scheduler
+    from devicewatch import create_backend
+
+
+def log(text):
+    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {text}", flush=True)
+
+
+class BackupDaemon:
+    """
+    Long-running headless mode, meant to run next to the storage. Sleeps until
+    the next scheduled job, runs jobs one at a time on its own thread and, when
+    external is set, writes a full backup to each removable drive that appears.
+    """
+
+    def __init__(self, engine, external=False):
+        self.engine = engine
+        self.external = external
+        self.current = None
+        self.running = True
+        self.last_scrub = 0
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.known_drives = None
+        self.new_drives = []
+
+        self.scheduler = Scheduler()
+        self.scheduler.add("incremental", self.engine.incremental_due, self.run_incremental)
+        if self.engine.config.get("scrub_enabled", True):
+            self.scheduler.add("scrub", lambda: self.last_scrub + SCRUB_CHECK_SECONDS, self.run_scrub)
+        self.device_watch = create_backend(self.engine.config.get("device_watch_backend", "auto")) if external else None
+
+    # -------------------------
+    # Jobs
+    # -------------------------
+    def run(self, job, label):
+        self.current = job
+        log(f"{label} started")
+        try:
+            success, message = self.engine.run_job(job)
+        finally:
+            self.current = None
+        summary = f": {message.splitlines()[0]}" if message else ""
+        log(f"{label} {'finished' if success else 'failed'}{summary}")
+        return success
+
+    def run_incremental(self):
+        if self.run(self.engine.incremental_job("Daemon schedule"), "Incremental backup"):
+            plan = self.engine.cleanup()
+            if plan.prune:
+                log(f"Cleanup removed {len(plan.prune_names())} archives")
+
+    def run_scrub(self):
+        self.last_scrub = time.time()
+        self.run(self.engine.scrub_job(), "Scrub")
+
+    def on_drives(self, drives):
+        # Device watch thread: queue drives that were not there before. Drives
+        # already present when the daemon starts are left alone.
+        with self.lock:
+            if self.known_drives is None:
+                self.known_drives = set(drives)
+                return
+            arrived = [d for d in drives if d not in self.known_drives]
+            self.known_drives = set(drives)
+            self.new_drives.extend(arrived)
+        if arrived:
+            self.wake.set()
+
+    def run_external(self):
+        with self.lock:
+            drives, self.new_drives = self.new_drives, []
+        for drive in drives:
+            if not self.running:
+                return
+            self.run(self.engine.external_job(drive), f"External backup to {drive}")
+
+    # -------------------------
+    # Loop
+    # -------------------------
+    def stop(self, *args):
+        self.running = False
+        if self.current is not None:
+            self.current.stop()
+        self.wake.set()
+
+    def serve(self):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, self.stop)
+            except ValueError:
+                # Not on the main thread
+                pass
+
+        if self.device_watch is not None:
+            self.device_watch.start(self.on_drives)
+
+        log("Backup daemon running")
+        while self.running:
+            self.scheduler.run_due()
+            self.run_external()
+            self.wake.wait(self.scheduler.sleep_seconds())
+            self.wake.clear()
+
+        if self.device_watch is not None:
+            self.device_watch.stop()
+        log("Backup daemon stopped")
+
@@ -0,0 +1,277 @@
+import os
+import json
+import gzip
+import struct
+import hashlib
+
+try:
+    from .chunkstore import iter_chunks
+    from .archive import should_store
+except ImportError:
+    from chunkstore import iter_chunks
+    from archive import should_store
+
+# ---------------------------------------------------------------------------
+# Binary deltas
+# ---------------------------------------------------------------------------
+# A large file that changed is stored as a delta against the last archive
+# that holds it whole. The new version is cut with the content-defined
+# chunker of chunkstore (smaller chunks than the store uses); every chunk the
+# base version already had becomes a copy instruction, everything else is
+# kept as literal bytes. Like rsync's rolling checksum this finds unchanged
+# data even after an insertion shifted it, but the boundary search runs in C.
+#
+# Delta member format, after DELTA_MAGIC:
+#   b"C" offset:u64 length:u32   copy length bytes from offset in the base
+#   b"L" length:u32 data         literal bytes
+
+DELTA_SUFFIX = ".l2delta"
+DELTA_MAGIC = b"L2DELTA1"
+
+DELTA_CHUNK_MIN = 8 * 1024
+DELTA_CHUNK_MAX = 256 * 1024
+DELTA_MASK = (1 << 7) - 1
+
+# Above this share of literal bytes the file is stored whole and becomes the new base
+MAX_LITERAL_RATIO = 0.5
+
+SIGNATURE_DIR_NAME = "signatures"
+
+COPY_OP = struct.Struct(">QI")
+LITERAL_OP = struct.Struct(">I")
+
+
+class DeltaError(Exception):
+    pass
+
+
+def _chunk_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _iter_delta_chunks(f, limiter=None):
+    for data in iter_chunks(f, DELTA_CHUNK_MIN, DELTA_CHUNK_MAX, DELTA_MASK):
+        if limiter:
+            limiter.consume(len(data))
+        yield data
+
+
+def file_signature(path, limiter=None):
+    # {"sha256", "size", "chunks": [[digest, offset, length], ...]} of a file about to be stored whole
+    sha = hashlib.sha256()
+    chunks = []
+    offset = 0
+    with open(path, "rb") as f:
+        for data in _iter_delta_chunks(f, limiter):
+            sha.update(data)
+            chunks.append([_chunk_digest(data), offset, len(data)])
+            offset += len(data)
+    return {"sha256": sha.hexdigest(), "size": offset, "chunks": chunks}
+
+
+def write_delta(path, signature, out_path, limiter=None):
+    """
+    Writes the delta of path against signature to out_path. Returns
+    {"sha256", "size", "literal"}: hash and size of the new version and the
+    number of literal bytes in the delta.
+    """
+    known = {}
+    for digest, offset, length in signature["chunks"]:
+        known.setdefault(digest, (offset, length))
+
+    sha = hashlib.sha256()
+    size = 0
+    literal = 0
+    pending = None      # copy being extended: [offset, length]
+    with open(path, "rb") as f, open(out_path, "wb") as out:
+        out.write(DELTA_MAGIC)
+        for data in _iter_delta_chunks(f, limiter):
+            sha.update(data)
+            size += len(data)
+            match = known.get(_chunk_digest(data))
+            if match is not None and match[1] == len(data):
+                if pending is not None and pending[0] + pending[1] == match[0]:
+                    pending[1] += match[1]
+                    continue
+                if pending is not None:
+                    out.write(b"C" + COPY_OP.pack(*pending))
+                pending = [match[0], match[1]]
+                continue
+            if pending is not None:
+                out.write(b"C" + COPY_OP.pack(*pending))
+                pending = None
+            out.write(b"L" + LITERAL_OP.pack(len(data)))
+            out.write(data)
+            literal += len(data)
+        if pending is not None:
+            out.write(b"C" + COPY_OP.pack(*pending))
+    return {"sha256": sha.hexdigest(), "size": size, "literal": literal}
+
+
+class DeltaPatcher:
+    """
+    File-like sink for restore.extract_member: fed the delta member, it
+    writes the rebuilt file to out_file, reading copies from base_file.
+    """
+
+    def __init__(self, base_file, out_file):
+        self.base_file = base_file
+        self.out_file = out_file
+        self.buffer = bytearray()
+        self.header = False
+        self.literal_left = 0
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def emit(self, data):
+        self.sha.update(data)
+        self.size += len(data)
+        self.out_file.write(data)
+
+    def write(self, data):
+        self.buffer += data
+        buf = self.buffer
+        pos = 0
+        if not self.header:
+            if len(buf) < len(DELTA_MAGIC):
+                return
+            if bytes(buf[:len(DELTA_MAGIC)]) != DELTA_MAGIC:
+                raise DeltaError("Not a delta")
+            self.header = True
+            pos = len(DELTA_MAGIC)
+
+        while pos < len(buf):
+            if self.literal_left:
+                take = min(self.literal_left, len(buf) - pos)
+                self.emit(bytes(buf[pos:pos + take]))
+                self.literal_left -= take
+                pos += take
+                continue
+            op = buf[pos:pos + 1]
+            if op == b"C":
+                if len(buf) - pos < 1 + COPY_OP.size:
+                    break
+                offset, length = COPY_OP.unpack_from(buf, pos + 1)
+                pos += 1 + COPY_OP.size
+                self.copy(offset, length)
+            elif op == b"L":
+                if len(buf) - pos < 1 + LITERAL_OP.size:
+                    break
+                self.literal_left = LITERAL_OP.unpack_from(buf, pos + 1)[0]
+                pos += 1 + LITERAL_OP.size
+            else:
+                raise DeltaError(f"Bad delta instruction {op!r}")
+        del buf[:pos]
+
+    def copy(self, offset, length):
+        self.base_file.seek(offset)
+        while length:
+            data = self.base_file.read(min(length, 1024 * 1024))
+            if not data:
+                raise DeltaError("Delta reaches past the end of its base")
+            self.emit(data)
+            length -= len(data)
+
+    def close(self):
+        if self.buffer or self.literal_left:
+            raise DeltaError("Truncated delta")
+
+
+class SignatureStore:
+    """
+    signatures/<ab>/<sha1 of path>.json.gz in the backup folder: for every
+    large file, the chunk signature of its last whole copy and the archive
+    holding it.
+    """
+
+    def __init__(self, folder):
+        self.folder = os.path.join(folder, SIGNATURE_DIR_NAME)
+
+    def path(self, arcname):
+        key = hashlib.sha1(arcname.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, key[:2], f"{key}.json.gz")
+
+    def get(self, arcname):
+        try:
+            with gzip.open(self.path(arcname), "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data if data.get("path") == arcname else None
+
+    def put(self, arcname, archive, signature):
+        path = self.path(arcname)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(dict(signature, path=arcname, archive=archive), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+class DeltaBuilder:
+    """
+    Stores the changed files of one incremental archive: files of at least
+    min_size with a base in the current chain go in as deltas, the rest
+    whole. Signatures of the large files stored whole are kept until
+    commit(), so an archive that is discarded never becomes a base.
+    """
+
+    def __init__(self, folder, chain, min_size, limiter=None):
+        self.folder = folder
+        self.signatures = SignatureStore(folder)
+        self.chain = set(chain)
+        self.min_size = min_size
+        self.limiter = limiter
+        self.deltas = {}        # arcname -> info.json entry
+        self.pending = {}       # arcname -> signature of the whole copy in this archive
+
+    def add(self, zf, arcname, file_path, size, level=None, full=False):
+        # Returns the sha256 of the file as stored
+        if size < self.min_size:
+            return zf.add_file(file_path, arcname, level=level).sha256
+        if not full:
+            sha = self.add_delta(zf, arcname, file_path, level)
+            if sha is not None:
+                return sha
+
+        member = zf.add_file(file_path, arcname, level=level)
+        signature = file_signature(file_path, self.limiter)
+        # Changed again while being archived: no base this time rather than a wrong one
+        if signature["sha256"] == member.sha256:
+            self.pending[arcname] = signature
+        return member.sha256
+
+    def add_delta(self, zf, arcname, file_path, level):
+        base = self.signatures.get(arcname)
+        if base is None or base.get("archive") not in self.chain:
+            return None
+        tmp_path = os.path.join(self.folder, f".{hashlib.sha1(arcname.encode('utf-8')).hexdigest()}{DELTA_SUFFIX}.tmp")
+        try:
+            result = write_delta(file_path, base, tmp_path, self.limiter)
+            if result["literal"] > MAX_LITERAL_RATIO * result["size"]:
+                return None
+            # The member carries the file's own mtime, restore puts it back on the rebuilt file
+            st = os.stat(file_path)
+            os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            if level is None and should_store(arcname):
+                level = 0
+            member = zf.add_file(tmp_path, arcname + DELTA_SUFFIX, level=level)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.deltas[arcname] = {"base": base["archive"], "base_sha256": base["sha256"], "size": result["size"],
+                                "sha256": result["sha256"], "delta_sha256": member.sha256}
+        return result["sha256"]
+
+    def checksums(self, hashes):
+        # info.json checksums keyed by member name: delta members are checked as stored
+        checksums = {arcname: sha for arcname, sha in hashes.items() if arcname not in self.deltas}
+        checksums.update((arcname + DELTA_SUFFIX, delta["delta_sha256"]) for arcname, delta in self.deltas.items())
+        return checksums
+
+    def commit(self, archive_name):
+        for arcname, signature in self.pending.items():
+            try:
+                self.signatures.put(arcname, archive_name, signature)
+            except OSError as e:
+                print(f"Unable to save delta signature for {arcname}: {e}")
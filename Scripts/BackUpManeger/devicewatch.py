@@ -0,0 +1,139 @@
+import os
+import sys
+import select
+import threading
+
+import psutil
+
+# Linux mounts that count as external drives when /sys does not say "removable"
+REMOVABLE_MOUNT_ROOTS = ("/media/", "/run/media/", "/mnt/")
+POLL_INTERVAL = 5.0
+
+
+def _sys_block_removable(device):
+    # /dev/sdb1 -> /sys/class/block/sdb1/../removable, i.e. the parent disk's flag
+    name = os.path.basename(os.path.realpath(device))
+    for path in (f"/sys/class/block/{name}/removable", f"/sys/class/block/{name}/../removable"):
+        try:
+            with open(path) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return False
+
+
+def list_removable():
+    # Mountpoints of removable drives, in a stable order
+    drives = []
+    try:
+        partitions = psutil.disk_partitions()
+    except Exception as e:
+        print(f"Unable to list partitions: {e}")
+        return drives
+    for partition in partitions:
+        if "removable" in partition.opts:
+            drives.append(partition.mountpoint)
+        elif sys.platform.startswith("linux") and partition.device.startswith("/dev/"):
+            if _sys_block_removable(partition.device) or partition.mountpoint.startswith(REMOVABLE_MOUNT_ROOTS):
+                drives.append(partition.mountpoint)
+    return sorted(drives)
+
+
+class DeviceWatchBackend:
+    """
+    Calls callback(drives) with the current removable mountpoints whenever they
+    change, plus once on start. Backends only decide when to look again.
+    """
+    name = "base"
+
+    def __init__(self):
+        self.callback = None
+        self.drives = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, callback):
+        self.callback = callback
+        self.rescan()
+        self._thread = threading.Thread(target=self.run, name=f"devicewatch-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        pass
+
+    def rescan(self):
+        drives = list_removable()
+        if drives != self.drives:
+            self.drives = drives
+            if self.callback:
+                self.callback(drives)
+
+
+class ProcMountsBackend(DeviceWatchBackend):
+    # The kernel flags /proc/self/mounts with POLLPRI when the mount table changes, so this sleeps in poll()
+    name = "procmounts"
+    MOUNTS = "/proc/self/mounts"
+
+    @classmethod
+    def available(cls):
+        return sys.platform.startswith("linux") and hasattr(select, "poll") and os.path.exists(cls.MOUNTS)
+
+    def run(self):
+        with open(self.MOUNTS, "rb") as f:
+            poller = select.poll()
+            poller.register(f.fileno(), select.POLLPRI | select.POLLERR)
+            while not self._stop.is_set():
+                # Timeout only so stop() is noticed
+                if not poller.poll(1000):
+                    continue
+                f.seek(0)
+                f.read()
+                self.rescan()
+
+
+class NativeEventBackend(DeviceWatchBackend):
+    """
+    No thread: the owner forwards OS device notifications (WM_DEVICECHANGE on
+    Windows, via QWidget.nativeEvent) to notify().
+    """
+    name = "native"
+
+    def start(self, callback):
+        self.callback = callback
+        self.rescan()
+
+    def notify(self):
+        self.rescan()
+
+
+class PollingBackend(DeviceWatchBackend):
+    # Fallback for platforms without change notifications
+    name = "poll"
+
+    def __init__(self, interval=POLL_INTERVAL):
+        super().__init__()
+        self.interval = interval
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            self.rescan()
+
+
+BACKENDS = {
+    ProcMountsBackend.name: ProcMountsBackend,
+    NativeEventBackend.name: NativeEventBackend,
+    PollingBackend.name: PollingBackend,
+}
+
+
+def create_backend(name="auto"):
+    if name and name != "auto":
+        return BACKENDS[name]()
+    if ProcMountsBackend.available():
+        return ProcMountsBackend()
+    if sys.platform == "win32":
+        return NativeEventBackend()
+    return PollingBackend()
@@ -0,0 +1,1036 @@
+import os
+import json
+import datetime
+import threading
+import time
+
+try:
+    from .chunkstore import ChunkStore, ChunkStoreError
+    from .linkstore import LinkStore, LinkStoreError
+    from .fileindex import FileIndex, FileDiscovery, SIZE, MTIME
+    from .archive import ArchiveWriter, ResumableArchiveWriter, find_partial_archives, COMPRESS_LEVEL
+    from .catalog import BackupCatalog, TYPE_SNAPSHOT, TYPE_FULL
+    from .verify import verify_archive, format_problems, scrub_due
+    from .throttle import RateLimiter, BackupThrottle, io_priority
+    from .rules import BackupRules, MODE_METADATA
+    from .retention import plan_retention, RetentionPlan, KEEP_DAILY, KEEP_WEEKLY, KEEP_MONTHLY
+    from .scheduler import next_incremental_due
+    from .restore import RestoreCatalog, RestoreError
+    from .auditlog import AuditLog, MAX_BYTES, BACKUP_COUNT, DEDUP_SECONDS
+    from .lease import BackupLease, describe_holder, HEARTBEAT_SECONDS, STALE_SECONDS
+    from .delta import DeltaBuilder
+except ImportError:
+    from chunkstore import ChunkStore, ChunkStoreError
+    from linkstore import LinkStore, LinkStoreError
+    from fileindex import FileIndex, FileDiscovery, SIZE, MTIME
+    from archive import ArchiveWriter, ResumableArchiveWriter, find_partial_archives, COMPRESS_LEVEL
+    from catalog import BackupCatalog, TYPE_SNAPSHOT, TYPE_FULL
+    from verify import verify_archive, format_problems, scrub_due
+    from throttle import RateLimiter, BackupThrottle, io_priority
+    from rules import BackupRules, MODE_METADATA
+    from retention import plan_retention, RetentionPlan, KEEP_DAILY, KEEP_WEEKLY, KEEP_MONTHLY
+    from scheduler import next_incremental_due
+    from restore import RestoreCatalog, RestoreError
+    from auditlog import AuditLog, MAX_BYTES, BACKUP_COUNT, DEDUP_SECONDS
+    from lease import BackupLease, describe_holder, HEARTBEAT_SECONDS, STALE_SECONDS
+    from delta import DeltaBuilder
+
+CONFIG_PATH = r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\Plugins\Custom\laud2\Scripts\BackUpManeger\configuration.json"
+STATE_FILE_NAME = "backup_state.json"
+
+# "zip" writes a timestamped archive per backup, "chunks" uses the deduplicating ChunkStore,
+# "links" the hard-linked snapshot folders of LinkStore
+BACKEND_ZIP = "zip"
+BACKEND_CHUNKS = "chunks"
+BACKEND_LINKS = "links"
+SNAPSHOT_BACKENDS = (BACKEND_CHUNKS, BACKEND_LINKS)
+CHUNK_STORE_DIR = "chunkstore"
+LINK_STORE_DIR = "linkstore"
+
+PROGRESS_MAX_RATE = 10 # progress signals per second
+SUMMARY_FILE_NAME = "loud2_backup_summary.json" # per drive, last full backup size per source
+
+# "shared": everyone backs the project up into temp_save_path, one at a time.
+# "user": every user keeps their own chain in temp_save_path/<user>.
+SCOPE_SHARED = "shared"
+SCOPE_USER = "user"
+# What an incremental does when another one holds the backup folder
+WHEN_LOCKED_QUEUE = "queue"
+WHEN_LOCKED_SKIP = "skip"
+
+FULL_BACKUP_INTERVAL_DAYS = 7 # local chains start over with a full archive this often
+
+SCRUB_INTERVAL_HOURS = 168 # re-read every archive once a week
+SCRUB_RATE_MB = 10 # MB/s the scrubber may read
+SCRUB_CHECK_SECONDS = 600
+
+
+def open_snapshot_store(backend, folder, config=None, throttle=None):
+    """
+    The ChunkStore or LinkStore of a snapshot backend inside folder (or where
+    config points it), None for the zip backend.
+    """
+    config = config or {}
+    read_limiter = throttle.read if throttle else None
+    write_limiter = throttle.write if throttle else None
+    if backend == BACKEND_CHUNKS:
+        return ChunkStore(config.get("chunk_store_path") or os.path.join(folder, CHUNK_STORE_DIR),
+                          read_limiter=read_limiter, write_limiter=write_limiter)
+    if backend == BACKEND_LINKS:
+        return LinkStore(config.get("link_store_path") or os.path.join(folder, LINK_STORE_DIR),
+                         read_limiter=read_limiter, write_limiter=write_limiter)
+    return None
+
+
+class ProgressThrottle:
+    # Lets at most max_rate progress updates per second through to the GUI
+    def __init__(self, max_rate=PROGRESS_MAX_RATE):
+        self.interval = 1.0 / max_rate
+        self.last = 0.0
+
+    def ready(self, force=False):
+        now = time.monotonic()
+        if force or now - self.last >= self.interval:
+            self.last = now
+            return True
+        return False
+
+
+class JobSignal:
+    # Plain callback list with the emit/connect shape of a Qt signal, so jobs run without Qt
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        self.callbacks.append(callback)
+
+    def emit(self, *args):
+        for callback in self.callbacks:
+            callback(*args)
+
+
+class Job:
+    """
+    One backup operation, independent of Qt. Progress, status, audit and done
+    are reported through JobSignals: the GUI forwards them to Qt signals from
+    a QThread, the CLI and daemon print and log them directly.
+    """
+    kind = "backup"
+
+    def __init__(self):
+        self.progress = JobSignal()     # int
+        self.status = JobSignal()       # str
+        self.finished = JobSignal()
+        self.audit = JobSignal()        # action, status, details
+        self.done = JobSignal()         # success, message
+        self.is_running = True
+        # Set when the job succeeded without doing its work (another backup held the folder)
+        self.skipped = False
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._throttle = ProgressThrottle()
+
+    def run(self):
+        raise NotImplementedError
+
+    def stop(self):
+        self.is_running = False
+        self._resume_event.set()
+
+    def pause(self):
+        self._resume_event.clear()
+
+    def resume(self):
+        self._resume_event.set()
+
+    def is_paused(self):
+        return not self._resume_event.is_set()
+
+    def should_stop(self):
+        # Called between files: blocks while paused, True once cancelled
+        self._resume_event.wait()
+        return not self.is_running
+
+    def report(self, percentage, text, force=False):
+        if self._throttle.ready(force):
+            self.progress.emit(percentage)
+            self.status.emit(text)
+
+
+class ExternalBackupJob(Job):
+    kind = "external"
+
+    def __init__(self, source_path, dest_path, username, backend=BACKEND_ZIP, workers=None, level=COMPRESS_LEVEL,
+                 verify_after_write=True, throttle=None, rules=None):
+        super().__init__()
+        self.verify_after_write = verify_after_write
+        self.throttle = throttle
+        self.rules = rules
+        self.source_path = source_path
+        self.dest_path = dest_path
+        self.username = username
+        self.backend = backend
+        self.workers = workers
+        self.level = level
+
+    def run(self):
+        with io_priority(self.throttle.io_priority if self.throttle else None):
+            if self.backend in SNAPSHOT_BACKENDS:
+                self.run_snapshot()
+            else:
+                self.run_zip()
+
+    def run_zip(self):
+        discovery = None
+        try:
+            # Discovery and archiving overlap; the previous backup of this source
+            # to the same drive gives the size estimate until discovery finishes
+            previous = self.read_summary()
+            discovery = FileDiscovery(self.source_path, should_stop=lambda: not self.is_running, rules=self.rules)
+            discovery.start()
+
+            os.makedirs(self.dest_path, exist_ok=True)
+
+            # An interrupted backup of the same source on this drive is picked up where it stopped
+            archive_name = self.find_resumable()
+            if archive_name is None:
+                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+                archive_name = os.path.join(self.dest_path, f"{self.username}_FULL_{timestamp}.zip")
+                self.status.emit("Zipping and Copying...")
+            else:
+                self.status.emit(f"Resuming {os.path.basename(archive_name)}...")
+            
+            copied_size = 0
+            files_count = 0
+            skipped_size = 0
+            start_time = datetime.datetime.now()
+            meta = {"source": self.source_path, "user": self.username}
+            # The speed behind the ETC is measured from the last change of the bandwidth cap
+            cap = self.throttle.read_cap() if self.throttle else 0
+            speed_base = 0
+            
+            checksums = {}
+            metadata_only = {}
+            with ResumableArchiveWriter(archive_name, meta=meta, workers=self.workers, level=self.level,
+                                        **(self.throttle.writer_kwargs() if self.throttle else {})) as zipf:
+                committed = zipf.committed
+                for arcname, file_path, size, mtime, policy in discovery:
+                    if self.should_stop(): break
+                    if policy.get("mode") == MODE_METADATA:
+                        metadata_only[arcname] = {"size": size, "mtime": mtime}
+                        continue
+                    
+                    try:
+                        old = committed.get(arcname)
+                        if old is not None and old.size == size and old.mtime == mtime:
+                            skipped_size += size
+                            checksums[arcname] = old.sha256
+                        else:
+                            zipf.forget(arcname)
+                            checksums[arcname] = zipf.add_file(file_path, arcname, level=policy.get("compress_level"),
+                                                               should_stop=self.should_stop).sha256
+                        copied_size += size
+                        files_count += 1
+
+                        total_size = self.estimate_total(discovery, previous)
+                        percentage = min(99, int((copied_size / total_size) * 100))
+                        
+                        # Calculate ETC (on bytes written in this run, resumed ones are free)
+                        written = copied_size - skipped_size
+                        if self.throttle and self.throttle.read_cap() != cap:
+                            cap = self.throttle.read_cap()
+                            start_time = datetime.datetime.now()
+                            speed_base = written
+                        elapsed = (datetime.datetime.now() - start_time).total_seconds()
+                        speed = (written - speed_base) / elapsed if elapsed > 0 else 0
+                        if cap:
+                            # Never promise more than the cap allows
+                            speed = min(speed, cap) if speed > 0 else cap
+                        if speed > 0:
+                            remaining_bytes = max(0, total_size - copied_size)
+                            etc_seconds = remaining_bytes / speed
+                            etc_str = str(datetime.timedelta(seconds=int(etc_seconds)))
+                            approx = "" if discovery.done else "~"
+                            capped = f", {cap / (1024 * 1024):.0f} MB/s cap" if cap else ""
+                            self.report(percentage, f"Backing up... {percentage}% (ETC: {approx}{etc_str}{capped})")
+                    except Exception as e:
+                        print(f"Error packing file {file_path}: {e}")
+
+                if self.is_running:
+                    # Add info.json
+                    info = {
+                        "backup_date": str(datetime.datetime.now()),
+                        "type": "FULL_EXTERNAL_BACKUP",
+                        "user": self.username,
+                        "files_count": files_count,
+                        "source": self.source_path,
+                        "checksums": checksums,
+                        "metadata_only": metadata_only
+                    }
+                    zipf.writestr("info.json", json.dumps(info, indent=4))
+                else:
+                    # Keep the checkpointed part on the drive for the next attempt
+                    zipf.abort()
+
+            discovery.close()
+            if self.is_running:
+                self.write_summary(files_count, copied_size)
+                problems = self.verify(archive_name)
+                if problems is None:
+                    # Stopped while verifying, the archive itself is complete
+                    self.audit.emit("External Backup", "Success", f"Created {archive_name} with {files_count} files (not verified)")
+                    return
+                BackupCatalog(self.dest_path).add(archive_name, files_count, self.source_path, self.username,
+                                                  verified=time.time() if self.verify_after_write else None,
+                                                  problems=problems)
+                if problems:
+                    self.audit.emit("Verify", "Corrupt", f"{archive_name}: {format_problems(problems)}")
+                    self.done.emit(False, f"External backup written but failed verification:\n{format_problems(problems)}")
+                    return
+            
+            if self.is_running:
+                self.progress.emit(100)
+                self.status.emit("Backup Completed!")
+                self.audit.emit("External Backup", "Success", f"Created {archive_name} with {files_count} files")
+                self.done.emit(True, "External Backup Completed Successfully")
+            else:
+                self.status.emit("Backup Stopped. It will resume from here next time.")
+                self.audit.emit("External Backup", "Cancelled", f"{archive_name} kept for resume")
+            
+        except Exception as e:
+            self.status.emit(f"Error: {str(e)}")
+            self.audit.emit("External Backup", "Failed", str(e))
+            self.done.emit(False, f"External Backup failed: {e}")
+        finally:
+            if discovery is not None and discovery.is_alive():
+                discovery.close()
+            self.finished.emit()
+
+    def verify(self, archive_path):
+        # Post-write check; [] when disabled
+        if not self.verify_after_write:
+            return []
+        self.status.emit("Verifying archive...")
+        return verify_archive(archive_path, should_stop=self.should_stop)
+
+    def estimate_total(self, discovery, previous):
+        if discovery.done or not previous:
+            return max(1, discovery.bytes_found)
+        # Still walking: trust the last backup unless the tree already proved bigger
+        return max(1, discovery.bytes_found, previous.get("total_bytes", 0))
+
+    def find_resumable(self):
+        for final_path, meta in find_partial_archives(self.dest_path):
+            if meta.get("source") == self.source_path:
+                return final_path
+        return None
+
+    def summary_path(self):
+        return os.path.join(self.dest_path, SUMMARY_FILE_NAME)
+
+    def read_summary(self):
+        try:
+            with open(self.summary_path(), 'r') as f:
+                return json.load(f).get(self.source_path)
+        except (OSError, ValueError):
+            return None
+
+    def write_summary(self, files_count, total_bytes):
+        try:
+            summary = {}
+            if os.path.exists(self.summary_path()):
+                with open(self.summary_path(), 'r') as f:
+                    summary = json.load(f)
+            summary[self.source_path] = {
+                "backup_date": str(datetime.datetime.now()),
+                "files_count": files_count,
+                "total_bytes": total_bytes
+            }
+            with open(self.summary_path(), 'w') as f:
+                json.dump(summary, f, indent=4)
+        except (OSError, ValueError) as e:
+            print(f"Unable to write backup summary: {e}")
+
+    def run_snapshot(self):
+        try:
+            self.status.emit("Reading snapshot store...")
+            store = open_snapshot_store(self.backend, self.dest_path, throttle=self.throttle)
+            previous = store.latest_manifest()
+            expected = len(previous["files"]) if previous else 0
+
+            def on_progress(count, arcname):
+                percentage = min(99, int(count / expected * 100)) if expected else 0
+                self.report(percentage, f"Backing up... {count} files")
+
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            manifest = store.backup(
+                self.source_path,
+                f"{self.username}_FULL_{timestamp}",
+                user=self.username,
+                previous=previous,
+                progress=on_progress,
+                should_stop=self.should_stop,
+                rules=self.rules
+            )
+            self.progress.emit(100)
+            stored_mb = manifest["stats"]["bytes_stored"] / (1024 * 1024)
+            self.status.emit(f"Backup Completed! ({stored_mb:.2f} MB new data)")
+            self.audit.emit("External Backup", "Success", f"Snapshot {manifest['name']}, {stored_mb:.2f} MB new data")
+            self.done.emit(True, "External Backup Completed Successfully")
+        except Exception as e:
+            if self.is_running:
+                self.status.emit(f"Error: {str(e)}")
+                self.audit.emit("External Backup", "Failed", str(e))
+                self.done.emit(False, f"External Backup failed: {e}")
+            else:
+                self.status.emit("Backup Cancelled.")
+                self.audit.emit("External Backup", "Cancelled", "")
+        finally:
+            self.finished.emit()
+
+
+class IncrementalBackupJob(Job):
+    kind = "incremental"
+
+    def __init__(self, config, temp_path, state_file, backend=BACKEND_ZIP, reason="", paths=None, username=None,
+                 throttle=None, rules=None, lease=None, wait_for_lease=True, cleanup=None):
+        super().__init__()
+        self.throttle = throttle
+        # lease.BackupLease of temp_path; losing it mid-run cancels the backup
+        self.lease = lease
+        self.wait_for_lease = wait_for_lease
+        if lease is not None:
+            lease.on_lost = self.stop
+        self.rules = rules
+        self.config = config
+        self.temp_path = temp_path
+        self.state_file = state_file
+        self.backend = backend
+        self.reason = reason
+        # paths: optional manifest of changed files/folders (relative to handle_path) to scan instead of the
+        # whole tree; an empty manifest means nothing changed
+        self.paths = paths
+        self.source_path = config.get("handle_path")
+        self.username = username or config.get("current_username")
+        # cleanup(temp_path): retention run on this thread after a backup that created a new restore point
+        self.cleanup = cleanup
+
+    def run(self):
+        try:
+            if self.lease is not None and not self.acquire_lease():
+                return
+            try:
+                with io_priority(self.throttle.io_priority if self.throttle else None):
+                    if self.backend in SNAPSHOT_BACKENDS:
+                        created = self.run_snapshot()
+                    else:
+                        created = self.run_zip()
+            finally:
+                if self.lease is not None:
+                    self.lease.release()
+            if created and self.cleanup is not None:
+                self.run_cleanup()
+        except Exception as e:
+            print(f"Backup failed: {e}")
+            self.audit.emit("Incremental Backup", "Failed", str(e))
+            self.done.emit(False, f"Backup failed: {e}")
+        finally:
+            self.finished.emit()
+
+    @staticmethod
+    def read_state(state_file):
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r') as f:
+                    return json.load(f).get("last_backup_timestamp", 0)
+            except:
+                pass
+        return 0
+
+    def read_last_backup(self):
+        return self.read_state(self.state_file)
+
+    def update_backup_state(self, timestamp):
+        with open(self.state_file, 'w') as f:
+            json.dump({"last_backup_timestamp": timestamp}, f)
+
+    def full_backup_due(self):
+        interval = self.config.get("full_backup_interval_days", FULL_BACKUP_INTERVAL_DAYS)
+        if not interval:
+            return False
+        fulls = [e["mtime"] for e in BackupCatalog(self.temp_path).load().entries.values()
+                 if e["type"] == TYPE_FULL and e.get("source") in ("", self.source_path)]
+        return not fulls or time.time() - max(fulls) >= interval * 86400
+
+    def acquire_lease(self):
+        # False when another backup of this folder runs and we skip it, or were cancelled while queued
+        def on_wait(holder):
+            self.status.emit(f"Queued behind the backup of {describe_holder(holder)}...")
+
+        if self.lease.acquire(self.wait_for_lease, self.should_stop, on_wait):
+            return True
+        if not self.is_running:
+            self.cancelled()
+            return False
+        text = f"{describe_holder(self.lease.holder())} is already backing up this project"
+        self.skipped = True
+        self.status.emit("Backup skipped.")
+        self.audit.emit("Incremental Backup", "Skipped", text)
+        self.done.emit(True, f"Backup skipped: {text}.")
+        return False
+
+    def cancelled(self, zip_path=None):
+        self.status.emit("Backup Cancelled.")
+        self.audit.emit("Incremental Backup", "Cancelled", self.reason)
+        if zip_path and os.path.exists(zip_path):
+            try:
+                os.remove(zip_path)
+            except OSError:
+                pass
+
+    def run_zip(self):
+        current_timestamp = datetime.datetime.now().timestamp()
+        last_backup = self.read_last_backup()
+
+        self.status.emit("Scanning project...")
+        index = FileIndex.for_state_file(self.state_file, self.source_path)
+        first_index_run = not index.exists()
+        if self.paths is not None and not first_index_run:
+            scan = index.scan_paths(self.paths, should_stop=self.should_stop, rules=self.rules)
+        else:
+            scan = index.scan(trust_dir_mtime=self.config.get("index_trust_dir_mtime", False), should_stop=self.should_stop,
+                              rules=self.rules)
+        if scan is None:
+            self.cancelled()
+            return
+        if first_index_run and last_backup:
+            index.seed_from_timestamp(scan, last_backup)
+
+        files_to_backup = scan.changed
+        if not files_to_backup and not scan.deleted:
+            index.commit(scan)
+            self.update_backup_state(current_timestamp)
+            self.audit.emit("Incremental Backup", "Skipped", "No modified files found")
+            self.done.emit(True, "No files modified since last backup.")
+            return
+
+        # A periodic full archive starts a new chain, so retention can drop old chains whole
+        full = self.full_backup_due()
+        if full:
+            files_to_backup = [(rel, os.path.join(self.source_path, *rel.split("/")), record)
+                               for rel, record in scan.files.items()]
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        zip_name = f"{self.username}_FULL_{timestamp}.zip" if full else f"{self.username}_{timestamp}.zip"
+        zip_path = os.path.join(self.temp_path, zip_name)
+        total = max(1, len(files_to_backup))
+
+        hashes = {}
+        failed = []
+        metadata_only = {}
+        workers = self.config.get("compression_workers")
+        level = self.config.get("compression_level", COMPRESS_LEVEL)
+        limits = self.throttle.writer_kwargs() if self.throttle else {}
+        # "delta_min_mb": files at least this large go in as binary deltas against their last whole copy
+        delta_min_mb = self.config.get("delta_min_mb")
+        deltas = None
+        if delta_min_mb:
+            deltas = DeltaBuilder(self.temp_path, BackupCatalog(self.temp_path).load().current_chain(),
+                                  int(delta_min_mb * 1024 * 1024), self.throttle.read if self.throttle else None)
+        with ArchiveWriter(zip_path, workers=workers, level=level, **limits) as zf:
+            for i, (arcname, file_path, record) in enumerate(files_to_backup):
+                if self.should_stop():
+                    break
+                policy = scan.policies.get(arcname, {})
+                if policy.get("mode") == MODE_METADATA:
+                    metadata_only[arcname] = {"size": record[SIZE], "mtime": record[MTIME] / 1e9}
+                    continue
+                try:
+                    if deltas is not None:
+                        hashes[arcname] = deltas.add(zf, arcname, file_path, record[SIZE],
+                                                     level=policy.get("compress_level"), full=full)
+                    else:
+                        hashes[arcname] = zf.add_file(file_path, arcname, level=policy.get("compress_level")).sha256
+                except OSError as e:
+                    print(f"Error packing file {file_path}: {e}")
+                    failed.append(arcname)
+                percentage = int((i + 1) / total * 100)
+                self.report(percentage, f"Performing Incremental Backup... {i + 1}/{total}")
+
+            # Add info.json inside zip
+            info = {
+                "backup_date": str(datetime.datetime.now()),
+                "user": self.username,
+                "files_count": len(hashes),
+                "source": self.source_path,
+                "type": "FULL_BACKUP" if full else "INCREMENTAL_BACKUP",
+                "deleted": [] if full else scan.deleted,
+                "checksums": deltas.checksums(hashes) if deltas is not None else hashes,
+                "metadata_only": metadata_only,
+                "deltas": deltas.deltas if deltas is not None else {}
+            }
+            zf.writestr("info.json", json.dumps(info, indent=4))
+
+        if not self.is_running:
+            self.cancelled(zip_path)
+            return
+
+        problems = []
+        if self.config.get("verify_after_write", True):
+            self.status.emit("Verifying archive...")
+            problems = verify_archive(zip_path, should_stop=self.should_stop)
+            if problems is None:
+                self.cancelled(zip_path)
+                return
+        if problems:
+            # Leave the index alone so the next run archives the same files again
+            os.remove(zip_path)
+            self.audit.emit("Verify", "Corrupt", f"{zip_name}: {format_problems(problems)}")
+            self.done.emit(False, f"Backup failed verification and was discarded:\n{format_problems(problems)}")
+            return
+
+        index.commit(scan, hashes, failed)
+        BackupCatalog(self.temp_path).add(zip_path, len(hashes), self.source_path, self.username,
+                                          verified=time.time())
+        if deltas is not None:
+            deltas.commit(zip_name)
+        self.update_backup_state(current_timestamp)
+        self.progress.emit(100)
+        self.audit.emit("Incremental Backup", "Success", f"Created {zip_name} with {len(hashes)} files, {len(scan.deleted)} deleted, {len(failed)} failed")
+        self.done.emit(True, f"Backup Successful!\nCreated {zip_name}")
+        return True
+
+    def run_snapshot(self):
+        current_timestamp = datetime.datetime.now().timestamp()
+        store = open_snapshot_store(self.backend, self.temp_path, self.config, self.throttle)
+        name = f"{self.username}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        previous = store.latest_manifest()
+        expected = len(previous["files"]) if previous else 0
+
+        def on_progress(count, arcname):
+            percentage = min(99, int(count / expected * 100)) if expected else 0
+            self.report(percentage, f"Performing Incremental Backup... {count} files")
+
+        try:
+            manifest = store.backup(self.source_path, name, user=self.username, previous=previous,
+                                    progress=on_progress, should_stop=self.should_stop, rules=self.rules)
+        except (ChunkStoreError, LinkStoreError):
+            if not self.is_running:
+                self.cancelled()
+                return
+            raise
+        stats = manifest["stats"]
+        BackupCatalog(self.temp_path).add_snapshot(store, name)
+
+        self.update_backup_state(current_timestamp)
+        self.progress.emit(100)
+        stored_mb = stats["bytes_stored"] / (1024 * 1024)
+        self.audit.emit("Incremental Backup", "Success", f"Snapshot {name}: {stats['changed_files']} changed files, {stored_mb:.2f} MB new data")
+        self.done.emit(True, f"Backup Successful!\nSnapshot {name}\n{stats['changed_files']} changed files, {stored_mb:.2f} MB new data")
+        return True
+
+    def run_cleanup(self):
+        # The backup itself succeeded, a failing cleanup is only audited
+        self.status.emit("Applying retention policy...")
+        try:
+            self.cleanup(self.temp_path)
+        except Exception as e:
+            print(f"Cleanup failed: {e}")
+            self.audit.emit("Cleanup", "Error", str(e))
+
+
+class ScrubJob(Job):
+    """
+    Re-reads archives that have not been verified for a while, capped at a
+    bytes/s budget so it never competes with the workstation. Runs outside the
+    backup queue at the lowest thread priority and is paused while a backup runs.
+    """
+    kind = "scrub"
+
+    def __init__(self, folder, interval_hours=SCRUB_INTERVAL_HOURS, rate_mb=SCRUB_RATE_MB):
+        super().__init__()
+        self.folder = folder
+        self.interval_hours = interval_hours
+        self.limiter = RateLimiter(rate_mb * 1024 * 1024)
+
+    def run(self):
+        try:
+            catalog = BackupCatalog(self.folder).load()
+            checked = 0
+            corrupt = 0
+            for entry in scrub_due(catalog.sorted_entries(), self.interval_hours):
+                if self.should_stop():
+                    break
+                problems = verify_archive(catalog.archive_path(entry["name"]), self.limiter, self.should_stop)
+                if problems is None:
+                    break
+                catalog.mark_verified(entry["name"], problems, time.time())
+                checked += 1
+                if problems:
+                    corrupt += 1
+                    self.audit.emit("Scrub", "Corrupt", f"{entry['name']}: {format_problems(problems)}")
+            if checked:
+                self.audit.emit("Scrub", "Success" if not corrupt else "Corrupt", f"Verified {checked} archives, {corrupt} corrupt")
+        except Exception as e:
+            print(f"Scrub failed: {e}")
+            self.audit.emit("Scrub", "Failed", str(e))
+        finally:
+            self.finished.emit()
+
+
+class RestoreJob(Job):
+    kind = "restore"
+
+    def __init__(self, catalog, relpaths, dest_path):
+        super().__init__()
+        self.catalog = catalog
+        self.relpaths = relpaths
+        self.dest_path = dest_path
+
+    def run(self):
+        try:
+            self.run_restore()
+        except (OSError, RestoreError) as e:
+            print(f"Restore failed: {e}")
+            self.audit.emit("Restore", "Failed", str(e))
+            self.done.emit(False, f"Restore failed: {e}")
+        finally:
+            self.finished.emit()
+
+    def run_restore(self):
+        total = sum(1 for rel in self.relpaths for _ in self.catalog.iter_subtree(rel))
+        if not total:
+            raise RestoreError(f"Nothing to restore for {', '.join(self.relpaths)}")
+        restored = 0
+        restored_bytes = 0
+
+        def on_progress(count, rel):
+            percentage = min(99, int((restored + count) / total * 100)) if total else 0
+            self.report(percentage, f"Restoring... {rel}")
+
+        for rel in self.relpaths:
+            # Restore the selection itself, not the folders above it
+            strip_prefix = rel.strip("/").rpartition("/")[0]
+            files, size = self.catalog.extract(rel, self.dest_path, strip_prefix,
+                                               should_stop=self.should_stop, progress=on_progress)
+            restored += files
+            restored_bytes += size
+            if not self.is_running:
+                break
+
+        if not self.is_running:
+            self.status.emit("Restore Cancelled.")
+            self.audit.emit("Restore", "Cancelled", f"{restored} files restored to {self.dest_path}")
+            return
+
+        size_mb = restored_bytes / (1024 * 1024)
+        self.progress.emit(100)
+        self.audit.emit("Restore", "Success", f"{restored} files ({size_mb:.2f} MB) restored to {self.dest_path}")
+        self.done.emit(True, f"Restore Successful!\n{restored} files ({size_mb:.2f} MB) restored to\n{self.dest_path}")
+
+
+class SnapshotRestoreJob(Job):
+    """
+    Restores from the newest snapshot of a chunks or links store; snapshots
+    are complete, so there is nothing to merge.
+    """
+    kind = "restore"
+
+    def __init__(self, store, relpaths, dest_path, name=None):
+        super().__init__()
+        self.store = store
+        self.relpaths = relpaths
+        self.dest_path = dest_path
+        self.name = name
+
+    def run(self):
+        try:
+            self.run_restore()
+        except (OSError, ChunkStoreError, LinkStoreError, RestoreError) as e:
+            print(f"Restore failed: {e}")
+            self.audit.emit("Restore", "Failed", str(e))
+            self.done.emit(False, f"Restore failed: {e}")
+        finally:
+            self.finished.emit()
+
+    def run_restore(self):
+        names = self.store.list_manifests()
+        name = self.name or (names[-1] if names else None)
+        if name is None:
+            raise RestoreError("No snapshot to restore from")
+        files = self.store.load_manifest(name)["files"]
+
+        restored = 0
+        for i, rel in enumerate(self.relpaths):
+            prefix = rel.strip("/")
+            if not any(not prefix or arcname == prefix or arcname.startswith(prefix + "/") for arcname in files):
+                raise RestoreError(f"{rel or 'The project'} is not in snapshot {name}")
+            self.report(int(i / len(self.relpaths) * 100), f"Restoring... {rel}")
+            # Restore the selection itself, not the folders above it
+            restored += self.store.restore(name, self.dest_path, paths=[prefix] if prefix else None,
+                                           strip_prefix=prefix.rpartition("/")[0])
+            if not self.is_running:
+                break
+
+        if not self.is_running:
+            self.status.emit("Restore Cancelled.")
+            self.audit.emit("Restore", "Cancelled", f"{restored} files restored to {self.dest_path}")
+            return
+
+        self.progress.emit(100)
+        self.audit.emit("Restore", "Success", f"{restored} files restored from {name} to {self.dest_path}")
+        self.done.emit(True, f"Restore Successful!\n{restored} files restored from {name} to\n{self.dest_path}")
+
+
+class BackupEngine:
+    """
+    Everything the backup manager does, without a window: builds the jobs from
+    the configuration, runs retention and verification, and writes the audit
+    log. SafeCopyApp, the CLI and the daemon all go through this.
+    """
+
+    def __init__(self, config, config_path=None):
+        self.config = config
+        self.config_path = config_path
+        self._audit_log = None
+        self._rules = None
+
+    @classmethod
+    def from_file(cls, config_path=CONFIG_PATH):
+        with open(config_path, "r") as f:
+            return cls(json.load(f), config_path)
+
+    def save_config(self):
+        with open(self.config_path, "w") as f:
+            json.dump(self.config, f, indent=4)
+
+    # -------------------------
+    # Paths
+    # -------------------------
+    @property
+    def temp_path(self):
+        return self.backup_folder()
+
+    def backup_folder(self, username=None):
+        # With "backup_scope": "user" state, index, catalog and archives are all per user
+        root = self.config.get("temp_save_path")
+        if root and self.config.get("backup_scope", SCOPE_SHARED) == SCOPE_USER:
+            return os.path.join(root, username or self.config.get("current_username") or "Unknown")
+        return root
+
+    @property
+    def state_file(self):
+        return os.path.join(self.temp_path, STATE_FILE_NAME)
+
+    def get_backend(self):
+        return self.config.get("backup_backend", BACKEND_ZIP)
+
+    def get_snapshot_store(self, temp_path=None):
+        # None for the zip backend
+        return open_snapshot_store(self.get_backend(), temp_path or self.temp_path, self.config)
+
+    def get_catalog(self, temp_path=None):
+        return BackupCatalog(temp_path or self.temp_path)
+
+    def get_rules(self):
+        # Compiled once and reused until the backup_rules section changes
+        section = json.dumps(self.config.get("backup_rules") or {}, sort_keys=True)
+        if self._rules is None or self._rules[0] != section:
+            self._rules = (section, BackupRules.from_config(self.config))
+        return self._rules[1]
+
+    def get_lease(self, folder=None, username=None, job=""):
+        return BackupLease(folder or self.temp_path, username or self.config.get("current_username", ""), job,
+                           heartbeat_seconds=self.config.get("lock_heartbeat_seconds", HEARTBEAT_SECONDS),
+                           stale_seconds=self.config.get("lock_stale_seconds", STALE_SECONDS))
+
+    def get_throttle(self):
+        # Reads the "throttle" section on every policy check, so edits apply to running jobs
+        return BackupThrottle(lambda: self.config.get("throttle", {}))
+
+    # -------------------------
+    # Audit
+    # -------------------------
+    @property
+    def audit_log(self):
+        if self._audit_log is None:
+            self._audit_log = AuditLog(self.config.get("audit_log_path", "audit.dat"),
+                                       max_bytes=int(self.config.get("audit_max_mb", MAX_BYTES / (1024 * 1024)) * 1024 * 1024),
+                                       backup_count=self.config.get("audit_backup_count", BACKUP_COUNT),
+                                       dedup_seconds=self.config.get("audit_dedup_seconds", DEDUP_SECONDS))
+        return self._audit_log
+
+    def log_audit(self, action, status, details=""):
+        # Only queues the event, the file is written on the audit log's own thread
+        self.audit_log.log(action, status, details, self.config.get("current_username", "Unknown"))
+
+    def query_audit(self, **filters):
+        self.audit_log.flush()
+        return self.audit_log.query(**filters)
+
+    def close(self):
+        if self._audit_log is not None:
+            self._audit_log.close()
+
+    # -------------------------
+    # Jobs
+    # -------------------------
+    def incremental_job(self, reason="", paths=None, username=None, cleanup=False):
+        # cleanup: apply the retention policy on the job's thread once the backup succeeded
+        folder = self.backup_folder(username)
+        os.makedirs(folder, exist_ok=True)
+        return IncrementalBackupJob(self.config, folder, os.path.join(folder, STATE_FILE_NAME), self.get_backend(),
+                                    reason, paths=paths, username=username, throttle=self.get_throttle(),
+                                    rules=self.get_rules(), lease=self.get_lease(folder, username, "incremental"),
+                                    wait_for_lease=self.config.get("when_locked", WHEN_LOCKED_QUEUE) == WHEN_LOCKED_QUEUE,
+                                    cleanup=self.cleanup if cleanup else None)
+
+    def external_job(self, dest_path):
+        return ExternalBackupJob(
+            self.config.get("handle_path"),
+            dest_path,
+            self.config.get("current_username"),
+            self.get_backend(),
+            workers=self.config.get("compression_workers"),
+            level=self.config.get("compression_level", COMPRESS_LEVEL),
+            verify_after_write=self.config.get("verify_after_write", True),
+            throttle=self.get_throttle(),
+            rules=self.get_rules()
+        )
+
+    def scrub_job(self, interval_hours=None):
+        if interval_hours is None:
+            interval_hours = self.config.get("scrub_interval_hours", SCRUB_INTERVAL_HOURS)
+        return ScrubJob(self.temp_path, interval_hours, self.config.get("scrub_rate_mb", SCRUB_RATE_MB))
+
+    def restore_job(self, relpaths, dest_path, backup_dir=None):
+        store = self.get_snapshot_store(backup_dir)
+        if store is not None:
+            return SnapshotRestoreJob(store, relpaths, dest_path)
+        catalog = RestoreCatalog(backup_dir or self.temp_path).load()
+        return RestoreJob(catalog, relpaths, dest_path)
+
+    def run_job(self, job, on_status=None):
+        # Runs a job on the calling thread; returns (success, message)
+        result = [True, ""]
+
+        def on_done(success, message):
+            result[0] = success
+            result[1] = message
+
+        job.audit.connect(self.log_audit)
+        job.done.connect(on_done)
+        if on_status:
+            job.status.connect(on_status)
+        job.run()
+        if not job.is_running:
+            return False, "Cancelled"
+        return result[0], result[1]
+
+    def last_backup_time(self):
+        return IncrementalBackupJob.read_state(self.state_file)
+
+    def incremental_due(self):
+        due = next_incremental_due(self.last_backup_time())
+        if due <= time.time():
+            # Someone else is backing up right now; their run updates the shared state, look again later
+            lease = self.get_lease()
+            if lease.holder() is not None:
+                return time.time() + lease.stale_seconds
+        return due
+
+    # -------------------------
+    # Retention
+    # -------------------------
+    def get_retention_plan(self, temp_path=None):
+        # Plans against the catalog only; the backup folder is not listed or stat'ed
+        temp_path = temp_path or self.temp_path
+        catalog = self.get_catalog(temp_path)
+        if not catalog.exists():
+            catalog.sync(self.get_snapshot_store(temp_path))
+        else:
+            catalog.load()
+        wanted = TYPE_SNAPSHOT if self.get_backend() in SNAPSHOT_BACKENDS else None
+        entries = [e for e in catalog.entries.values() if (e["type"] == TYPE_SNAPSHOT) == (wanted is not None)]
+        plan = plan_retention(
+            entries,
+            daily=self.config.get("keep_daily", KEEP_DAILY),
+            weekly=self.config.get("keep_weekly", KEEP_WEEKLY),
+            monthly=self.config.get("keep_monthly", KEEP_MONTHLY)
+        )
+        return catalog, plan
+
+    def cleanup(self, temp_path=None, dry_run=False):
+        temp_path = temp_path or self.temp_path
+        catalog, plan = self.get_retention_plan(temp_path)
+        if dry_run or not plan.prune:
+            return plan
+
+        # Never delete under a running backup; the next cleanup picks the chains up
+        lease = self.get_lease(temp_path, job="cleanup")
+        if not lease.acquire():
+            print(f"Cleanup skipped, {describe_holder(lease.holder())} is backing up")
+            return RetentionPlan(plan.keep + plan.prune, [], plan.reasons)
+        try:
+            # Planned again now that nobody can add to the folder meanwhile
+            catalog, plan = self.get_retention_plan(temp_path)
+            return self.delete_pruned(catalog, plan, temp_path)
+        finally:
+            lease.release()
+
+    def delete_pruned(self, catalog, plan, temp_path):
+        names = plan.prune_names()
+        store = self.get_snapshot_store(temp_path)
+        if store is not None:
+            removed, reclaimed = store.drop(names)
+            catalog.remove(names)
+            unit = "chunks" if self.get_backend() == BACKEND_CHUNKS else "files"
+            self.log_audit("Cleanup", "Success", f"Deleted {len(names)} old snapshots, {removed} {unit} ({reclaimed / (1024 * 1024):.2f} MB)")
+            return plan
+
+        deleted_count = 0
+        for name in names:
+            try:
+                catalog.delete_archive(name)
+                deleted_count += 1
+            except OSError as e:
+                print(f"Unable to delete {name}: {e}")
+            
+        if deleted_count > 0:
+            self.log_audit("Cleanup", "Success", f"Deleted {deleted_count} archives in {len(plan.prune)} chains ({plan.bytes_reclaimed / (1024 * 1024):.2f} MB)")
+        return plan
+
+    # -------------------------
+    # Verify
+    # -------------------------
+    def verify(self, names=None, should_stop=None):
+        # name -> problems for the given archives (all catalogued ones by default), recorded in the catalog
+        store = self.get_snapshot_store()
+        if store is not None:
+            return self.verify_snapshots(store, names)
+        catalog = self.get_catalog().load()
+        results = {}
+        for name in names or [e["name"] for e in catalog.sorted_entries() if e["type"] != TYPE_SNAPSHOT]:
+            problems = verify_archive(catalog.archive_path(name), should_stop=should_stop)
+            if problems is None:
+                break
+            catalog.mark_verified(name, problems, time.time())
+            results[name] = problems
+            if problems:
+                self.log_audit("Verify", "Corrupt", f"{name}: {format_problems(problems)}")
+        return results
+
+    def verify_snapshots(self, store, names=None):
+        # Same result as verify, for the snapshots of a chunks or links store
+        catalog = self.get_catalog().sync(store)
+        known = store.list_manifests()
+        names = names or known
+        results = {name: [] if name in known else [("", "No such snapshot")] for name in names}
+        present = [name for name in names if name in known]
+        for name, arcname, problem in store.verify(present) if present else []:
+            results[name].append((arcname, problem))
+        now = time.time()
+        for name, problems in results.items():
+            catalog.mark_verified(name, problems, now)
+            if problems:
+                self.log_audit("Verify", "Corrupt", f"{name}: {format_problems(problems)}")
+        return results
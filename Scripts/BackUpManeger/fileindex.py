@@ -0,0 +1,368 @@
+import os
+import json
+import gzip
+import queue
+import threading
+
+try:
+    from .rules import select_entries
+except ImportError:
+    from rules import select_entries
+
+INDEX_FILE_NAME = "file_index.json.gz"
+INDEX_VERSION = 1
+
+# Positions inside a file record: [size, mtime_ns, inode, sha256]
+SIZE, MTIME, INODE, SHA = range(4)
+
+# DirEntry.inode() is free on POSIX (d_ino from readdir) but costs an extra
+# syscall per file on Windows, where scandir already gives size and mtime for free.
+USE_INODE = os.name != "nt"
+
+
+def iter_tree(root, should_stop=None, rules=None, rel_root="", policy=None):
+    """
+    Yields (relpath, abspath, size, mtime, policy) with one scandir per folder
+    and no extra stat on Windows. rules (rules.BackupRules) prunes excluded
+    folders before they are listed; rel_root/policy describe root when it is
+    a subfolder of the backed up tree.
+    """
+    stack = [(rel_root, root, policy or {})]
+    while stack:
+        if should_stop and should_stop():
+            return
+        rel_dir, abs_dir, dir_policy = stack.pop()
+        try:
+            entries = os.scandir(abs_dir)
+        except OSError as e:
+            print(f"Unable to list {abs_dir}: {e}")
+            continue
+        with entries:
+            selected = select_entries(rules, rel_dir, entries, dir_policy)
+        for entry, is_dir, rel, entry_policy in selected:
+            if is_dir:
+                stack.append((rel, entry.path, entry_policy))
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            yield rel, entry.path, st.st_size, st.st_mtime, entry_policy
+
+
+class FileDiscovery(threading.Thread):
+    """
+    Walks the tree on its own thread and feeds a bounded queue, so archiving
+    starts with the first file found and memory does not grow with the tree.
+    Consumers iterate over it; the counters give a running size estimate.
+    A consumer that stops reading calls close() instead of join(): the walk
+    stops and the queue is emptied, so the thread never blocks on it.
+    """
+
+    def __init__(self, root, maxsize=10000, should_stop=None, rules=None):
+        super().__init__(name="file-discovery", daemon=True)
+        self.root = root
+        self.rules = rules
+        self.should_stop = should_stop
+        self.items = queue.Queue(maxsize=maxsize)
+        self.files_found = 0
+        self.bytes_found = 0
+        self.done = False
+        self.closed = threading.Event()
+
+    def stopped(self):
+        return self.closed.is_set() or bool(self.should_stop and self.should_stop())
+
+    def run(self):
+        try:
+            for item in iter_tree(self.root, self.stopped, self.rules):
+                self.files_found += 1
+                self.bytes_found += item[2]
+                while True:
+                    if self.stopped():
+                        return
+                    try:
+                        self.items.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        pass
+        finally:
+            self.done = True
+            self.put_sentinel()
+
+    def put_sentinel(self):
+        # Never blocks: once stopped nobody may be reading, so make room by dropping items
+        while True:
+            if not self.stopped():
+                try:
+                    self.items.put(None, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+            try:
+                self.items.put_nowait(None)
+                return
+            except queue.Full:
+                self.drain()
+
+    def drain(self):
+        try:
+            while True:
+                self.items.get_nowait()
+        except queue.Empty:
+            pass
+
+    def close(self):
+        # The consumer is done reading: stop the walk and wait for the thread
+        self.closed.set()
+        self.drain()
+        self.join()
+
+    def __iter__(self):
+        while True:
+            item = self.items.get()
+            if item is None:
+                return
+            yield item
+
+
+class ScanResult:
+    def __init__(self):
+        self.changed = []       # (relpath, abspath, record) for new or modified files
+        self.deleted = []       # relpaths that disappeared since the last commit
+        self.files = {}         # relpath -> record for everything seen in this scan
+        self.policies = {}      # relpath -> backup policy, only for files that have one
+        self.rules = None       # signature of the rules the scan ran with
+        self.dirs = {}          # reldir -> mtime_ns
+        self.dirs_listed = 0
+        self.dirs_skipped = 0
+        self.total_bytes = 0
+
+
+class FileIndex:
+    """
+    Persistent path -> (size, mtime_ns, inode, sha256) index of the backup source.
+
+    A file counts as changed when any of size, mtime or inode differ from the
+    committed record, so files restored or copied with an older mtime are caught
+    too. The index is only committed after an archive was written successfully.
+    """
+
+    def __init__(self, index_path, source_path):
+        self.index_path = index_path
+        self.source_path = source_path
+        self.files = {}
+        self.dirs = {}
+        self.rules = None
+        self.load()
+
+    @classmethod
+    def for_state_file(cls, state_file, source_path):
+        return cls(os.path.join(os.path.dirname(state_file), INDEX_FILE_NAME), source_path)
+
+    def exists(self):
+        return bool(self.files) or bool(self.dirs)
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with gzip.open(self.index_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"File index unreadable, rebuilding: {e}")
+            return
+
+        if data.get("version") != INDEX_VERSION or data.get("source") != self.source_path:
+            return
+        self.files = data.get("files", {})
+        self.dirs = data.get("dirs", {})
+        self.rules = data.get("rules")
+
+    def save(self):
+        data = {
+            "version": INDEX_VERSION,
+            "source": self.source_path,
+            "rules": self.rules,
+            "dirs": self.dirs,
+            "files": self.files,
+        }
+        tmp_path = f"{self.index_path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    # -------------------------
+    # Scan
+    # -------------------------
+    def _children_by_dir(self):
+        files_by_dir = {}
+        for rel in self.files:
+            files_by_dir.setdefault(rel.rpartition("/")[0], []).append(rel)
+        subdirs_by_dir = {}
+        for rel in self.dirs:
+            if rel:
+                subdirs_by_dir.setdefault(rel.rpartition("/")[0], []).append(rel)
+        return files_by_dir, subdirs_by_dir
+
+    def scan(self, trust_dir_mtime=False, should_stop=None, rules=None):
+        """
+        One pass over the source with os.scandir, reusing the DirEntry stat.
+
+        trust_dir_mtime: skip re-listing folders whose mtime did not change and
+        carry their files over from the index. A folder mtime only changes when
+        entries are added, removed or renamed, so in-place saves inside such a
+        folder are missed; only enable it for trees where tools save by
+        write-temp-then-rename.
+        rules: rules.BackupRules; excluded folders are not entered at all.
+        """
+        result = ScanResult()
+        result.rules = rules.signature if rules else None
+        # Folders carried over were selected under the old rules, list everything again when they changed
+        trust_dir_mtime = trust_dir_mtime and result.rules == self.rules
+        files_by_dir, subdirs_by_dir = self._children_by_dir() if trust_dir_mtime else ({}, {})
+
+        try:
+            root_mtime = os.stat(self.source_path).st_mtime_ns
+        except OSError:
+            return result
+
+        stack = [("", self.source_path, root_mtime, {})]
+        while stack:
+            if should_stop and should_stop():
+                return None
+            rel_dir, abs_dir, dir_mtime, dir_policy = stack.pop()
+            result.dirs[rel_dir] = dir_mtime
+
+            if trust_dir_mtime and self.dirs.get(rel_dir) == dir_mtime:
+                result.dirs_skipped += 1
+                for rel in files_by_dir.get(rel_dir, []):
+                    record = self.files[rel]
+                    result.files[rel] = record
+                    result.total_bytes += record[SIZE]
+                    policy = rules.policy(rel, False, dir_policy) if rules else dir_policy
+                    if policy:
+                        result.policies[rel] = policy
+                for sub_rel in subdirs_by_dir.get(rel_dir, []):
+                    sub_abs = os.path.join(self.source_path, *sub_rel.split("/"))
+                    sub_policy = rules.policy(sub_rel, True, dir_policy) if rules else dir_policy
+                    try:
+                        stack.append((sub_rel, sub_abs, os.stat(sub_abs).st_mtime_ns, sub_policy))
+                    except OSError:
+                        pass
+                continue
+
+            result.dirs_listed += 1
+            try:
+                entries = os.scandir(abs_dir)
+            except OSError as e:
+                print(f"Unable to list {abs_dir}: {e}")
+                continue
+
+            with entries:
+                selected = select_entries(rules, rel_dir, entries, dir_policy)
+            for entry, is_dir, rel, policy in selected:
+                try:
+                    if is_dir:
+                        stack.append((rel, entry.path, entry.stat().st_mtime_ns, policy))
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+
+                inode = entry.inode() if USE_INODE else 0
+                old = self.files.get(rel)
+                if old and old[SIZE] == st.st_size and old[MTIME] == st.st_mtime_ns and old[INODE] == inode:
+                    record = old
+                else:
+                    record = [st.st_size, st.st_mtime_ns, inode, None]
+                    result.changed.append((rel, entry.path, record))
+                result.files[rel] = record
+                result.total_bytes += st.st_size
+                if policy:
+                    result.policies[rel] = policy
+
+        result.deleted = [rel for rel in self.files if rel not in result.files]
+        return result
+
+    def scan_paths(self, relpaths, should_stop=None, rules=None):
+        """
+        Partial scan when the caller already knows where changes happened (a
+        manifest sent by a workstation). Only the given files and folders are
+        stat'ed; every other record is carried over from the index unchanged.
+        """
+        result = ScanResult()
+        result.rules = rules.signature if rules else None
+        result.files = dict(self.files)
+        result.dirs = dict(self.dirs)
+
+        def check(rel, abspath, st, policy):
+            if policy:
+                result.policies[rel] = policy
+            inode = st.st_ino if USE_INODE else 0
+            old = self.files.get(rel)
+            if old and old[SIZE] == st.st_size and old[MTIME] == st.st_mtime_ns and old[INODE] == inode:
+                return
+            record = [st.st_size, st.st_mtime_ns, inode, None]
+            result.changed.append((rel, abspath, record))
+            result.files[rel] = record
+
+        for rel in sorted(set(p.strip("/") for p in relpaths)):
+            if should_stop and should_stop():
+                return None
+            abspath = os.path.join(self.source_path, *rel.split("/")) if rel else self.source_path
+            prefix = rel + "/" if rel else ""
+            # Excluded paths fall through and drop out of the index like deleted ones
+            policy = rules.path_policy(rel) if rules and rel else {}
+            seen = set()
+            if policy is not None and os.path.isfile(abspath):
+                check(rel, abspath, os.stat(abspath), policy)
+                continue
+
+            # A folder, or a path that no longer exists: whatever the index has below it
+            # and is not found again counts as deleted
+            if policy is not None and os.path.isdir(abspath):
+                result.dirs_listed += 1
+                for full_rel, sub_abs, size, mtime, file_policy in iter_tree(abspath, should_stop, rules, rel, policy):
+                    seen.add(full_rel)
+                    try:
+                        check(full_rel, sub_abs, os.stat(sub_abs), file_policy)
+                    except OSError:
+                        continue
+            for old_rel in list(result.files):
+                if (old_rel == rel or old_rel.startswith(prefix)) and old_rel not in seen and old_rel in self.files:
+                    del result.files[old_rel]
+                    result.deleted.append(old_rel)
+
+        result.total_bytes = sum(record[SIZE] for record in result.files.values())
+        return result
+
+    # -------------------------
+    # Commit
+    # -------------------------
+    def seed_from_timestamp(self, result, last_backup_timestamp):
+        # First run after upgrading from the timestamp-only state: files older than
+        # the last backup were already archived, so do not back them up again
+        limit_ns = int(last_backup_timestamp * 1e9)
+        still_changed = []
+        for item in result.changed:
+            rel, abspath, record = item
+            if record[MTIME] > limit_ns:
+                still_changed.append(item)
+        result.changed = still_changed
+
+    def commit(self, result, hashes=None, failed=None):
+        # hashes: relpath -> sha256 for the files that were archived
+        # failed: relpaths that could not be archived, left out so the next scan retries them
+        for rel in failed or []:
+            result.files.pop(rel, None)
+            result.dirs.pop(rel.rpartition("/")[0], None)
+        if hashes:
+            for rel, digest in hashes.items():
+                record = result.files.get(rel)
+                if record is not None:
+                    record[SHA] = digest
+        self.files = result.files
+        self.dirs = result.dirs
+        self.rules = result.rules
+        self.save()
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import uuid
+import socket
+import datetime
+import threading
+
+import psutil
+
+LOCK_FILE_NAME = "backup.lock"
+HEARTBEAT_SECONDS = 30
+# A holder that has not renewed its lock for this long is presumed dead
+STALE_SECONDS = 300
+WAIT_POLL_SECONDS = 5
+
+
+def describe_holder(data):
+    if not data:
+        return "another workstation"
+    since = datetime.datetime.fromtimestamp(data.get("acquired", 0)).strftime("%H:%M")
+    return f"{data.get('user') or 'unknown'} on {data.get('host') or 'unknown host'} since {since}"
+
+
+def _read(path):
+    # Lock contents, {} while the creator has not written them yet, None when there is no lock
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError:
+        return {}
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {}
+
+
+class BackupLease:
+    """
+    backup.lock in the backup folder, naming the user, host and process that
+    is writing to it. Only one lease per folder can be held: every SafeCopyApp,
+    daemon and agent pointing at the same folder takes it before a backup.
+
+    The holder renews the lock every heartbeat_seconds from a background
+    thread. A lock that was not renewed for stale_seconds, or whose process
+    is gone on this host, is taken over. Creation is O_EXCL and a takeover
+    renames the old file aside first, so on a network share too only one
+    contender wins. A holder that finds its lock taken over calls on_lost.
+    """
+
+    def __init__(self, folder, user="", job="", heartbeat_seconds=HEARTBEAT_SECONDS, stale_seconds=STALE_SECONDS,
+                 on_lost=None):
+        self.folder = folder
+        self.path = os.path.join(folder, LOCK_FILE_NAME)
+        self.token = uuid.uuid4().hex
+        self.user = user
+        self.job = job
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.on_lost = on_lost
+        self.acquired = None
+        self.held = False
+        self.lost = False
+        self.stopping = threading.Event()
+        self.thread = None
+
+    # -------------------------
+    # State
+    # -------------------------
+    def record(self):
+        return {"token": self.token, "user": self.user, "host": socket.gethostname(), "pid": os.getpid(),
+                "job": self.job, "acquired": self.acquired, "heartbeat": time.time()}
+
+    def is_stale(self, data, now=None):
+        now = now or time.time()
+        if data.get("host") == socket.gethostname() and data.get("pid") and not psutil.pid_exists(data["pid"]):
+            return True
+        heartbeat = data.get("heartbeat")
+        if heartbeat is None:
+            # Not written yet, or written by a crashed creator: go by the file age
+            try:
+                heartbeat = os.path.getmtime(self.path)
+            except OSError:
+                return False
+        return now - heartbeat > self.stale_seconds
+
+    def holder(self):
+        # Contents of a live lock held by someone else, None when the folder is free
+        data = _read(self.path)
+        if data is None or data.get("token") == self.token or self.is_stale(data):
+            return None
+        return data
+
+    # -------------------------
+    # Acquire / release
+    # -------------------------
+    def try_acquire(self):
+        os.makedirs(self.folder, exist_ok=True)
+        for _ in range(3):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                data = _read(self.path)
+                if data is None:
+                    # Released in the meantime
+                    continue
+                if not self.is_stale(data) or not self.break_stale(data):
+                    return False
+                continue
+            self.acquired = time.time()
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.record(), f)
+            self.held = True
+            self.lost = False
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.heartbeat, name="backup-lease", daemon=True)
+            self.thread.start()
+            return True
+        return False
+
+    def break_stale(self, data):
+        aside = f"{self.path}.{self.token}.stale"
+        try:
+            os.rename(self.path, aside)
+        except OSError:
+            # Someone else took it over first
+            return False
+        taken = _read(aside) or {}
+        if taken.get("token") != data.get("token"):
+            # The lock changed hands between reading and renaming, put it back
+            try:
+                os.rename(aside, self.path)
+            except OSError as e:
+                print(f"Unable to restore backup lock: {e}")
+            return False
+        os.remove(aside)
+        print(f"Took over stale backup lock of {describe_holder(data)}")
+        return True
+
+    def acquire(self, wait=False, should_stop=None, on_wait=None, poll_seconds=WAIT_POLL_SECONDS):
+        """
+        True once the lease is held. With wait, polls until the holder lets go
+        or goes stale, calling on_wait(holder) each time; False if should_stop
+        says so first.
+        """
+        while not self.try_acquire():
+            if not wait:
+                return False
+            if on_wait:
+                on_wait(self.holder())
+            deadline = time.monotonic() + poll_seconds
+            while time.monotonic() < deadline:
+                if should_stop and should_stop():
+                    return False
+                time.sleep(min(0.5, poll_seconds))
+        return True
+
+    def release(self):
+        if not self.held:
+            return
+        self.held = False
+        self.stopping.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        data = _read(self.path)
+        if data is not None and data.get("token") == self.token:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                print(f"Unable to remove backup lock: {e}")
+
+    # -------------------------
+    # Heartbeat
+    # -------------------------
+    def heartbeat(self):
+        while not self.stopping.wait(self.heartbeat_seconds):
+            data = _read(self.path)
+            if data is None or data.get("token") != self.token:
+                self.lost = True
+                print(f"Backup lock in {self.folder} was taken over by {describe_holder(data)}")
+                if self.on_lost:
+                    self.on_lost()
+                return
+            tmp_path = f"{self.path}.{self.token}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.record(), f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                # A reader may have the file open on Windows; the next beat tries again
+                print(f"Unable to renew backup lock: {e}")
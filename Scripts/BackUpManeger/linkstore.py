@@ -0,0 +1,337 @@
+import os
+import stat
+import json
+import gzip
+import errno
+import shutil
+import datetime
+
+try:
+    from .rules import select_entries, MODE_METADATA
+except ImportError:
+    from rules import select_entries, MODE_METADATA
+
+# ---------------------------------------------------------------------------
+# Hard-link snapshots
+# ---------------------------------------------------------------------------
+# Every backup is a plain folder tree that can be browsed and copied back by
+# hand. Files that did not change since the previous snapshot are hard links
+# to it (rsync --link-dest), so a snapshot costs only the changed bytes and
+# an unchanged project is one stat and one link per file.
+
+COPY_BLOCK = 8 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+PARTIAL_SUFFIX = ".partial"
+
+# Snapshot files are shared between snapshots, an edit through one would change them all
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+# The kernel copy is not available for this pair of files, fall back to the next method
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF, errno.ENOTSUP, errno.EOPNOTSUPP,
+                getattr(errno, "ENOTSOCK", errno.EINVAL)}
+
+
+def _copy_file_range(infd, outfd, offset, count):
+    return os.copy_file_range(infd, outfd, count)
+
+
+def _sendfile(infd, outfd, offset, count):
+    return os.sendfile(outfd, infd, offset, count)
+
+
+# In the kernel without a round trip through Python; copy_file_range also lets Btrfs/XFS reflink
+KERNEL_COPIES = [copy for name, copy in (("copy_file_range", _copy_file_range), ("sendfile", _sendfile))
+                 if hasattr(os, name)]
+
+
+def copy_file(src, dst, limiter=None):
+    """
+    Copies src to dst with copy_file_range or sendfile where the platform has
+    them, else in blocks through a reused buffer. limiter: optional
+    throttle.RateLimiter charged before every block. Returns the bytes copied.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(infd).st_size
+        for kernel_copy in KERNEL_COPIES:
+            copied = 0
+            try:
+                while True:
+                    count = min(COPY_BLOCK, max(size - copied, 0)) or COPY_BLOCK
+                    if limiter:
+                        limiter.consume(min(count, max(size - copied, 0)))
+                    sent = kernel_copy(infd, outfd, copied, count)
+                    if not sent:
+                        return copied
+                    copied += sent
+            except OSError as e:
+                if copied or e.errno not in _UNSUPPORTED:
+                    raise
+
+        copied = 0
+        buf = bytearray(READ_SIZE)
+        view = memoryview(buf)
+        while True:
+            n = fsrc.readinto(buf)
+            if not n:
+                return copied
+            if limiter:
+                limiter.consume(n)
+            fdst.write(view[:n])
+            copied += n
+
+
+def _remove_readonly(func, path, exc_info):
+    # Windows refuses to delete read-only files
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+class LinkStoreError(Exception):
+    pass
+
+
+class LinkStore:
+    """
+    Hard-link snapshot store.
+
+    root/snapshots/<name>/         the project as it was, one folder per backup
+    root/manifests/<name>.json.gz  size and mtime of every file in the snapshot
+
+    Same manifest interface as ChunkStore, so the catalog and retention treat
+    both alike. Needs a destination filesystem with hard links (NTFS, ext4 ..);
+    where linking fails the file is copied instead.
+    """
+
+    def __init__(self, root, read_limiter=None, write_limiter=None):
+        # Optional throttle.RateLimiter; copies are charged to both
+        self.root = root
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.manifests_dir = os.path.join(root, "manifests")
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    # -------------------------
+    # Manifests
+    # -------------------------
+    def snapshot_path(self, name):
+        return os.path.join(self.snapshots_dir, name)
+
+    def manifest_path(self, name):
+        return os.path.join(self.manifests_dir, f"{name}.json.gz")
+
+    def list_manifests(self):
+        names = [f[:-len(".json.gz")] for f in os.listdir(self.manifests_dir) if f.endswith(".json.gz")]
+        # Names start with the user but end with the timestamp, sort on that
+        return sorted(names, key=lambda n: n.rsplit("_", 2)[-2:])
+
+    def load_manifest(self, name):
+        with gzip.open(self.manifest_path(name), "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        path = self.manifest_path(manifest["name"])
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def latest_manifest(self):
+        names = self.list_manifests()
+        return self.load_manifest(names[-1]) if names else None
+
+    # -------------------------
+    # Backup
+    # -------------------------
+    def copy(self, src, dst):
+        if self.read_limiter:
+            # One budget per direction; the copy charges the write side block by block
+            self.read_limiter.consume(os.path.getsize(src))
+        return copy_file(src, dst, self.write_limiter)
+
+    def discard_partial(self):
+        # Leftovers of a backup that was cancelled or crashed
+        for name in os.listdir(self.snapshots_dir):
+            if name.endswith(PARTIAL_SUFFIX):
+                shutil.rmtree(os.path.join(self.snapshots_dir, name), onerror=_remove_readonly)
+
+    def backup(self, source_path, name, user="", previous=None, progress=None, should_stop=None, rules=None):
+        """
+        Snapshot source_path into snapshots/<name>. Files whose size and mtime
+        match the previous manifest are hard-linked from its snapshot, all
+        others are copied. The tree is built under <name>.partial and renamed
+        once complete, so a snapshot folder is never half written.
+        """
+        if previous is None:
+            previous = self.latest_manifest()
+        prev_files = previous["files"] if previous and previous.get("source") == source_path else {}
+        prev_dir = self.snapshot_path(previous["name"]) if prev_files else None
+
+        self.discard_partial()
+        target = self.snapshot_path(name) + PARTIAL_SUFFIX
+        files = {}
+        stats = {"files": 0, "changed_files": 0, "linked_files": 0, "bytes_read": 0, "bytes_stored": 0}
+
+        stack = [("", source_path, {})]
+        try:
+            while stack:
+                rel_dir, abs_dir, dir_policy = stack.pop()
+                out_dir = os.path.join(target, *rel_dir.split("/")) if rel_dir else target
+                os.makedirs(out_dir, exist_ok=True)
+                try:
+                    entries = os.scandir(abs_dir)
+                except OSError as e:
+                    print(f"Unable to list {abs_dir}: {e}")
+                    continue
+                with entries:
+                    selected = select_entries(rules, rel_dir, entries, dir_policy)
+
+                for entry, is_dir, rel, policy in selected:
+                    if should_stop and should_stop():
+                        raise LinkStoreError("Backup cancelled")
+                    if is_dir:
+                        stack.append((rel, entry.path, policy))
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+
+                    if policy.get("mode") == MODE_METADATA:
+                        files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "metadata_only": True}
+                    else:
+                        out_path = os.path.join(out_dir, entry.name)
+                        old = prev_files.get(rel)
+                        if not (old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns
+                                and not old.get("metadata_only") and self.link(prev_dir, rel, out_path)):
+                            try:
+                                self.copy(entry.path, out_path)
+                                os.utime(out_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                                os.chmod(out_path, READ_ONLY)
+                            except OSError as e:
+                                print(f"Error copying file {entry.path}: {e}")
+                                continue
+                            stats["changed_files"] += 1
+                            stats["bytes_read"] += st.st_size
+                            stats["bytes_stored"] += st.st_size
+                        else:
+                            stats["linked_files"] += 1
+                        files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+                    stats["files"] += 1
+                    if progress:
+                        progress(stats["files"], rel)
+        except BaseException:
+            # Anything left behind is removed by discard_partial() on the next run
+            shutil.rmtree(target, ignore_errors=True)
+            raise
+
+        os.replace(target, self.snapshot_path(name))
+        manifest = {
+            "name": name,
+            "backup_date": str(datetime.datetime.now()),
+            "type": "LINK_SNAPSHOT",
+            "user": user,
+            "source": source_path,
+            "parent": previous["name"] if previous else None,
+            "stats": stats,
+            "files": files,
+        }
+        self.save_manifest(manifest)
+        return manifest
+
+    @staticmethod
+    def link(prev_dir, rel, out_path):
+        # False when the file has to be copied: gone from the old snapshot, no hard
+        # links on this filesystem, or the link limit (1023 on NTFS) was reached
+        try:
+            os.link(os.path.join(prev_dir, *rel.split("/")), out_path)
+            return True
+        except OSError:
+            return False
+
+    # -------------------------
+    # Restore
+    # -------------------------
+    def restore(self, name, dest_path, paths=None, strip_prefix=""):
+        # paths: optional list of files or folder prefixes (relative, "/" separated);
+        # strip_prefix: leading folder left out of the restored paths
+        manifest = self.load_manifest(name)
+        snapshot = self.snapshot_path(name)
+        restored = 0
+        for arcname, entry in manifest["files"].items():
+            if paths and not any(arcname == p or arcname.startswith(p.rstrip("/") + "/") for p in paths):
+                continue
+            if entry.get("metadata_only"):
+                continue
+
+            # Copied, never linked: the restored file must not share its content with the backup
+            out_rel = arcname[len(strip_prefix) + 1:] if strip_prefix else arcname
+            out_path = os.path.join(dest_path, *out_rel.split("/"))
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            try:
+                written = copy_file(os.path.join(snapshot, *arcname.split("/")), out_path)
+            except OSError as e:
+                raise LinkStoreError(f"Unable to restore {arcname}: {e}")
+            if written != entry["size"]:
+                raise LinkStoreError(f"Restored file does not match manifest: {arcname}")
+            os.utime(out_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            restored += 1
+        return restored
+
+    # -------------------------
+    # Verify
+    # -------------------------
+    def verify(self, names=None):
+        # Returns a list of (manifest, path, problem); empty means every snapshot is complete.
+        # The snapshots hold no checksums, so this checks presence and size only.
+        problems = []
+        for name in names or self.list_manifests():
+            manifest = self.load_manifest(name)
+            snapshot = self.snapshot_path(name)
+            for arcname, entry in manifest["files"].items():
+                if entry.get("metadata_only"):
+                    continue
+                try:
+                    size = os.stat(os.path.join(snapshot, *arcname.split("/"))).st_size
+                except OSError:
+                    problems.append((name, arcname, "missing file"))
+                    continue
+                if size != entry["size"]:
+                    problems.append((name, arcname, f"size {size} instead of {entry['size']}"))
+        return problems
+
+    # -------------------------
+    # Deleting
+    # -------------------------
+    def drop(self, names):
+        """
+        Deletes the given snapshots. Returns (files, bytes) actually freed:
+        only the last link to a file gives its space back.
+        """
+        removed = 0
+        reclaimed = 0
+        for name in names:
+            snapshot = self.snapshot_path(name)
+            for dirpath, _, filenames in os.walk(snapshot):
+                for fname in filenames:
+                    try:
+                        st = os.lstat(os.path.join(dirpath, fname))
+                    except OSError:
+                        continue
+                    if st.st_nlink <= 1:
+                        removed += 1
+                        reclaimed += st.st_size
+            shutil.rmtree(snapshot, onerror=_remove_readonly)
+            if os.path.exists(self.manifest_path(name)):
+                os.remove(self.manifest_path(name))
+        return removed, reclaimed
+
+    def prune(self, keep):
+        # Drop all but the newest `keep` snapshots
+        names = self.list_manifests()
+        dropped = names[:-keep] if keep > 0 else names
+        removed, reclaimed = self.drop(dropped)
+        return dropped, removed, reclaimed
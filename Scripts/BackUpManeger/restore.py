@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import gzip
+import zlib
+import struct
+import zipfile
+import tempfile
+
+try:
+    from .delta import DeltaPatcher, DeltaError, DELTA_SUFFIX
+except ImportError:
+    from delta import DeltaPatcher, DeltaError, DELTA_SUFFIX
+
+CATALOG_FILE_NAME = "restore_catalog.json.gz"
+CATALOG_VERSION = 1
+INFO_MEMBER = "info.json"
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+LOCAL_SIG = 0x04034b50
+READ_SIZE = 1024 * 1024
+
+# Positions inside a cached member record
+OFFSET, METHOD, COMPRESS_SIZE, SIZE, CRC, MTIME = range(6)
+
+
+class RestoreError(Exception):
+    pass
+
+
+def is_full_archive(name):
+    return "_FULL_" in name
+
+
+def read_archive_members(path):
+    # Reads only the central directory: name -> [offset, method, compress_size, size, crc, date_time]
+    members = {}
+    info = {}
+    with zipfile.ZipFile(path) as zf:
+        for zinfo in zf.infolist():
+            if zinfo.is_dir():
+                continue
+            if zinfo.filename == INFO_MEMBER:
+                try:
+                    info = json.loads(zf.read(zinfo))
+                except ValueError:
+                    pass
+                continue
+            members[zinfo.filename] = [zinfo.header_offset, zinfo.compress_type, zinfo.compress_size,
+                                       zinfo.file_size, zinfo.CRC, list(zinfo.date_time)]
+    return members, info
+
+
+def extract_member(archive_path, record, out_file, limiter=None):
+    """
+    Seeks straight to the member's local header and streams it out, without
+    touching the rest of the archive. Returns the number of bytes written.
+    limiter: optional throttle.RateLimiter charged for every raw read.
+    """
+    with open(archive_path, "rb") as f:
+        f.seek(record[OFFSET])
+        header = f.read(LOCAL_HEADER.size)
+        fields = LOCAL_HEADER.unpack(header)
+        if fields[0] != LOCAL_SIG:
+            raise RestoreError(f"Bad local header at {record[OFFSET]} in {archive_path}")
+        f.seek(fields[9] + fields[10], os.SEEK_CUR)
+
+        method = record[METHOD]
+        if method == zipfile.ZIP_DEFLATED:
+            decompressor = zlib.decompressobj(-15)
+        elif method != zipfile.ZIP_STORED:
+            raise RestoreError(f"Unsupported compression {method} in {archive_path}")
+
+        remaining = record[COMPRESS_SIZE]
+        crc = 0
+        written = 0
+        while remaining > 0:
+            data = f.read(min(READ_SIZE, remaining))
+            if not data:
+                raise RestoreError(f"Truncated member in {archive_path}")
+            if limiter:
+                limiter.consume(len(data))
+            remaining -= len(data)
+            if method == zipfile.ZIP_DEFLATED:
+                data = decompressor.decompress(data)
+            crc = zlib.crc32(data, crc)
+            out_file.write(data)
+            written += len(data)
+        if method == zipfile.ZIP_DEFLATED:
+            data = decompressor.flush()
+            crc = zlib.crc32(data, crc)
+            out_file.write(data)
+            written += len(data)
+
+    if crc != record[CRC] or written != record[SIZE]:
+        raise RestoreError(f"Checksum mismatch restoring from {archive_path}")
+    return written
+
+
+class RestoreCatalog:
+    """
+    Merged view over the backup archives of one folder: the latest full backup
+    plus every incremental written after it, replayed oldest to newest so the
+    newest version of each path wins and paths recorded as deleted disappear.
+
+    Per-archive member tables are read from the zip central directories once
+    and cached in restore_catalog.json.gz, keyed by archive size and mtime.
+    """
+
+    def __init__(self, backup_dir, extra_archives=None):
+        self.backup_dir = backup_dir
+        self.extra_archives = extra_archives or []
+        self.cache_path = os.path.join(backup_dir, CATALOG_FILE_NAME)
+        self.archives = {}      # archive name -> {"path", "size", "mtime", "members", "info"}
+        self.entries = {}       # relpath -> (archive name, record)
+        self._children = None
+
+    # -------------------------
+    # Cache
+    # -------------------------
+    def _load_cache(self):
+        try:
+            with gzip.open(self.cache_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != CATALOG_VERSION:
+            return {}
+        return data.get("archives", {})
+
+    def _save_cache(self):
+        data = {"version": CATALOG_VERSION, "archives": self.archives}
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=1) as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Unable to write restore catalog: {e}")
+
+    def list_archives(self):
+        paths = []
+        if os.path.isdir(self.backup_dir):
+            paths = [os.path.join(self.backup_dir, f) for f in os.listdir(self.backup_dir) if f.endswith(".zip")]
+        return paths + list(self.extra_archives)
+
+    # -------------------------
+    # Build
+    # -------------------------
+    def load(self):
+        cached = self._load_cache()
+        archives = {}
+        changed = False
+        for path in self.list_archives():
+            name = os.path.basename(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entry = cached.get(name)
+            if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+                entry["path"] = path
+                archives[name] = entry
+                continue
+            try:
+                members, info = read_archive_members(path)
+            except (OSError, zipfile.BadZipFile) as e:
+                print(f"Skipping unreadable archive {path}: {e}")
+                continue
+            archives[name] = {"path": path, "size": st.st_size, "mtime": st.st_mtime,
+                              "members": members, "info": info}
+            changed = True
+
+        if changed or set(archives) != set(cached):
+            self.archives = archives
+            self._save_cache()
+        self.archives = archives
+        self._merge()
+        return self
+
+    def chain(self):
+        # Archive names in replay order
+        ordered = sorted(self.archives, key=lambda n: self.archives[n]["mtime"])
+        fulls = [n for n in ordered if is_full_archive(n)]
+        if fulls:
+            base = fulls[-1]
+            base_time = self.archives[base]["mtime"]
+            return [base] + [n for n in ordered if not is_full_archive(n) and self.archives[n]["mtime"] > base_time]
+        return ordered
+
+    def _merge(self):
+        entries = {}
+        for name in self.chain():
+            archive = self.archives[name]
+            deltas = archive["info"].get("deltas", {})
+            for rel in archive["info"].get("deleted", []):
+                entries.pop(rel, None)
+            for rel, record in archive["members"].items():
+                if rel.endswith(DELTA_SUFFIX) and rel[:-len(DELTA_SUFFIX)] in deltas:
+                    # Listed under the file's own path and size; extract() rebuilds it
+                    rel = rel[:-len(DELTA_SUFFIX)]
+                    record = list(record)
+                    record[SIZE] = deltas[rel]["size"]
+                entries[rel] = (name, record)
+        self.entries = entries
+        self._children = None
+
+    # -------------------------
+    # Browse
+    # -------------------------
+    def _build_children(self):
+        children = {"": [set(), []]}
+        for rel in self.entries:
+            parent, _, leaf = rel.rpartition("/")
+            children.setdefault(parent, [set(), []])[1].append(leaf)
+            # Register ancestor folders until one is already known
+            while parent:
+                grand = parent.rpartition("/")[0]
+                dirs = children.setdefault(grand, [set(), []])[0]
+                if parent in dirs:
+                    break
+                dirs.add(parent)
+                parent = grand
+        self._children = children
+
+    def list_dir(self, folder=""):
+        # Returns (sorted subfolder paths, sorted file paths) directly under folder
+        if self._children is None:
+            self._build_children()
+        dirs, files = self._children.get(folder.strip("/"), [set(), []])
+        prefix = folder.strip("/") + "/" if folder.strip("/") else ""
+        return sorted(dirs), sorted(prefix + f for f in files)
+
+    def get(self, relpath):
+        return self.entries.get(relpath)
+
+    def iter_subtree(self, relpath):
+        relpath = relpath.strip("/")
+        if relpath in self.entries:
+            yield relpath
+            return
+        prefix = relpath + "/" if relpath else ""
+        for rel in self.entries:
+            if rel.startswith(prefix):
+                yield rel
+
+    # -------------------------
+    # Extract
+    # -------------------------
+    def extract(self, relpath, dest_dir, strip_prefix="", should_stop=None, progress=None):
+        # Restores a file or a whole folder into dest_dir; returns (files, bytes)
+        files = 0
+        total = 0
+        for rel in self.iter_subtree(relpath):
+            if should_stop and should_stop():
+                break
+            name, record = self.entries[rel]
+            out_rel = rel[len(strip_prefix):].lstrip("/") if strip_prefix and rel.startswith(strip_prefix) else rel
+            out_path = os.path.join(dest_dir, *out_rel.split("/"))
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            tmp_path = out_path + ".restoring"
+            with open(tmp_path, "wb") as out_file:
+                delta = self.archives[name]["info"].get("deltas", {}).get(rel)
+                if delta is not None:
+                    total += self.extract_delta(name, rel, delta, out_file)
+                else:
+                    total += extract_member(self.archives[name]["path"], record, out_file)
+            os.replace(tmp_path, out_path)
+            mtime = time.mktime(tuple(record[MTIME]) + (0, 0, -1))
+            os.utime(out_path, (mtime, mtime))
+            files += 1
+            if progress:
+                progress(files, rel)
+        return files, total
+
+    def extract_delta(self, name, rel, delta, out_file):
+        # Unpacks the whole copy from the base archive to a temp file and replays the delta over it
+        base = self.archives.get(delta["base"])
+        if base is None or rel not in base["members"]:
+            raise RestoreError(f"Base of {rel} is missing: {delta['base']}")
+        with tempfile.TemporaryFile() as base_file:
+            extract_member(base["path"], base["members"][rel], base_file)
+            patcher = DeltaPatcher(base_file, out_file)
+            try:
+                extract_member(self.archives[name]["path"], self.archives[name]["members"][rel + DELTA_SUFFIX], patcher)
+                patcher.close()
+            except DeltaError as e:
+                raise RestoreError(f"Unable to rebuild {rel}: {e}")
+        if patcher.sha.hexdigest() != delta["sha256"]:
+            raise RestoreError(f"Checksum mismatch rebuilding {rel} from {name}")
+        return patcher.size
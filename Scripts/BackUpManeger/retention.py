@@ -0,0 +1,125 @@
+import datetime
+
+try:
+    from .catalog import TYPE_FULL, TYPE_SNAPSHOT
+except ImportError:
+    from catalog import TYPE_FULL, TYPE_SNAPSHOT
+
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+KEEP_MONTHLY = 6
+
+# Legacy full backups from before the catalog are never pruned automatically
+PROTECTED_PREFIX = "FULL_BACKUP"
+
+
+class Chain:
+    """
+    A full archive and the incrementals written after it, or a single chunk
+    snapshot. Incrementals only hold changes, so a chain is kept or pruned whole.
+    """
+
+    def __init__(self, base=None):
+        self.base = base
+        self.archives = [base] if base else []
+
+    @property
+    def start(self):
+        return self.archives[0]["mtime"]
+
+    @property
+    def end(self):
+        return self.archives[-1]["mtime"]
+
+    @property
+    def size(self):
+        return sum(a["size"] for a in self.archives)
+
+    def names(self):
+        return [a["name"] for a in self.archives]
+
+    def protected(self):
+        return any(name.startswith(PROTECTED_PREFIX) for name in self.names())
+
+
+def build_chains(entries):
+    # Incrementals written before the first full form a chain without a base
+    chains = []
+    current = None
+    for entry in sorted(entries, key=lambda e: e["mtime"]):
+        if entry["type"] == TYPE_SNAPSHOT:
+            chains.append(Chain(entry))
+        elif entry["type"] == TYPE_FULL:
+            current = Chain(entry)
+            chains.append(current)
+        else:
+            if current is None:
+                current = Chain()
+                chains.append(current)
+            current.archives.append(entry)
+    return sorted(chains, key=lambda c: c.end)
+
+
+def _period_keys(timestamp):
+    day = datetime.date.fromtimestamp(timestamp)
+    iso = day.isocalendar()
+    return day, (iso[0], iso[1]), (day.year, day.month)
+
+
+class RetentionPlan:
+    def __init__(self, keep, prune, reasons):
+        self.keep = keep
+        self.prune = prune
+        self.reasons = reasons      # id(chain) -> ["daily 2024-05-01", ...]
+
+    @property
+    def bytes_reclaimed(self):
+        return sum(c.size for c in self.prune)
+
+    def prune_names(self):
+        return [name for chain in self.prune for name in chain.names()]
+
+    def report(self):
+        lines = []
+        for chain in self.keep:
+            lines.append(f"KEEP   {chain.names()[0]} (+{len(chain.archives) - 1}) {chain.size / (1024 * 1024):.2f} MB"
+                         f" [{', '.join(self.reasons.get(id(chain), []))}]")
+        for chain in self.prune:
+            lines.append(f"PRUNE  {chain.names()[0]} (+{len(chain.archives) - 1}) {chain.size / (1024 * 1024):.2f} MB")
+        lines.append(f"{len(self.prune)} chains, {len(self.prune_names())} archives, "
+                     f"{self.bytes_reclaimed / (1024 * 1024):.2f} MB reclaimed")
+        return "\n".join(lines)
+
+
+def plan_retention(entries, daily=KEEP_DAILY, weekly=KEEP_WEEKLY, monthly=KEEP_MONTHLY):
+    """
+    Grandfather-father-son over chains. Every chain offers a restore point at
+    each archive it holds; the newest point of each of the last `daily` days,
+    `weekly` ISO weeks and `monthly` months that have backups is kept, together
+    with the chain it belongs to. The newest chain is always kept since the
+    next incremental will extend it.
+    """
+    chains = build_chains(entries)
+    reasons = {}
+    if chains:
+        reasons[id(chains[-1])] = ["current"]
+
+    points = sorted(((a["mtime"], chain) for chain in chains for a in chain.archives),
+                    key=lambda p: p[0], reverse=True)
+    for position, (label, count) in enumerate((("daily", daily), ("weekly", weekly), ("monthly", monthly))):
+        seen = []
+        for mtime, chain in points:
+            key = _period_keys(mtime)[position]
+            if key in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.append(key)
+            reasons.setdefault(id(chain), []).append(f"{label} {key if position == 0 else '-'.join(map(str, key))}")
+
+    keep = [c for c in chains if id(c) in reasons or c.protected()]
+    prune = [c for c in chains if c not in keep]
+    for chain in keep:
+        if chain.protected() and id(chain) not in reasons:
+            reasons[id(chain)] = ["protected"]
+    return RetentionPlan(keep, prune, reasons)
@@ -0,0 +1,258 @@
+import os
+import re
+import json
+
+# ---------------------------------------------------------------------------
+# Backup rules
+# ---------------------------------------------------------------------------
+# The "backup_rules" section of configuration.json:
+#
+#   "backup_rules": {
+#       "exclude": ["00_Pipeline/temp/", "**/cache/", "temp/", "*.tmp"],
+#       "include": ["Assets/**/cache/keep_me.abc"],
+#       "policies": [
+#           {"path": "Shots/*/Renders/", "mode": "metadata"},
+#           {"path": "Shots/**/Export/", "keep_versions": 2},
+#           {"path": "*.ma", "compress_level": 9}
+#       ]
+#   }
+#
+# exclude/include lines follow .gitignore: "#" comments, "!" negation, a
+# trailing "/" only matches folders, a "/" anywhere else anchors the pattern
+# to handle_path, "*" and "?" stay inside one folder and "**" crosses them.
+# include lines are re-includes appended after the excludes. As in git, an
+# excluded folder is not entered at all, so nothing below it can come back.
+#
+# Policies apply to every file at or below a matching path, later entries
+# override earlier ones key by key:
+#   mode           "full" (default), "skip", or "metadata" (size and mtime
+#                  are recorded, the content is not copied)
+#   compress_level deflate level for these files (0 stores them)
+#   keep_versions  in version folders (v001, asset_v0003.ma ...) only the
+#                  newest N versions of each name are backed up
+
+MODE_FULL = "full"
+MODE_SKIP = "skip"
+MODE_METADATA = "metadata"
+
+# "v" followed by digits, not part of a longer word or number
+VERSION_PATTERN = re.compile(r"(?<![A-Za-z0-9])[vV](\d+)(?![0-9])")
+
+IGNORE_CASE = os.name == "nt"
+
+
+def translate(pattern):
+    """
+    One gitignore pattern -> (regex source matching a "/" separated relpath,
+    dir_only). Returns None for blank lines and comments.
+    """
+    pattern = pattern.strip()
+    if not pattern or pattern.startswith("#"):
+        return None
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == n and (i == 0 or pattern[i - 1] == "/"):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+
+    source = "".join(out)
+    if not anchored:
+        source = "(?:.*/)?" + source
+    return source, dir_only
+
+
+class Pattern:
+    def __init__(self, text):
+        self.text = text
+        self.negate = text.strip().startswith("!")
+        translated = translate(text.strip()[1:] if self.negate else text)
+        if translated is None:
+            raise ValueError("empty pattern")
+        self.source, self.dir_only = translated
+        self.regex = re.compile(f"^{self.source}$", re.IGNORECASE if IGNORE_CASE else 0)
+
+    def matches(self, rel, is_dir):
+        return (is_dir or not self.dir_only) and self.regex.match(rel) is not None
+
+
+def _combined(patterns):
+    # One regex that matches whenever any of the patterns might; most paths miss it and are done in one call
+    if not patterns:
+        return None
+    return re.compile("^(?:" + "|".join(f"(?:{p.source})" for p in patterns) + ")$",
+                      re.IGNORECASE if IGNORE_CASE else 0)
+
+
+def _version_key(name):
+    match = VERSION_PATTERN.search(name)
+    if not match:
+        return None, None
+    return name[:match.start(1)] + "#" + name[match.end(1):], int(match.group(1))
+
+
+class BackupRules:
+    """
+    Compiled include/exclude rules and path policies. Walkers list a folder,
+    hand the entries to select() together with the folder's policy and get
+    back only what should be backed up, each with its own policy (folders
+    pass theirs on to their children). Excluded folders never come back, so
+    they are not listed at all.
+    """
+
+    def __init__(self, exclude=(), include=(), policies=()):
+        self.rules = []
+        for line in list(exclude) + [f"!{p.lstrip('!')}" for p in include]:
+            try:
+                self.rules.append(Pattern(line))
+            except ValueError:
+                continue
+        self.policies = []
+        for policy in policies:
+            settings = {k: v for k, v in policy.items() if k != "path"}
+            self.policies.append((Pattern(policy["path"]), settings))
+
+        self.any_rule = _combined(self.rules)
+        self.any_policy = _combined([p for p, _ in self.policies])
+        # Index and catalog compare this to tell when the rules changed
+        self.signature = json.dumps({"exclude": list(exclude), "include": list(include), "policies": list(policies)},
+                                    sort_keys=True)
+
+    @classmethod
+    def from_config(cls, config):
+        # None when the config has no rules, so callers keep their unfiltered fast path
+        section = config.get("backup_rules") or {}
+        if not any(section.get(key) for key in ("exclude", "include", "policies")):
+            return None
+        return cls(section.get("exclude", []), section.get("include", []), section.get("policies", []))
+
+    # -------------------------
+    # Matching
+    # -------------------------
+    def excluded(self, rel, is_dir=False):
+        # Last matching rule wins, as in .gitignore
+        if self.any_rule is None or self.any_rule.match(rel) is None:
+            return False
+        for pattern in reversed(self.rules):
+            if pattern.matches(rel, is_dir):
+                return not pattern.negate
+        return False
+
+    def policy(self, rel, is_dir, inherited):
+        if self.any_policy is None or self.any_policy.match(rel) is None:
+            return inherited
+        policy = dict(inherited)
+        for pattern, settings in self.policies:
+            if pattern.matches(rel, is_dir):
+                policy.update(settings)
+        return policy
+
+    def path_policy(self, rel):
+        """
+        Policy for a single relpath, checking every folder above it; None when
+        the path or one of its folders is excluded or skipped.
+        """
+        policy = {}
+        parts = rel.strip("/").split("/")
+        for depth in range(1, len(parts) + 1):
+            sub_rel = "/".join(parts[:depth])
+            is_dir = depth < len(parts)
+            if self.excluded(sub_rel, is_dir):
+                return None
+            policy = self.policy(sub_rel, is_dir, policy)
+            if policy.get("mode") == MODE_SKIP:
+                return None
+        return policy
+
+    # -------------------------
+    # Walking
+    # -------------------------
+    def select(self, rel_dir, items, dir_policy):
+        """
+        items: (name, is_dir, payload) for the entries of one folder.
+        Returns [(name, is_dir, payload, rel, policy)] for the entries to back
+        up, dropping excluded and skipped ones and, under keep_versions, the
+        older versions.
+        """
+        prefix = rel_dir + "/" if rel_dir else ""
+        kept = []
+        for name, is_dir, payload in items:
+            rel = prefix + name
+            if self.excluded(rel, is_dir):
+                continue
+            policy = self.policy(rel, is_dir, dir_policy)
+            if policy.get("mode") == MODE_SKIP:
+                continue
+            kept.append((name, is_dir, payload, rel, policy))
+
+        keep_versions = dir_policy.get("keep_versions")
+        if keep_versions:
+            kept = self.newest_versions(kept, keep_versions)
+        return kept
+
+    @staticmethod
+    def newest_versions(entries, count):
+        # Unversioned names always stay; versioned ones are grouped by the name around the number
+        groups = {}
+        for entry in entries:
+            key, version = _version_key(entry[0])
+            if key is not None:
+                groups.setdefault((key, entry[1]), []).append((version, entry[0]))
+        dropped = set()
+        for versions in groups.values():
+            versions.sort(reverse=True)
+            dropped.update(name for _, name in versions[count:])
+        return [entry for entry in entries if entry[0] not in dropped]
+
+
+def select_entries(rules, rel_dir, entries, dir_policy):
+    """
+    os.scandir entries of one folder -> [(entry, is_dir, rel, policy)]. Without
+    rules every file and folder comes back with an empty policy.
+    """
+    prefix = rel_dir + "/" if rel_dir else ""
+    items = []
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                items.append((entry.name, True, entry))
+            elif entry.is_file():
+                items.append((entry.name, False, entry))
+        except OSError:
+            continue
+    if rules is None:
+        return [(entry, is_dir, prefix + name, dir_policy) for name, is_dir, entry in items]
+    return [(entry, is_dir, rel, policy) for name, is_dir, entry, rel, policy in rules.select(rel_dir, items, dir_policy)]
@@ -0,0 +1,91 @@
+import time
+import datetime
+
+INCREMENTAL_INTERVAL_HOURS = 48
+# Longest sleep between wake-ups, so clock changes and suspend are picked up
+MAX_SLEEP_SECONDS = 3600
+# A job that is still due after running (failed, or waiting on something) is retried after this
+RETRY_SECONDS = 60
+
+
+def next_incremental_due(last_backup_timestamp, interval_hours=INCREMENTAL_INTERVAL_HOURS):
+    return last_backup_timestamp + interval_hours * 3600
+
+
+def next_weekly_due(scheduled_day, now=None, snooze_until=None, taken_date=None):
+    """
+    Timestamp at which the weekly prompt is due: now if today is the scheduled
+    day (1=Mon .. 7=Sun) and nothing was done yet, after the snooze if one is
+    running, otherwise midnight of the next scheduled day.
+    """
+    now = now or datetime.datetime.now()
+    today = now.date()
+    days_ahead = (scheduled_day - now.isoweekday()) % 7
+    if days_ahead == 0 and taken_date == today:
+        days_ahead = 7
+
+    if days_ahead == 0:
+        due = now
+        if snooze_until and snooze_until > now:
+            due = snooze_until
+    else:
+        due = datetime.datetime.combine(today + datetime.timedelta(days=days_ahead), datetime.time())
+    return due.timestamp()
+
+
+class Scheduler:
+    """
+    Jobs are (due_fn, action) pairs. due_fn returns the next timestamp the job
+    should run at, or None when it is not scheduled; the owner sleeps until
+    next_due() and then calls run_due().
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.last_run = {}
+
+    def add(self, name, due_fn, action):
+        self.jobs[name] = (due_fn, action)
+
+    def remove(self, name):
+        self.jobs.pop(name, None)
+
+    def due_times(self):
+        times = {}
+        for name, (due_fn, _) in self.jobs.items():
+            try:
+                due = due_fn()
+            except Exception as e:
+                print(f"Unable to schedule {name}: {e}")
+                continue
+            if due is not None:
+                times[name] = max(due, self.last_run.get(name, 0) + RETRY_SECONDS)
+        return times
+
+    def next_due(self):
+        # (timestamp, name) of the earliest job, or (None, None)
+        times = self.due_times()
+        if not times:
+            return None, None
+        name = min(times, key=times.get)
+        return times[name], name
+
+    def sleep_seconds(self, now=None):
+        now = now or time.time()
+        due, _ = self.next_due()
+        if due is None:
+            return MAX_SLEEP_SECONDS
+        return max(0.0, min(MAX_SLEEP_SECONDS, due - now))
+
+    def run_due(self, now=None):
+        now = now or time.time()
+        ran = []
+        for name, due in sorted(self.due_times().items(), key=lambda item: item[1]):
+            if due <= now:
+                self.last_run[name] = now
+                try:
+                    self.jobs[name][1]()
+                except Exception as e:
+                    print(f"Scheduled job {name} failed: {e}")
+                ran.append(name)
+        return ran
@@ -0,0 +1,228 @@
+import sys
+import time
+import ctypes
+import datetime
+import threading
+import contextlib
+
+import psutil
+
+# How often a running job looks at the throttle windows again
+POLICY_CHECK_SECONDS = 30
+
+# Disk priority of backup threads; "low" is the default
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+PRIORITY_IDLE = "idle"
+
+
+class RateLimiter:
+    """
+    Token bucket shared by everything that reads or writes on a budget.
+    rate is in bytes per second; 0 or None disables the limit. burst is how
+    many bytes may go through at once after an idle period.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate or 0
+        self.burst = burst or max(1, int(self.rate))
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate or 0
+            self.burst = max(1, int(self.rate))
+            self.tokens = min(self.tokens, self.burst)
+
+    def consume(self, amount, should_stop=None):
+        # Blocks until amount bytes fit in the budget; returns False if stopped while waiting
+        if not self.rate:
+            return True
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                # Larger requests than the bucket just go into debt instead of waiting forever
+                if self.tokens >= min(amount, self.burst):
+                    self.tokens -= amount
+                    return True
+                wait = (min(amount, self.burst) - self.tokens) / self.rate
+            if should_stop and should_stop():
+                return False
+            time.sleep(min(wait, 0.5))
+
+
+# -------------------------
+# Time windows
+# -------------------------
+def _parse_clock(text):
+    hours, _, minutes = text.partition(":")
+    return datetime.time(int(hours), int(minutes or 0))
+
+
+def _in_window(window, now):
+    # {"start": "20:00", "end": "07:00", "days": [1..7]}; start > end wraps past midnight
+    days = window.get("days")
+    start = _parse_clock(window.get("start", "00:00"))
+    end = _parse_clock(window.get("end", "00:00"))
+    clock = now.time()
+    if start < end:
+        inside = start <= clock < end
+        weekday = now.isoweekday()
+    elif start > end:
+        inside = clock >= start or clock < end
+        # Past midnight the window still belongs to the day it started on
+        weekday = now.isoweekday() if clock >= start else (now - datetime.timedelta(days=1)).isoweekday()
+    else:
+        inside = True
+        weekday = now.isoweekday()
+    return inside and (not days or weekday in days)
+
+
+class ThrottlePolicy:
+    """
+    The "throttle" section of configuration.json:
+
+        {"read_mb": 20, "write_mb": 20, "io_priority": "low",
+         "windows": [{"start": "20:00", "end": "07:00", "read_mb": 0, "write_mb": 0},
+                     {"days": [6, 7], "read_mb": 0, "write_mb": 0}]}
+
+    The first window that contains the current time sets the caps, otherwise
+    the top-level values do. Caps are MB/s, 0 means unlimited.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+
+    def active(self, now=None):
+        now = now or datetime.datetime.now()
+        for window in self.settings.get("windows", []):
+            try:
+                if _in_window(window, now):
+                    return window
+            except ValueError as e:
+                print(f"Ignoring throttle window {window}: {e}")
+        return self.settings
+
+    def rates(self, now=None):
+        # (read, write) in bytes per second, 0 for unlimited
+        active = self.active(now)
+        read_mb = active.get("read_mb", self.settings.get("read_mb", 0)) or 0
+        write_mb = active.get("write_mb", self.settings.get("write_mb", 0)) or 0
+        return int(read_mb * 1024 * 1024), int(write_mb * 1024 * 1024)
+
+    @property
+    def io_priority(self):
+        return self.settings.get("io_priority", PRIORITY_LOW)
+
+
+class ScheduledRateLimiter(RateLimiter):
+    # Re-reads its rate from rate_fn every check_seconds, so a job running into a window picks up the new cap
+    def __init__(self, rate_fn, check_seconds=POLICY_CHECK_SECONDS):
+        self.rate_fn = rate_fn
+        self.check_seconds = check_seconds
+        self.checked = time.monotonic()
+        super().__init__(rate_fn())
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.checked >= self.check_seconds:
+            self.checked = now
+            rate = self.rate_fn()
+            if rate != self.rate:
+                self.set_rate(rate)
+
+    def consume(self, amount, should_stop=None):
+        self.refresh()
+        return super().consume(amount, should_stop)
+
+
+class BackupThrottle:
+    """
+    Read and write limiters plus the I/O priority for one backup job. The
+    policy is looked up again while the job runs, so edits to the config
+    dict and time windows apply without restarting it.
+    """
+
+    def __init__(self, settings_fn):
+        self.settings_fn = settings_fn
+        self.read = ScheduledRateLimiter(lambda: self.policy().rates()[0])
+        self.write = ScheduledRateLimiter(lambda: self.policy().rates()[1])
+
+    def policy(self):
+        return ThrottlePolicy(self.settings_fn())
+
+    @property
+    def io_priority(self):
+        return self.policy().io_priority
+
+    def writer_kwargs(self):
+        # Keyword arguments for archive.ArchiveWriter
+        return {"read_limiter": self.read, "write_limiter": self.write, "priority": self.io_priority}
+
+    def read_cap(self):
+        # Current read cap in bytes per second, 0 when unlimited
+        self.read.refresh()
+        return self.read.rate
+
+
+# -------------------------
+# I/O priority
+# -------------------------
+# Windows SetThreadPriority background mode: lowers I/O and memory priority of the calling thread
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+THREAD_MODE_BACKGROUND_END = 0x00020000
+
+
+def _linux_ionice(priority):
+    # Returns a function restoring the previous setting; the calling thread only
+    process = psutil.Process(threading.get_native_id())
+    previous = process.ionice()
+    if priority == PRIORITY_IDLE:
+        process.ionice(psutil.IOPRIO_CLASS_IDLE)
+    else:
+        process.ionice(psutil.IOPRIO_CLASS_BE, value=7)
+
+    def restore():
+        if previous.ioclass in (psutil.IOPRIO_CLASS_RT, psutil.IOPRIO_CLASS_BE):
+            process.ionice(previous.ioclass, value=previous.value)
+        else:
+            process.ionice(previous.ioclass)
+    return restore
+
+
+def _windows_background():
+    kernel32 = ctypes.windll.kernel32
+    thread = kernel32.GetCurrentThread()
+    if not kernel32.SetThreadPriority(thread, THREAD_MODE_BACKGROUND_BEGIN):
+        raise OSError("SetThreadPriority failed")
+    return lambda: kernel32.SetThreadPriority(thread, THREAD_MODE_BACKGROUND_END)
+
+
+@contextlib.contextmanager
+def io_priority(priority=PRIORITY_LOW):
+    """
+    Lowers the disk priority of the calling thread for the duration of the
+    block. Only the thread is affected, so the GUI (and Prism around it)
+    keeps normal priority.
+    """
+    restore = None
+    if priority and priority != PRIORITY_NORMAL:
+        try:
+            if sys.platform == "win32":
+                restore = _windows_background()
+            elif sys.platform.startswith("linux"):
+                restore = _linux_ionice(priority)
+        except (OSError, AttributeError, psutil.Error) as e:
+            print(f"Unable to lower I/O priority: {e}")
+    try:
+        yield
+    finally:
+        if restore is not None:
+            try:
+                restore()
+            except (OSError, psutil.Error) as e:
+                print(f"Unable to restore I/O priority: {e}")
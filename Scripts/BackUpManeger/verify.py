@@ -0,0 +1,70 @@
+import time
+import zlib
+import hashlib
+import zipfile
+
+try:
+    from .restore import read_archive_members, extract_member, RestoreError
+    from .catalog import TYPE_SNAPSHOT
+except ImportError:
+    from restore import read_archive_members, extract_member, RestoreError
+    from catalog import TYPE_SNAPSHOT
+
+
+class _HashSink:
+    # File-like target for extract_member that only hashes
+    def __init__(self):
+        self.sha = hashlib.sha256()
+
+    def write(self, data):
+        self.sha.update(data)
+
+
+def verify_archive(path, limiter=None, should_stop=None):
+    """
+    Re-reads every member of an archive and checks its CRC and, when info.json
+    has them, its sha256. Returns a list of (arcname, problem); an empty list
+    means the archive is intact. Returns None if stopped before the end.
+    """
+    try:
+        members, info = read_archive_members(path)
+    except (OSError, zipfile.BadZipFile) as e:
+        return [("", f"Unreadable archive: {e}")]
+
+    checksums = info.get("checksums", {})
+    problems = []
+    if not info:
+        problems.append(("info.json", "Missing or unreadable manifest"))
+
+    for arcname, record in members.items():
+        if should_stop and should_stop():
+            return None
+        sink = _HashSink()
+        try:
+            extract_member(path, record, sink, limiter)
+        except (OSError, RestoreError, zlib.error) as e:
+            problems.append((arcname, str(e)))
+            continue
+        expected = checksums.get(arcname)
+        if expected and sink.sha.hexdigest() != expected:
+            problems.append((arcname, "sha256 mismatch"))
+
+    for arcname in checksums:
+        if arcname not in members:
+            problems.append((arcname, "Missing from archive"))
+    return problems
+
+
+def format_problems(problems, limit=5):
+    text = "; ".join(f"{name or 'archive'}: {problem}" for name, problem in problems[:limit])
+    if len(problems) > limit:
+        text += f"; and {len(problems) - limit} more"
+    return text
+
+
+def scrub_due(entries, interval_hours, now=None):
+    # Catalog entries whose last verification is older than the interval, least recently verified first
+    now = now or time.time()
+    limit = now - interval_hours * 3600
+    due = [e for e in entries if e.get("type") != TYPE_SNAPSHOT and e.get("verified", 0) < limit]
+    return sorted(due, key=lambda e: e.get("verified", 0))
@@ -48,6 +48,8 @@ from PrismUtils import PrismWidgets # pyright: ignore[reportMissingImports]
 
 from manager.userWindow import ConfigDrivenWindow
 from BackUpManeger.backup import SafeCopyApp
+from utils.asset_registry import open_registry, delete_from_json
+from utils.asset_index import AssetIndex, assets_root_for
 
 import os
 import shutil
@@ -270,23 +272,15 @@ class Prism_laud2_Functions(object):
     # Extract asset name from filesystem path
         asset_name = os.path.basename(os.path.normpath(assetPath))
 
-        # Read JSON file
-        with open(ASSET_INFO_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        assets = data.get("assets", {})
-
-        if asset_name not in assets:
-            return False
-
-        # Remove asset
-        del assets[asset_name]
-
-        # Write back to file
-        with open(ASSET_INFO_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
-
-        return True
+        # Remove asset from the registry, its location, and the json the database plugin still reads
+        registry = open_registry(ASSET_INFO_PATH)
+        try:
+            AssetIndex(registry, assets_root_for(self.core.projectPath)).remove(asset_name)
+            in_registry = registry.delete(asset_name)
+        finally:
+            registry.close()
+        in_json = delete_from_json(ASSET_INFO_PATH, asset_name)
+        return in_registry or in_json
 
     def deleteAsset(self, assetPath):
         while True:
@@ -2,11 +2,15 @@ import sys
 import os
 import re
 
-import json
 import shutil
+import sqlite3
 from pathlib import Path
 
 sys.path.append(r"C:\Program Files\Prism2\PythonLibs\Python3\PySide")
+sys.path.append(str(Path(__file__).resolve().parents[1])) # Plugin Scripts dir, for utils
+
+from utils.asset_registry import open_registry, AssetRegistryError
+from utils.asset_index import AssetIndex
 
 try:
     from PySide6 import QtWidgets, QtCore, QtGui
@@ -22,10 +26,11 @@ ASSET_INFO_JSON = ASSET_INFO_PATH + r"\assetInfo.json"
 PROJECT_PATH = r"P:\VFX_Project_30\2LOUD\Spotlight\03_Production\Assets"
 
 def getAssets():
-    with open(ASSET_INFO_JSON, "r", encoding="utf-8") as file:
-        data = json.load(file)
-
-    return data["assets"]
+    registry = open_registry(ASSET_INFO_JSON)
+    try:
+        return registry.all()
+    finally:
+        registry.close()
 
 def findImageByName(name):
     atm1 = f"{ASSET_INFO_PATH}\{name}_preview.jpg"
@@ -33,7 +38,17 @@ def findImageByName(name):
     if os.path.exists(atm1): return atm1
     else: return f"{ASSET_INFO_PATH[:1]}\fallbacks\noFileBig.jpg"
 
+def openAssetIndex():
+    # Asset locations, shared with the other DCC tools - no walking of the assets tree
+    registry = open_registry(ASSET_INFO_JSON)
+    try:
+        return AssetIndex(registry, PROJECT_PATH)
+    except AssetRegistryError:
+        registry.close()
+        raise
+
 def findAssetWalk(assetName):
+    # Fallback when the index is unreachable (database on P: locked or offline)
     target_file = f"{assetName}_asset_master.usda"
 
     for root, dirs, files in os.walk(PROJECT_PATH):
@@ -41,6 +56,14 @@ def findAssetWalk(assetName):
             return os.path.join(root, target_file)
 
     return None
+
+def findAssetMaster(assetName, index=None):
+    if index is not None:
+        try:
+            return index.master_file(assetName, "asset", ".usda")
+        except (AssetRegistryError, sqlite3.Error) as e:
+            print(f"Asset index lookup failed, searching the folders: {e}")
+    return findAssetWalk(assetName)
      
 
 class AssetPickerWindow(QtWidgets.QDialog):
@@ -124,13 +147,24 @@ class AssetPickerWindow(QtWidgets.QDialog):
 
     def _accept(self):
         print("accept")
-        for asset in self.selected_assets:
-            try:
-                pth = findAssetWalk(asset.name)
-                load_usd_asset_with_layer_editor(pth)
-            except Exception as e:
-                print(f"{e} Couldn't find asset : {asset.name}")
-            print(asset)
+        try:
+            index = openAssetIndex()
+        except AssetRegistryError as e:
+            print(f"Asset index not available, searching the folders: {e}")
+            index = None
+        try:
+            for asset in self.selected_assets:
+                try:
+                    pth = findAssetMaster(asset.name, index)
+                    if not pth:
+                        raise FileNotFoundError(f"No asset master for {asset.name}")
+                    load_usd_asset_with_layer_editor(pth)
+                except Exception as e:
+                    print(f"{e} Couldn't find asset : {asset.name}")
+                print(asset)
+        finally:
+            if index is not None:
+                index.registry.close()
         self.selected_assets = []
         super().accept()   # closes dialog with Accepted result
 
@@ -10,7 +10,13 @@ except:
 from shiboken6 import wrapInstance
 import maya.OpenMayaUI as omui
 import subprocess
+import sqlite3
 import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1])) # Plugin Scripts dir, for utils
+from utils.asset_index import open_index, assets_root_for, find_asset_root_walk
+from utils.asset_registry import AssetRegistryError
 
 try: 
     PROJECT_PATH = pcore.projectPath
@@ -45,17 +51,22 @@ class pathManager:
     # -------------------------
     # Find Asset Root Folder
     # -------------------------
-    def findAssetWalk(self):
+    def findAssetRoot(self):
         if not self.assetName:
             return None
 
-        for root, dirs, files in os.walk(
-            os.path.join(PROJECT_PATH, "03_Production", "Assets")
-        ):
-            if self.assetName in dirs:
-                return os.path.join(root, self.assetName)
-
-        return None
+        try:
+            index = open_index(PROJECT_PATH)
+        except AssetRegistryError as e:
+            print(f"Asset index not available, searching the folders: {e}")
+            return find_asset_root_walk(assets_root_for(PROJECT_PATH), self.assetName)
+        try:
+            return index.root(self.assetName)
+        except (AssetRegistryError, sqlite3.Error) as e:
+            print(f"Asset index lookup failed, searching the folders: {e}")
+            return find_asset_root_walk(assets_root_for(PROJECT_PATH), self.assetName)
+        finally:
+            index.registry.close()
 
     # -------------------------
     # Get Next Version (v0001 → v0002)
@@ -98,7 +109,7 @@ class pathManager:
             cmds.warning("Scene not saved. Cannot resolve asset.")
             return
 
-        self.assetPath = self.findAssetWalk()
+        self.assetPath = self.findAssetRoot()
         if not self.assetPath:
             cmds.warning(f"Asset '{self.assetName}' not found.")
             return
@@ -12,6 +12,9 @@ import json
 import shutil
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2])) # Plugin Scripts dir, for utils
+from utils.asset_registry import open_registry, update_json
+
 
 try:
     from PySide2 import QtWidgets, QtCore, QtGui
@@ -418,7 +421,8 @@ proejctName = projectDir.split("\\")[-1]
 
 # Asset Info Json
 ASSETINFO_PATH = os.path.join(projectDir, "00_Pipeline", "Assetinfo", "assetInfo.json") # Get the config path
-ASSETINFO = load_config(ASSETINFO_PATH) # Create config variable to acces info
+ASSET_REGISTRY = open_registry(ASSETINFO_PATH) # Indexed registry next to the json, imports it on first use
+ASSETINFO = {"assets": ASSET_REGISTRY.all()} # Create config variable to acces info
 
 
 
@@ -508,18 +512,15 @@ def checkAssetInfo():
     cleanedPath = (cleanedPath[1:-1]).replace("/", "\\") # Get rid of the first and last slashes
 
 
-    # Check if the asset exists
-    ASSETINFO.setdefault("assets", {})
-    ASSETINFO["assets"].setdefault(currentAsset, {})
-    ASSETINFO["assets"][currentAsset].setdefault("metadata", {})
-
-    ASSETINFO["assets"][currentAsset]["metadata"]["path"] = {
-        "value": cleanedPath,
-        "show": False
+    # Set the asset path in the json and the registry, creating the asset if it does not exist
+    pathInfo = {
+        "path": {
+            "value": cleanedPath,
+            "show": False
+        }
     }
-
-    with open(ASSETINFO_PATH, "w") as file: # Wrtie json file
-        json.dump(ASSETINFO, file, indent=4)
+    update_json(ASSETINFO_PATH, currentAsset, pathInfo) # The database plugin still reads the json, written first so the row stays newer
+    ASSETINFO["assets"][currentAsset] = ASSET_REGISTRY.update(currentAsset, pathInfo)
 
 
 
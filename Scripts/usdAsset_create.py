@@ -0,0 +1,605 @@
+"""
+Headless 2loud asset creation: the steps of the Create Asset dialog for one
+asset or a whole list of them.
+
+    python usdAsset_create.py SPECS.csv|SPECS.json [--project PATH] [--workers N] [--report OUT.json]
+
+A spec is one CSV row or JSON object:
+
+    name            asset name, parent folders separated by "/"
+    preset          task preset, ASSET_STATIC or ENVIRONMENT
+    id, description, ch_dependant, subdivision, geo_variants, mtl_variants,
+    texture_size    asset metadata, as in the dialog
+    thumbnail       optional image path
+
+Every spec is validated before anything is created. Prism calls run on the
+calling thread, the file writes of several assets on a bounded pool of
+workers; an asset whose creation fails is removed again, so the project
+only ever has complete assets.
+"""
+import os
+import re
+import csv
+import sys
+import json
+import stat
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.asset_registry import open_registry, AssetRegistryError
+from utils.asset_index import AssetIndex, assets_root_for, asset_info_json_for
+from utils.usd_templates import (TemplateError, asset_params, can_write_usdc, default_library, with_single_material,
+                                 MASTER_REDIRECT, USD_IDENTIFIER)
+
+# ---------------------------------------------------------------------------
+# Presets and templates
+# ---------------------------------------------------------------------------
+
+PIPELINE_TEMP_DIR = r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\temp"
+MATERIAL_TEMPLATE_PATH = r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\Plugins\Custom\laud2\Scripts\materials\basicMaterial_MTL.usdc"
+# The one material MATERIAL_TEMPLATE_PATH defines under /materials
+MATERIAL_TEMPLATE_NAME = "standardSurface_MTL"
+
+FIRST_VERSION = "v0001"
+MASTER_VERSION = "master"
+
+# Layer format of each product's first version, rendered from usdTemplates/<product>.usda.
+# Without pxr no .usdc can be rendered: materials then start as a copy of MATERIAL_TEMPLATE_PATH,
+# the binding binds its one material without a mtlVariant set, and geometry starts empty, as the
+# products without a template do.
+PRODUCT_FORMATS = {
+    "asset": ".usda",
+    "binding": ".usda",
+    "environment": ".usda",
+    "geometry": ".usdc",
+    "materials": ".usdc",
+}
+MATERIALS_PRODUCT = "materials"
+
+PRESETS = {
+    "ASSET_STATIC": {
+        "products": ["asset", "binding", "geometry", "materials", "mesh", "textures"],
+        "departments": [
+            ["Concept", ["Concept"]],
+            ["Modeling", ["Variants", "Modeling", "Sculping", "FineDetail"]],
+            ["Texturing", ["Texturing"]],
+            ["LookDev", ["LookDev"]],
+        ],
+    },
+    "ENVIRONMENT": {
+        "products": ["environment", "sceneassembly"],
+        "departments": [
+            ["Concept", ["Concept"]],
+            ["SceneAssembly", ["Assembly"]],
+            ["MasterLighting", ["Texturing"]],
+        ],
+    },
+}
+
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+(/[A-Za-z0-9_\-]+)*$")
+
+MAX_VARIANTS = 16
+TEXTURE_SIZES = ["512", "1024", "2048", "4096", "8192", "16384"]
+DEFAULT_TEXTURE_SIZE = "1024"
+
+DEFAULT_WORKERS = 4
+
+SPEC_FIELDS = ["name", "preset", "id", "description", "ch_dependant", "subdivision", "geo_variants",
+               "mtl_variants", "texture_size", "thumbnail"]
+
+
+class AssetCreationError(Exception):
+    pass
+
+
+# -------------------------
+# Specs
+# -------------------------
+def camel_case(text):
+    # Lower-case first letter of the asset itself, parent folders untouched
+    path, filename = os.path.split(text)
+    filename = filename[:1].lower() + filename[1:]
+    return os.path.join(path, filename) if path else filename
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "x")
+
+
+def _int(value, default=0):
+    if value is None or str(value).strip() == "":
+        return default
+    return int(str(value).strip())
+
+
+def normalize_spec(raw):
+    """
+    Spec dict with every field present and typed. Raises ValueError on a
+    field that cannot be read.
+    """
+    spec = {field: raw.get(field) for field in SPEC_FIELDS}
+    spec["name"] = camel_case(str(spec["name"] or "").strip().replace("\\", "/")).replace("\\", "/")
+    spec["preset"] = str(spec["preset"] or "").strip() or "ASSET_STATIC"
+    spec["id"] = str(spec["id"] or "").strip()
+    spec["description"] = str(spec["description"] or "")
+    spec["ch_dependant"] = _bool(spec["ch_dependant"] or False)
+    spec["subdivision"] = _bool(spec["subdivision"] or False)
+    spec["geo_variants"] = _int(spec["geo_variants"], 1)
+    spec["mtl_variants"] = _int(spec["mtl_variants"], 1)
+    spec["texture_size"] = str(spec["texture_size"] or "").strip() or DEFAULT_TEXTURE_SIZE
+    spec["thumbnail"] = str(spec["thumbnail"] or "").strip()
+    spec["preview"] = raw.get("preview")   # QPixmap from the dialog
+    return spec
+
+
+def load_specs(path):
+    # Raw spec dicts from a CSV (header row = field names) or a JSON list
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data["assets"] if isinstance(data, dict) else data
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return [{k.strip(): v for k, v in row.items() if k} for row in csv.DictReader(f)]
+
+
+def build_metadata(spec):
+    # Prism entity metadata, same keys the dialog always wrote
+    return {
+        "isAsset2loud": {"value": "True", "show": False},
+        "id": {"value": spec["id"], "show": True},
+        "ch_dependant": {"value": str(spec["ch_dependant"]), "show": True},
+        "min_cam_distance": {"value": "", "show": True},
+        "path": {"value": "", "show": True},
+        "subdivision": {"value": str(spec["subdivision"]), "show": True},
+        "geo_variants": {"value": str(spec["geo_variants"]), "show": True},
+        "geo_names": {"value": [""], "show": True},
+        "texture_size": {"value": spec["texture_size"], "show": True},
+        "mtl_variants": {"value": str(spec["mtl_variants"]), "show": True},
+        "mtl_names": {"value": [""], "show": True},
+        "asset_type": {"value": spec["preset"], "show": False},
+    }
+
+
+def link_master(version_dir, version_path, master_path, templates=None):
+    """
+    Fills the master folder from a version folder without writing the layer
+    again: master is a hard link to the version's layer, or where the share
+    cannot link, a small layer sublayering it. Prism replaces the master
+    folder when a new version becomes master, so the link is never written
+    through. The small files next to the layer (versioninfo.json) are copied,
+    Prism edits them in place.
+    """
+    master_dir = os.path.dirname(master_path)
+    os.makedirs(master_dir, exist_ok=True)
+    for name in os.listdir(version_dir):
+        src = os.path.join(version_dir, name)
+        if os.path.isfile(src) and src != version_path:
+            shutil.copyfile(src, os.path.join(master_dir, name))
+    try:
+        os.link(version_path, master_path)
+        return
+    except OSError:
+        pass
+    if master_path.lower().endswith(".usda"):
+        # Version and master folders are siblings, relative paths in the version keep resolving
+        rel = os.path.relpath(version_path, master_dir).replace(os.sep, "/")
+        (templates or default_library()).write(MASTER_REDIRECT, {"version_path": rel}, master_path)
+    else:
+        shutil.copyfile(version_path, master_path)
+
+
+def _remove_readonly(func, path, exc_info):
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+# ---------------------------------------------------------------------------
+# Creator
+# ---------------------------------------------------------------------------
+
+class AssetCreator:
+    """
+    Creates 2loud assets through the Prism core: entity, products with their
+    first versions and masters, departments and tasks, then the asset
+    registry, the location index and the asset database.
+
+    Every Prism call (entities, products, product paths, version info,
+    ingest) runs on the calling thread, one asset after the other, as they
+    may change project state or show UI. Only the file work on the network
+    share runs on up to `workers` assets at once: rendering the first
+    versions straight into their version folders, and linking the masters
+    to them. database: optional object with updateAsset(), as
+    dataBase_operations.operations.
+    """
+
+    def __init__(self, core, project_path=None, temp_dir=PIPELINE_TEMP_DIR, workers=DEFAULT_WORKERS, database=None,
+                 user=None, templates=None):
+        self.core = core
+        self.project_path = project_path or core.projectPath
+        self.assets_root = assets_root_for(self.project_path)
+        self.temp_dir = temp_dir
+        self.workers = max(1, workers or 1)
+        self.database = database
+        self.user = user or os.environ.get("PRISM_USER", "")
+        self.templates = templates or default_library()
+
+    def asset_root(self, name):
+        return os.path.join(self.assets_root, *name.split("/"))
+
+    # -------------------------
+    # Validation
+    # -------------------------
+    def validate(self, raw_specs):
+        """
+        Returns (specs, errors): the normalized specs and, for every spec
+        that cannot be created, {"index", "name", "error"}; index is None
+        for a problem of the whole batch.
+        """
+        specs = []
+        errors = []
+        seen = {}
+        for index, raw in enumerate(raw_specs):
+            try:
+                spec = normalize_spec(raw)
+            except (ValueError, TypeError) as e:
+                errors.append({"index": index, "name": raw.get("name", ""), "error": f"Invalid value: {e}"})
+                specs.append(None)
+                continue
+            specs.append(spec)
+            problem = self.check_spec(spec)
+            if problem is None:
+                key = spec["name"].split("/")[-1].lower()
+                if key in seen:
+                    problem = f"Same asset name as row {seen[key] + 1}"
+                seen.setdefault(key, index)
+            if problem is not None:
+                errors.append({"index": index, "name": spec["name"], "error": problem})
+
+        for preset in sorted({spec["preset"] for spec in specs if spec and spec["preset"] in PRESETS}):
+            problem = self.check_templates(preset)
+            if problem is not None:
+                errors.append({"index": None, "name": "", "error": problem})
+        return specs, errors
+
+    def check_templates(self, preset):
+        # Compiles the templates of a preset now, so a broken one stops the batch before anything is created
+        for product in PRESETS[preset]["products"]:
+            if self.first_version_source(product, preset) == "template":
+                try:
+                    self.templates.template(product, preset)
+                except TemplateError as e:
+                    return str(e)
+            elif self.first_version_source(product, preset) == "copy" and not os.path.isfile(MATERIAL_TEMPLATE_PATH):
+                return f"Material template missing: {MATERIAL_TEMPLATE_PATH}"
+        return None
+
+    def check_spec(self, spec):
+        # Reason the spec cannot be created, None if it can
+        name = spec["name"]
+        if not name:
+            return "No asset name"
+        if not NAME_PATTERN.match(name):
+            return f"Invalid asset name: {name}"
+        if not USD_IDENTIFIER.match(name.split("/")[-1]):
+            return f"Asset name must be a valid USD prim name (letters, digits, _): {name.split('/')[-1]}"
+        if spec["preset"] not in PRESETS:
+            return f"Unknown preset {spec['preset']}, expected one of {', '.join(PRESETS)}"
+        if not (1 <= spec["geo_variants"] <= MAX_VARIANTS and 1 <= spec["mtl_variants"] <= MAX_VARIANTS):
+            return f"Variant counts must be between 1 and {MAX_VARIANTS}"
+        if spec["texture_size"] not in TEXTURE_SIZES:
+            return f"Texture size must be one of {', '.join(TEXTURE_SIZES)}"
+        if spec["thumbnail"] and not os.path.isfile(spec["thumbnail"]):
+            return f"Thumbnail not found: {spec['thumbnail']}"
+        if self.exists(name):
+            return "Asset already exists"
+        return None
+
+    def exists(self, name):
+        return bool(self.core.entities.getAsset(name.split("/")[-1])) or os.path.exists(self.asset_root(name))
+
+    # -------------------------
+    # Creation
+    # -------------------------
+    def create_batch(self, raw_specs, on_status=None):
+        """
+        Validates every spec, then creates them all. Returns one result per
+        spec: {"name", "success", "error", "seconds"}. If any spec is
+        invalid nothing is created and the results carry the validation
+        errors. on_status(text) is called as the batch progresses.
+        """
+        specs, errors = self.validate(raw_specs)
+        if errors:
+            by_index = {e["index"]: e["error"] for e in errors}
+            batch_error = "; ".join(e["error"] for e in errors if e["index"] is None)
+            return [{"name": (spec or {}).get("name") or raw.get("name", ""), "success": False, "seconds": 0.0,
+                     "error": by_index.get(index) or batch_error or "Not created, other assets in the batch are invalid"}
+                    for index, (spec, raw) in enumerate(zip(specs, raw_specs))]
+
+        status = on_status or (lambda text: None)
+        jobs = [{"spec": spec, "error": None, "start": time.monotonic(), "work_dir": None,
+                 "created": {"entity": False, "registry": False}} for spec in specs]
+        total = len(jobs)
+        try:
+            for i, job in enumerate(jobs):
+                status(f"[{i + 1}/{total}] Creating {job['spec']['name']}")
+                self.run_step(job, self.create_entity)
+                self.run_step(job, self.plan_first_versions)
+
+            self.run_parallel(jobs, self.write_first_versions, "Wrote first versions of", status)
+            for job in jobs:
+                self.run_step(job, self.record_first_versions)
+            self.run_parallel(jobs, self.link_masters, "Linked masters of", status)
+
+            for i, job in enumerate(jobs):
+                status(f"[{i + 1}/{total}] Registering {job['spec']['name']}")
+                self.run_step(job, self.register)
+        except BaseException as e:
+            # Cancelled (Ctrl+C): whatever did not finish is rolled back below
+            for job in jobs:
+                if job["error"] is None and not job.get("registered"):
+                    job["error"] = f"Interrupted: {e!r}"
+            raise
+        finally:
+            results = [self.finish(job) for job in jobs]
+        return results
+
+    def create(self, raw_spec):
+        return self.create_batch([raw_spec])[0]
+
+    def run_parallel(self, jobs, step, text, status):
+        # File work of a bounded number of assets at a time; status is reported on the calling thread
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="asset-create") as pool:
+            futures = {pool.submit(self.run_step, job, step): job for job in jobs if job["error"] is None}
+            for i, future in enumerate(as_completed(futures)):
+                future.result()
+                status(f"[{i + 1}/{len(futures)}] {text} {futures[future]['spec']['name']}")
+
+    def run_step(self, job, step):
+        if job["error"] is not None:
+            return
+        try:
+            step(job)
+        except Exception as e:
+            job["error"] = str(e) or repr(e)
+            print(f"Unable to create asset {job['spec']['name']}: {job['error']}")
+
+    def finish(self, job):
+        if job["error"] is not None:
+            self.rollback(job)
+        if job["work_dir"]:
+            shutil.rmtree(job["work_dir"], ignore_errors=True)
+        return {"name": job["spec"]["name"], "success": job["error"] is None, "error": job["error"],
+                "seconds": time.monotonic() - job["start"]}
+
+    # -------------------------
+    # Steps
+    # -------------------------
+    def create_entity(self, job):
+        spec = job["spec"]
+        entity = {"type": "asset", "asset_path": spec["name"].replace("/", os.sep)}
+        job["entity"] = entity
+        job["metadata"] = build_metadata(spec)
+
+        preview = spec.get("preview")
+        if preview is None and spec["thumbnail"]:
+            preview = self.core.media.getPixmapFromPath(spec["thumbnail"])
+        # Checked again, another user may have created it since validation
+        if self.exists(spec["name"]):
+            raise AssetCreationError("Asset already exists")
+        job["created"]["entity"] = True
+        result = self.core.entities.createEntity(entity=entity, description=spec["description"],
+                                                 metaData=job["metadata"], preview=preview)
+        if result is False:
+            raise AssetCreationError("Prism did not create the entity")
+
+        preset = PRESETS[spec["preset"]]
+        for product in preset["products"]:
+            self.core.products.createProduct(entity=entity, product=product)
+        for department, tasks in preset["departments"]:
+            self.core.entities.createDepartment(department, entity, createCat=False)
+            for task in tasks:
+                self.core.entities.createCategory(entity, department, task)
+
+    def plan_first_versions(self, job):
+        # Where each first version goes; Prism resolves the paths, so this runs on the calling thread
+        spec = job["spec"]
+        job["params"] = asset_params(spec["name"].split("/")[-1], spec["geo_variants"], spec["mtl_variants"],
+                                     spec["texture_size"], spec["subdivision"])
+        if self.first_version_source(MATERIALS_PRODUCT, spec["preset"]) == "copy":
+            # The copied layer has none of the template's materials, bind the one it has
+            job["params"] = with_single_material(job["params"], MATERIAL_TEMPLATE_NAME)
+        in_place = self.authors_in_place()
+        versions = []
+        for product in PRESETS[spec["preset"]]["products"]:
+            source = self.first_version_source(product, spec["preset"])
+            if source is None:
+                # Starts empty
+                continue
+            extension = PRODUCT_FORMATS[product]
+            if in_place:
+                path = self.core.products.generateProductPath(entity=job["entity"], task=product, extension=extension,
+                                                              version=FIRST_VERSION)
+                master = self.core.products.generateProductPath(entity=job["entity"], task=product,
+                                                                extension=extension, version=MASTER_VERSION)
+            else:
+                if job["work_dir"] is None:
+                    os.makedirs(self.temp_dir, exist_ok=True)
+                    # Own folder per asset: workers and other users never share a temp file
+                    job["work_dir"] = tempfile.mkdtemp(prefix="assetCreate_", dir=self.temp_dir)
+                path = os.path.join(job["work_dir"], f"{job['params']['name']}_{product}_temp{extension}")
+                master = None
+            versions.append({"product": product, "source": source, "path": path, "master": master})
+        job["versions"] = versions
+
+    def authors_in_place(self):
+        # Prism without the product path API goes through a temp file and ingest instead
+        return hasattr(self.core.products, "generateProductPath") and hasattr(self.core, "saveVersionInfo")
+
+    def first_version_source(self, product, preset):
+        # "template", "copy" (materials without pxr) or None for a product that starts empty
+        extension = PRODUCT_FORMATS.get(product)
+        if extension is None or not self.templates.has(product, preset):
+            return None
+        if extension == ".usdc" and not can_write_usdc():
+            return "copy" if product == MATERIALS_PRODUCT else None
+        return "template"
+
+    def write_first_version(self, product, source, params, preset, path):
+        if source == "copy":
+            shutil.copyfile(MATERIAL_TEMPLATE_PATH, path)
+        else:
+            self.templates.write(product, params, path, preset)
+
+    def write_first_versions(self, job):
+        """
+        Renders every first version of an asset to its planned path, the only
+        write of the content. File work only, runs on a pool worker.
+        """
+        for version in job["versions"]:
+            os.makedirs(os.path.dirname(version["path"]), exist_ok=True)
+            self.write_first_version(version["product"], version["source"], job["params"], job["spec"]["preset"],
+                                     version["path"])
+
+    def record_first_versions(self, job):
+        # Prism's side of the written versions, on the calling thread: version info, or ingest and master
+        for version in job["versions"]:
+            product = version["product"]
+            if version["master"] is not None:
+                self.core.saveVersionInfo(filepath=version["path"], details={
+                    "product": product,
+                    "version": FIRST_VERSION,
+                    "comment": "Created by asset creation",
+                    "user": self.user,
+                    "extension": PRODUCT_FORMATS[product],
+                })
+                continue
+            product_info = self.core.products.ingestProductVersion([version["path"]], job["entity"], product)
+            if not product_info or not product_info.get("createdFiles"):
+                raise AssetCreationError(f"Unable to ingest the first {product} version")
+            self.core.products.updateMasterVersion(product_info["createdFiles"][0])
+
+    def link_masters(self, job):
+        # Masters of the versions authored in place, file work only, runs on a pool worker
+        for version in job["versions"]:
+            if version["master"] is not None:
+                link_master(os.path.dirname(version["path"]), version["path"], version["master"], self.templates)
+
+    def register(self, job):
+        spec = job["spec"]
+        core_name = spec["name"].split("/")[-1]
+        registry = open_registry(asset_info_json_for(self.project_path))
+        try:
+            job["created"]["registry"] = True
+            registry.put(core_name, {"metadata": job["metadata"]})
+            AssetIndex(registry, self.assets_root).add(self.asset_root(spec["name"]))
+        finally:
+            registry.close()
+        if self.database is not None:
+            self.database.updateAsset(new=True, asset_name=spec["name"].replace("/", os.sep),
+                                      asset_metadata=job["metadata"], operationUser=self.user)
+        job["registered"] = True
+
+    # -------------------------
+    # Rollback
+    # -------------------------
+    def rollback(self, job):
+        name = job["spec"]["name"]
+        core_name = name.split("/")[-1]
+        if job["created"]["registry"]:
+            try:
+                registry = open_registry(asset_info_json_for(self.project_path))
+                try:
+                    AssetIndex(registry, self.assets_root).remove(core_name)
+                    registry.delete(core_name)
+                finally:
+                    registry.close()
+            except (OSError, AssetRegistryError) as e:
+                print(f"Unable to remove {core_name} from the asset registry: {e}")
+        if job["created"]["entity"]:
+            root = self.asset_root(name)
+            try:
+                if os.path.exists(root):
+                    shutil.rmtree(root, onerror=_remove_readonly)
+            except OSError as e:
+                print(f"Unable to remove half created asset {root}: {e}")
+        print(f"Rolled back asset {name}")
+
+
+# -------------------------
+# CLI
+# -------------------------
+def create_core(project_path=None):
+    # Prism core without UI; Prism's Scripts folder must be importable (PRISM_ROOT)
+    prism_scripts = os.path.join(os.environ.get("PRISM_ROOT", r"C:\Program Files\Prism2"), "Scripts")
+    if prism_scripts not in sys.path:
+        sys.path.append(prism_scripts)
+    import PrismCore  # pyright: ignore[reportMissingImports]
+
+    core = PrismCore.create(app="Standalone", prismArgs=["noUI"])
+    if project_path:
+        core.changeProject(project_path)
+    return core
+
+
+def open_database():
+    # Asset database of the dataBase plugin, None where it is not installed
+    plugin_scripts = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataBase", "Scripts")
+    if plugin_scripts not in sys.path:
+        sys.path.append(plugin_scripts)
+    try:
+        from dataBase_operations import operations  # pyright: ignore[reportMissingImports]
+    except ImportError as e:
+        print(f"Asset database not available, skipping it: {e}")
+        return None
+    return operations(plugin_root=plugin_scripts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create 2loud assets from a CSV or JSON list")
+    parser.add_argument("specs", help="CSV with a header row, or JSON list of assets")
+    parser.add_argument("--project", help="Prism project path (default: the current project)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Assets created at once")
+    parser.add_argument("--check", action="store_true", help="Only validate the specs")
+    parser.add_argument("--no-database", action="store_true", help="Do not send the assets to the asset database")
+    parser.add_argument("--report", help="Write the per-asset results to this JSON file")
+    args = parser.parse_args(argv)
+
+    try:
+        raw_specs = load_specs(args.specs)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Unable to read {args.specs}: {e}")
+        return 1
+
+    core = create_core(args.project)
+    creator = AssetCreator(core, workers=args.workers, database=None if args.no_database else open_database())
+
+    specs, errors = creator.validate(raw_specs)
+    for error in errors:
+        row = "batch" if error["index"] is None else f"row {error['index'] + 1}"
+        print(f"{row} {error['name']}: {error['error']}")
+    if errors or args.check:
+        invalid = {e["index"] for e in errors if e["index"] is not None}
+        print(f"{len(specs) - len(invalid)}/{len(specs)} assets can be created")
+        return 1 if errors else 0
+
+    start = time.monotonic()
+    results = creator.create_batch(raw_specs, on_status=print)
+    for result in results:
+        state = "created" if result["success"] else f"FAILED, rolled back: {result['error']}"
+        print(f"{result['name']}: {state} ({result['seconds']:.1f}s)")
+    failed = [r for r in results if not r["success"]]
+    print(f"Created {len(results) - len(failed)}/{len(results)} assets in {time.monotonic() - start:.1f}s")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
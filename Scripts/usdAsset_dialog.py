@@ -35,88 +35,13 @@ if str(DATA_BASE_SCRIPTS) not in sys.path:
 
 from dataBase_operations import operations # pyright: ignore[reportMissingImports]
 
+from usdAsset_create import AssetCreator, MAX_VARIANTS, TEXTURE_SIZES, DEFAULT_TEXTURE_SIZE
+
 
 DEPARTMENTS = ["Default", "All"]
 USD_PRODUCTS = ["Default", "All"]
 ASSET_TYPES = ["Static Asset", "Dynamic Asset", "Character", "Environment"]
 
-CUSTOM_ASSET_BASIC_USD = """#usda 1.0
-(
-    endTimeCode = 1
-    framesPerSecond = 24
-    metersPerUnit = 1
-    startTimeCode = 1
-    timeCodesPerSecond = 24
-    upAxis = "Y"
-)
-
-def Xform "[ASSETNAME]" (
-    kind = "component"
-    prepend references = [
-        @../../binding/master/[ASSETNAME]_binding_master.usda@</[ASSETNAME]>,
-        @../../geometry/master/[ASSETNAME]_geometry_master.usdc@</[ASSETNAME]>
-    ]
-)
-{
-    def Xform "geo"
-    {
-    }
-
-    def Scope "mtl" (
-        prepend references = @../../materials/master/[ASSETNAME]_materials_master.usdc@</materials>
-    )
-    {
-    }
-}
-"""
-
-CUSTOM_ASSET_ENVIORMENT_USD = """#usda 1.0
-(
-    endTimeCode = 1
-    framesPerSecond = 24
-    metersPerUnit = 1
-    startTimeCode = 1
-    timeCodesPerSecond = 24
-    upAxis = "Y"
-)
-
-def Xform "[ASSETNAME]" (
-    kind = "component"
-)
-{
-}
-"""
-
-CUSTOM_BINDING_BASIC_USD = """#usda 1.0
-(
-    endTimeCode = 1
-    framesPerSecond = 24
-    metersPerUnit = 1
-    startTimeCode = 1
-    timeCodesPerSecond = 24
-    upAxis = "Y"
-)
-
-def Scope "[ASSETNAME]" (
-    kind = "component"
-)
-{
-    def Xform "geo" (
-        prepend apiSchemas = ["MaterialBindingAPI"]
-    )
-    {
-        rel material:binding = </[ASSETNAME]/mtl/[ASSETNAME]_MTL>
-    }
-
-    def Scope "mtl" (
-        prepend references = @../../materials/master/[ASSETNAME]_materials_master.usdc@</materials>
-    )
-    {
-    }
-}
-"""
-
-
 class CreateAssetCustomDlg(PrismWidgets.CreateItem):
     def __init__(self, core, parent=None, startText=None, path=None):
         startText = startText or ""
@@ -356,7 +281,7 @@ class CreateAssetCustomDlg(PrismWidgets.CreateItem):
         # GeoVariants SpinBox
         self.l_geoVariants = QLabel("GeoVariants:")
         self.sb_geoVariants = QSpinBox()
-        self.sb_geoVariants.setRange(1, 16)
+        self.sb_geoVariants.setRange(1, MAX_VARIANTS)
         self.sb_geoVariants.setValue(1)
         self.sb_geoVariants.setFixedWidth(25)
 
@@ -406,13 +331,13 @@ class CreateAssetCustomDlg(PrismWidgets.CreateItem):
         # TX Size
         self.l_txSize = QLabel("TX Size:")
         self.cb_txSize = QComboBox()
-        self.cb_txSize.addItems(["512", "1024", "2048", "4096", "8192", "16384"])
-        self.cb_txSize.setCurrentText("1024")
+        self.cb_txSize.addItems(TEXTURE_SIZES)
+        self.cb_txSize.setCurrentText(DEFAULT_TEXTURE_SIZE)
 
         # MtlVariants SpinBox
         self.l_mtlVariants = QLabel("MtlVariants:")
         self.sb_mtlVariants = QSpinBox()
-        self.sb_mtlVariants.setRange(1, 16)
+        self.sb_mtlVariants.setRange(1, MAX_VARIANTS)
         self.sb_mtlVariants.setValue(1)
         self.sb_mtlVariants.setFixedWidth(25)
 
@@ -608,53 +533,6 @@ class CreateAssetCustomDlg(PrismWidgets.CreateItem):
         }
         return values
 
-    def camelCase(self, text):
-        path, filename = os.path.split(text)
-        filename = filename[:1].lower() + filename[1:]
-
-
-        return os.path.join(path, filename) if path else filename
-
-    def saveUsdPathEmpty(self, assetName, assetProduct, usdExample, version, save_dir=None, format="usda"):
-        if not save_dir: 
-            return None
-
-        assetName = self.camelCase(assetName) 
-
-        file_name = f"{assetName}_{assetProduct}_{version}.{format}"
-        save_path = os.path.join(save_dir, file_name)
-        os.makedirs(save_dir, exist_ok=True)
-        usdTemplate = usdExample.replace("[ASSETNAME]", assetName)
-
-        with open(save_path, "w") as f:
-            f.write(usdTemplate)
-        print(f"USDA saved at: {save_path}")
-        return save_path
-
-    def saveUsdCopyPath(self, assetName, assetProduct, version, save_dir=None):
-        if not save_dir: 
-            return None
-
-        assetName = self.camelCase(assetName) 
-
-        new_file_name = f"{assetName}_{assetProduct}_{version}.usdc"
-        old_file_material_path = r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\Plugins\Custom\laud2\Scripts\materials\basicMaterial_MTL.usdc"
-        save_path = os.path.join(save_dir, new_file_name)
-        
-        import shutil
-        shutil.copy(old_file_material_path, save_path)
-
-        print(f"USDA saved at: {save_path}")
-        return save_path
-    
-    def deleteFileFromPath(self, file_path):
-        try:
-            os.remove(file_path)
-        except FileNotFoundError:
-            print("File not found:", file_path)
-        except PermissionError:
-            print("No permission to delete:", file_path)
-        
     def removePath(self):
         base = os.path.normpath(self.assetPath)
         full = os.path.normpath(self.path)
@@ -667,164 +545,40 @@ class CreateAssetCustomDlg(PrismWidgets.CreateItem):
         return relative.replace(os.sep, "/")
 
     def onLoud2CreateButtonClicked(self):
-        #entity = {'type': 'asset', 'asset_path': 'ASSET NAME'}
-        #metadata = {'sd': {'value': '1', 'show': True}, 's': {'value': 's', 'show': True}, 'a': {'value': 'a', 'show': True}}
-
-        assetName = self.e_item.text().strip()
-        description = self.getDescription()
-        thumbnail = self.getThumbnail()
-
         metValues = self.getDataValues()
-        assetName = self.camelCase(assetName) 
-        assetCoreName = assetName.split("\\")[-1]
+        assetNames = [name.strip() for name in self.e_item.text().split(",") if name.strip()]
 
-        if not assetName:
+        if not assetNames:
             print("No asset name")
             return
 
-        if not description:
-            description = ""
-
-        entity = {
-            'type': 'asset', 
-            'asset_path': f'{assetName}'
-        }
-
-        print(f"Asset created in path: {assetName}")
-
-        # Create Mtl and Geo Variants Names
-
-
-        metadata = {
-                    'isAsset2loud': {
-                        'value': 'True',
-                        'show': False
-                    },
-
-                    'id': {
-                        'value': metValues["id"],
-                        'show': True
-                    },
-
-                    'ch_dependant': {
-                        'value': str(metValues["ch_dependant"]),
-                        'show': True
-                    },
-
-                    'min_cam_distance': {
-                        'value': '',
-                        'show': True
-                    },
-
-                    'path': {
-                        'value': '',
-                        'show': True
-                    },
-
-                    'subdivision': {
-                        'value': str(metValues["subdivision"]),
-                        'show': True
-                    },
-
-                    'geo_variants': {
-                        'value': str(metValues["geoVariants"]),
-                        'show': True
-                    },
-
-                    'geo_names': {
-                        'value': [''],
-                        'show': True
-                    },
-
-                    'texture_size': {
-                        'value': metValues["txSize"],
-                        'show': True
-                    },
-
-                    'mtl_variants': {
-                        'value': str(metValues["mtlVariants"]),
-                        'show': True
-                    },
-
-                    'mtl_names': {
-                        'value': [''],
-                        'show': True
-                    },
-
-                    'asset_type': {
-                        'value': metValues["asset_type"],
-                        'show': False
-                    }
-                }
-
-        result = self.core.entities.createEntity(
-            entity=entity,
-            description=description, 
-            metaData=metadata,
-            preview=thumbnail
+        # One spec per comma separated name, same settings for all
+        specs = [{
+            "name": name,
+            "preset": metValues["asset_type"],
+            "id": metValues["id"],
+            "description": metValues["description"] or "",
+            "ch_dependant": metValues["ch_dependant"],
+            "subdivision": metValues["subdivision"],
+            "geo_variants": metValues["geoVariants"],
+            "mtl_variants": metValues["mtlVariants"],
+            "texture_size": metValues["txSize"],
+            "preview": self.getThumbnail(),
+        } for name in assetNames]
+
+        creator = AssetCreator(
+            self.core,
+            database=operations(plugin_root=DATA_BASE_SCRIPTS),
+            user=os.environ["PRISM_USER"]
         )
-
-        preset = self.taskPreset_combobox.currentText()
-        if preset == "ASSET_STATIC":
-            products = ["asset", "binding", "geometry", "materials", "mesh", "textures"]
-            DEPRATMENT_TASKS = [
-                ["Concept", ["Concept"]], 
-                ["Modeling", ["Variants", "Modeling", "Sculping", "FineDetail"]], 
-                ["Texturing", ["Texturing"]], 
-                ["LookDev", ["LookDev"]]
-            ]
-        elif preset == "ENVIRONMENT":
-            products = ["environment", "sceneassembly"]
-            DEPRATMENT_TASKS = [
-                ["Concept", ["Concept"]], 
-                ["SceneAssembly", ["Assembly"]], 
-                ["MasterLighting", ["Texturing"]]
-            ]
-        
-        filesToDelete = []
-        for prod in products:
-            path = self.core.products.createProduct(entity=entity, product=f"{prod}")
-            print(f"Created product: {prod} {entity}")
-            if prod == "asset":
-                pt = self.saveUsdPathEmpty(assetCoreName, prod, CUSTOM_ASSET_BASIC_USD, "temp", r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\temp")
-                productInfo = self.core.products.ingestProductVersion([pt], entity, prod)
-                self.core.products.updateMasterVersion(productInfo["createdFiles"][0])
-                filesToDelete.append(pt)
-            if prod == "binding":
-                pt = self.saveUsdPathEmpty(assetCoreName, prod, CUSTOM_BINDING_BASIC_USD, "temp", r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\temp")
-                productInfo = self.core.products.ingestProductVersion([pt], entity, prod)
-                self.core.products.updateMasterVersion(productInfo["createdFiles"][0])
-                filesToDelete.append(pt)
-            if prod == "materials":
-                pt = self.saveUsdCopyPath(assetCoreName, prod, "temp", r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\temp")
-                productInfo = self.core.products.ingestProductVersion([pt], entity, prod)
-                self.core.products.updateMasterVersion(productInfo["createdFiles"][0])
-                filesToDelete.append(pt)
-            if prod == "environment":
-                pt = self.saveUsdPathEmpty(assetCoreName, prod, CUSTOM_ASSET_ENVIORMENT_USD, "temp", r"P:\VFX_Project_30\2LOUD\Spotlight\00_Pipeline\temp")
-                productInfo = self.core.products.ingestProductVersion([pt], entity, prod)
-                self.core.products.updateMasterVersion(productInfo["createdFiles"][0])
-                filesToDelete.append(pt)
-
-            print("Prod created")
-
-        for dep in DEPRATMENT_TASKS:
-            self.core.entities.createDepartment(dep[0], entity, createCat=False)
-            for task in dep[1]:
-                self.core.entities.createCategory(entity, dep[0], task)
-
-        for deleteFile in filesToDelete:
-            self.deleteFileFromPath(deleteFile)
+        results = creator.create_batch(specs, on_status=print)
 
         self.core.pb.refreshUI()
-        print(result)
-        print("created custom 2loud asset")
-        print(metadata)
-
-        # Send Metadata to dataBase
-        ops = operations(plugin_root=DATA_BASE_SCRIPTS)
-
-        ops.updateAsset(new=True, asset_name=assetName, asset_metadata=metadata, operationUser=(os.environ["PRISM_USER"]))
 
+        failed = [result for result in results if not result["success"]]
+        if failed:
+            msg = "\n".join(f"{result['name']}: {result['error']}" for result in failed)
+            self.core.popup(f"Unable to create:\n{msg}", title="2Loud Asset Creator", icon=QMessageBox.Critical)
+            return
 
-    
\ No newline at end of file
+        print("created custom 2loud asset")
@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+try:
+    from .asset_registry import open_registry, AssetRegistryError
+except ImportError:
+    from asset_registry import open_registry, AssetRegistryError
+
+# ---------------------------------------------------------------------------
+# Asset location index
+# ---------------------------------------------------------------------------
+# Where every asset lives under 03_Production/Assets: its root folder, its
+# product folders and their master files. Kept in the asset registry
+# database, so every DCC tool shares it, and looked up by name instead of
+# walking the tree over the network.
+#
+# A rescan only lists the folders whose mtime changed since the last one
+# (adding, removing or renaming an entry changes the folder's mtime); all
+# others are one stat. Inside an asset it looks at Export/<product>/master
+# only, never at scene files or older versions.
+
+ASSETS_DIR = ("03_Production", "Assets")
+ASSET_INFO_JSON = ("00_Pipeline", "Assetinfo", "assetInfo.json")
+
+EXPORT_DIR_NAME = "Export"
+MASTER_DIR_NAME = "master"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    name TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    products TEXT NOT NULL,
+    scanned REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scan_dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    entries TEXT NOT NULL
+);
+"""
+
+
+def assets_root_for(project_path):
+    return os.path.join(project_path, *ASSETS_DIR)
+
+
+def asset_info_json_for(project_path):
+    return os.path.join(project_path, *ASSET_INFO_JSON)
+
+
+def _join(rel, name):
+    return f"{rel}/{name}" if rel else name
+
+
+class AssetIndex:
+    """
+    Asset name -> location, in the registry's database. Paths are stored
+    relative to assets_root, so P: and UNC users share one index.
+
+    locate() answers from the index and rescans only when the asset is
+    unknown or its folder is gone, at most once per AssetIndex: names still
+    unknown after that are remembered as missing, so a batch of lookups costs
+    one rescan at most. add() and remove() keep it current when an asset is
+    created or deleted.
+    """
+
+    def __init__(self, registry, assets_root):
+        self.registry = registry
+        self.assets_root = assets_root
+        self.refreshed = False
+        self.missing = set()
+        try:
+            self.registry.connection().executescript(SCHEMA)
+        except sqlite3.Error as e:
+            raise AssetRegistryError(f"Unable to open asset index in {registry.path}: {e}")
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+    def abs_path(self, rel):
+        return os.path.join(self.assets_root, *rel.split("/")) if rel else self.assets_root
+
+    def get(self, name):
+        """
+        {"root", "products": {product: {"dir", "masters": [...]}}} with
+        absolute paths, or None if the index does not know the asset.
+        """
+        row = self.registry.connection().execute(
+            "SELECT root, products FROM locations WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        products = {
+            product: {"dir": self.abs_path(entry["dir"]), "masters": [self.abs_path(m) for m in entry["masters"]]}
+            for product, entry in json.loads(row[1]).items()
+        }
+        return {"root": self.abs_path(row[0]), "products": products}
+
+    def locate(self, name):
+        # Like get(), rescanning first if the asset is unknown or has moved and no lookup rescanned yet
+        if name in self.missing:
+            return None
+        location = self.get(name)
+        if location is None or not os.path.isdir(location["root"]):
+            if not self.refreshed:
+                self.refresh()
+                location = self.get(name)
+            if location is None or not os.path.isdir(location["root"]):
+                self.missing.add(name)
+                return None
+        return location
+
+    def root(self, name):
+        location = self.locate(name)
+        return location["root"] if location else None
+
+    def master_file(self, name, product="asset", extension=None):
+        """
+        Master file of a product, e.g. <name>_asset_master.usda. With no
+        extension the first master found is returned.
+        """
+        location = self.locate(name)
+        if location is None:
+            return None
+        masters = location["products"].get(product, {}).get("masters", [])
+        if extension is not None:
+            masters = [m for m in masters if m.lower().endswith(extension.lower())]
+        if not masters:
+            # Published since the last scan
+            location = self.add(location["root"])
+            masters = [m for m in location["products"].get(product, {}).get("masters", [])
+                       if extension is None or m.lower().endswith(extension.lower())]
+        return masters[0] if masters else None
+
+    def names(self):
+        return [row[0] for row in self.registry.connection().execute("SELECT name FROM locations ORDER BY name")]
+
+    # -------------------------
+    # Maintenance
+    # -------------------------
+    def add(self, root):
+        # Indexes the asset folder at root right away, called once an asset was created
+        rel = os.path.relpath(root, self.assets_root).replace(os.sep, "/")
+        products = self.scan_asset(rel, {})
+        self.missing.discard(os.path.basename(os.path.normpath(root)))
+        with self.registry.transaction() as db:
+            self._write(db, os.path.basename(os.path.normpath(root)), rel, products)
+        return self.get(os.path.basename(os.path.normpath(root)))
+
+    def remove(self, name):
+        # The next refresh() drops the cached listings of its folders
+        with self.registry.transaction() as db:
+            return db.execute("DELETE FROM locations WHERE name = ?", (name,)).rowcount > 0
+
+    def refresh(self, full=False):
+        """
+        Rescans the assets tree and rewrites the index. Folders whose mtime
+        did not change reuse their cached listing unless full. Returns the
+        number of assets found.
+        """
+        cached = {} if full else {
+            path: (mtime_ns, [tuple(e) for e in json.loads(entries)]) for path, mtime_ns, entries
+            in self.registry.connection().execute("SELECT path, mtime_ns, entries FROM scan_dirs")
+        }
+        listings = {}
+        assets = {}
+
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            entries = self.listing(rel, cached, listings)
+            if entries is None:
+                continue
+            subdirs = [name for name, is_dir in entries if is_dir]
+            if rel and EXPORT_DIR_NAME in subdirs:
+                # An asset: do not look further down than its products
+                assets[rel.rsplit("/", 1)[-1]] = (rel, self.scan_asset(rel, cached, listings))
+                continue
+            stack.extend(_join(rel, name) for name in subdirs)
+
+        now = time.time()
+        with self.registry.transaction() as db:
+            db.execute("DELETE FROM scan_dirs")
+            db.executemany("INSERT INTO scan_dirs (path, mtime_ns, entries) VALUES (?, ?, ?)",
+                           [(path, mtime_ns, json.dumps(entries)) for path, (mtime_ns, entries) in listings.items()])
+            db.execute("DELETE FROM locations")
+            for name, (rel, products) in assets.items():
+                self._write(db, name, rel, products, now)
+        self.refreshed = True
+        self.missing.clear()
+        return len(assets)
+
+    def listing(self, rel, cached, listings=None):
+        # [(name, is_dir), ...] of a folder, from cache while its mtime is unchanged
+        path = self.abs_path(rel)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        hit = cached.get(rel)
+        if hit is not None and hit[0] == mtime_ns:
+            entries = hit[1]
+        else:
+            entries = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            entries.append((entry.name, entry.is_dir()))
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"Unable to list {path}: {e}")
+                return None
+        if listings is not None:
+            listings[rel] = (mtime_ns, entries)
+        return entries
+
+    def scan_asset(self, rel, cached, listings=None):
+        # {product: {"dir", "masters"}} of the asset folder rel, paths relative
+        products = {}
+        export = _join(rel, EXPORT_DIR_NAME)
+        for product, is_dir in self.listing(export, cached, listings) or []:
+            if not is_dir:
+                continue
+            product_rel = _join(export, product)
+            masters = []
+            product_entries = self.listing(product_rel, cached, listings) or []
+            if (MASTER_DIR_NAME, True) in product_entries:
+                master_rel = _join(product_rel, MASTER_DIR_NAME)
+                masters = sorted(_join(master_rel, name) for name, is_dir in self.listing(master_rel, cached, listings) or []
+                                 if not is_dir and "_master" in name)
+            products[product] = {"dir": product_rel, "masters": masters}
+        return products
+
+    def _write(self, db, name, rel, products, scanned=None):
+        db.execute("INSERT OR REPLACE INTO locations (name, root, products, scanned) VALUES (?, ?, ?, ?)",
+                   (name, rel, json.dumps(products, separators=(",", ":")), scanned or time.time()))
+
+
+def open_index(project_path):
+    # Index of the project's assets, in the registry next to its assetInfo.json. Raises AssetRegistryError
+    registry = open_registry(asset_info_json_for(project_path))
+    try:
+        return AssetIndex(registry, assets_root_for(project_path))
+    except AssetRegistryError:
+        registry.close()
+        raise
+
+
+def find_asset_root_walk(assets_root, name):
+    # Asset folder by walking the tree, for when the index cannot be opened
+    for root, dirs, files in os.walk(assets_root):
+        if name in dirs:
+            return os.path.join(root, name)
+    return None
+
+
+# -------------------------
+# CLI
+# -------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="2LOUD asset location index")
+    parser.add_argument("project_path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh = sub.add_parser("refresh", help="Rescan the assets tree")
+    refresh.add_argument("--full", action="store_true", help="List every folder again, ignoring the cache")
+    locate = sub.add_parser("locate", help="Print where an asset lives")
+    locate.add_argument("name")
+    args = parser.parse_args(argv)
+
+    try:
+        index = open_index(args.project_path)
+    except AssetRegistryError as e:
+        print(e)
+        return 1
+    try:
+        if args.command == "refresh":
+            start = time.monotonic()
+            count = index.refresh(full=args.full)
+            print(f"Indexed {count} assets in {time.monotonic() - start:.2f}s")
+        elif args.command == "locate":
+            location = index.locate(args.name)
+            if location is None:
+                print(f"No asset named {args.name}")
+                return 1
+            print(json.dumps(location, indent=4))
+    finally:
+        index.registry.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import getpass
+import sqlite3
+import argparse
+import threading
+
+# ---------------------------------------------------------------------------
+# Asset registry
+# ---------------------------------------------------------------------------
+# The asset metadata that used to live in 00_Pipeline/Assetinfo/assetInfo.json,
+# one SQLite row per asset. Reading or changing one asset touches one row
+# instead of loading and rewriting the whole file, and writers take the
+# database lock instead of overwriting each other's changes.
+#
+# Rows hold the same dict the JSON had under "assets"/<name>:
+#   {"metadata": {key: {"value": ..., "show": bool}, ...}}
+# with metadata.asset_type.value copied into an indexed column.
+#
+# The asset database plugin still writes assetInfo.json, so deletes and the
+# changes tools make go to both (delete_from_json, update_json), open_registry
+# imports the JSON again whenever it was written since the last import, and the
+# registry remembers what it deleted: importing the JSON again never brings
+# back a deleted asset or overwrites a newer row.
+#
+# WAL needs shared memory between the processes, which a network share cannot
+# give, so a database on P: or a UNC path keeps the rollback journal.
+
+REGISTRY_FILE_NAME = "assetInfo.db"
+
+JOURNAL_AUTO = "auto"
+JOURNAL_WAL = "wal"
+JOURNAL_DELETE = "delete"
+
+# Seconds a writer waits for another one before giving up
+BUSY_TIMEOUT = 30
+
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p"}
+DRIVE_REMOTE = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    name TEXT PRIMARY KEY,
+    type TEXT,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL,
+    updated_by TEXT
+);
+CREATE INDEX IF NOT EXISTS assets_type ON assets (type);
+CREATE TABLE IF NOT EXISTS deleted (
+    name TEXT PRIMARY KEY,
+    deleted REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imported (
+    name TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class AssetRegistryError(Exception):
+    pass
+
+
+def is_network_path(path):
+    path = os.path.abspath(path)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if os.name == "nt":
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(f"{drive}\\") == DRIVE_REMOTE
+    # Filesystem type of the longest mount point holding the path
+    best, fstype = "", ""
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1]
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > len(best):
+                    best, fstype = mount, fields[2]
+    except OSError:
+        return False
+    return fstype in NETWORK_FILESYSTEMS
+
+
+def registry_path_for(json_path):
+    # The database sits next to the assetInfo.json it replaces
+    return os.path.join(os.path.dirname(json_path), REGISTRY_FILE_NAME)
+
+
+def asset_type(data):
+    try:
+        return data["metadata"]["asset_type"]["value"]
+    except (KeyError, TypeError):
+        return None
+
+
+def _like(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class AssetRegistry:
+    """
+    Asset metadata by name in a SQLite database.
+
+    journal_mode: JOURNAL_WAL lets readers carry on while one process writes,
+    JOURNAL_DELETE is the rollback journal that network shares need, and
+    JOURNAL_AUTO picks between the two by where the database is. One
+    connection per thread; writes are single transactions, so concurrent
+    writers queue for up to BUSY_TIMEOUT seconds instead of losing changes.
+    """
+
+    def __init__(self, path, journal_mode=JOURNAL_AUTO, user=None):
+        self.path = path
+        if journal_mode == JOURNAL_AUTO:
+            journal_mode = JOURNAL_DELETE if is_network_path(path) else JOURNAL_WAL
+        self.journal_mode = journal_mode
+        self.user = user if user is not None else getpass.getuser()
+        self.local = threading.local()
+        try:
+            self.connection().executescript(SCHEMA)
+        except sqlite3.Error as e:
+            raise AssetRegistryError(f"Unable to open asset registry {self.path}: {e}")
+
+    # -------------------------
+    # Connection
+    # -------------------------
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            try:
+                # Autocommit; transaction() opens the transactions explicitly
+                db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+                db.execute(f"PRAGMA journal_mode={self.journal_mode}")
+                if self.journal_mode == JOURNAL_WAL:
+                    db.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.Error as e:
+                raise AssetRegistryError(f"Unable to open asset registry {self.path}: {e}")
+            self.local.db = db
+        return db
+
+    def transaction(self):
+        return _Transaction(self.connection())
+
+    def close(self):
+        db = getattr(self.local, "db", None)
+        if db is not None:
+            db.close()
+            self.local.db = None
+
+    # -------------------------
+    # Reading
+    # -------------------------
+    def get(self, name):
+        row = self.connection().execute("SELECT data FROM assets WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, name):
+        return self.connection().execute("SELECT 1 FROM assets WHERE name = ?", (name,)).fetchone() is not None
+
+    def names(self):
+        return [row[0] for row in self.connection().execute("SELECT name FROM assets ORDER BY name")]
+
+    def all(self):
+        # {name: data} of every asset, the shape of assetInfo.json's "assets"
+        return self._select("")
+
+    def list_by_type(self, type_name):
+        return self._select("WHERE type = ?", (type_name,))
+
+    def search(self, text, type_name=None):
+        # Assets whose name or metadata contains text, case-insensitive
+        where = "WHERE (name LIKE ? ESCAPE '\\' OR data LIKE ? ESCAPE '\\')"
+        args = [_like(text), _like(text)]
+        if type_name is not None:
+            where += " AND type = ?"
+            args.append(type_name)
+        return self._select(where, args)
+
+    def _select(self, where, args=()):
+        rows = self.connection().execute(f"SELECT name, data FROM assets {where} ORDER BY name", args)
+        return {name: json.loads(data) for name, data in rows}
+
+    # -------------------------
+    # Writing
+    # -------------------------
+    def put(self, name, data):
+        with self.transaction() as db:
+            self._write(db, name, data)
+
+    def update(self, name, metadata):
+        """
+        Sets the given metadata keys of one asset, creating it if needed, and
+        returns the asset. Read and write are one transaction, so two users
+        changing different keys of the same asset both keep their change.
+        """
+        with self.transaction() as db:
+            row = db.execute("SELECT data FROM assets WHERE name = ?", (name,)).fetchone()
+            data = json.loads(row[0]) if row else {}
+            data.setdefault("metadata", {}).update(metadata)
+            self._write(db, name, data)
+        return data
+
+    def delete(self, name):
+        # True if the asset was there
+        with self.transaction() as db:
+            db.execute("INSERT OR REPLACE INTO deleted (name, deleted) VALUES (?, ?)", (name, time.time()))
+            return db.execute("DELETE FROM assets WHERE name = ?", (name,)).rowcount > 0
+
+    def _write(self, db, name, data):
+        db.execute(
+            "INSERT OR REPLACE INTO assets (name, type, data, updated, updated_by) VALUES (?, ?, ?, ?, ?)",
+            (name, asset_type(data), json.dumps(data, separators=(",", ":")), time.time(), self.user))
+        db.execute("DELETE FROM deleted WHERE name = ?", (name,))
+
+    # -------------------------
+    # Migration
+    # -------------------------
+    def migrated_from(self):
+        row = self.connection().execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        return row[0] if row else None
+
+    def imported_mtime(self):
+        # mtime of the JSON at the last import, 0 if it was never imported
+        row = self.connection().execute("SELECT value FROM meta WHERE key = 'json_mtime'").fetchone()
+        return float(row[0]) if row else 0.0
+
+    def migrate_json(self, json_path, force=False):
+        """
+        Imports the assets of an assetInfo.json in one transaction. Runs once:
+        returns None if the registry was already migrated, unless force, which
+        imports again. The newer copy wins: assets changed or deleted in the
+        registry since the JSON was last written are left alone, and so are
+        assets whose JSON entry has not changed since it was last imported.
+        Returns the number of assets imported.
+        """
+        if self.migrated_from() and not force:
+            return None
+        try:
+            json_mtime = os.path.getmtime(json_path)
+            with open(json_path, "r", encoding="utf-8") as f:
+                assets = json.load(f).get("assets", {})
+        except (OSError, ValueError) as e:
+            raise AssetRegistryError(f"Unable to read {json_path}: {e}")
+
+        count = 0
+        with self.transaction() as db:
+            changed = dict(db.execute("SELECT name, updated FROM assets"))
+            changed.update(db.execute("SELECT name, deleted FROM deleted"))
+            imported = dict(db.execute("SELECT name, digest FROM imported"))
+            for name, data in assets.items():
+                # Seen once is enough: an entry the JSON still carries unchanged is no news
+                digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+                if imported.get(name) == digest:
+                    continue
+                db.execute("INSERT OR REPLACE INTO imported (name, digest) VALUES (?, ?)", (name, digest))
+                if changed.get(name, 0) >= json_mtime:
+                    continue
+                self._write(db, name, data)
+                count += 1
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (json_path,))
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_mtime', ?)", (repr(json_mtime),))
+        return count
+
+
+def _read_json(json_path):
+    # The whole assetInfo.json, None if there is none
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise AssetRegistryError(f"Unable to read {json_path}: {e}")
+
+
+def _write_json(json_path, data):
+    # Replaced atomically, readers never see half a file
+    tmp_path = f"{json_path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, json_path)
+    except OSError as e:
+        raise AssetRegistryError(f"Unable to write {json_path}: {e}")
+
+
+def delete_from_json(json_path, name):
+    """
+    Removes one asset from an assetInfo.json, for the tools that still read
+    it. True if it was there. The file is replaced atomically.
+    """
+    data = _read_json(json_path)
+    if data is None or name not in data.get("assets", {}):
+        return False
+    del data["assets"][name]
+    _write_json(json_path, data)
+    return True
+
+
+def update_json(json_path, name, metadata):
+    """
+    Sets the given metadata keys of one asset in an assetInfo.json, creating
+    the asset if needed; AssetRegistry.update for the tools that still read
+    the JSON. Call it before the registry's update, so the registry row stays
+    the newer copy. False if there is no JSON to update.
+    """
+    data = _read_json(json_path)
+    if data is None:
+        return False
+    data.setdefault("assets", {}).setdefault(name, {}).setdefault("metadata", {}).update(metadata)
+    _write_json(json_path, data)
+    return True
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front: a read-modify-write cannot
+    # be overtaken by another writer between its read and its write
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            raise AssetRegistryError(f"Asset registry is busy: {e}")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.db.execute("COMMIT")
+        else:
+            self.db.execute("ROLLBACK")
+        return False
+
+
+def open_registry(json_path, journal_mode=JOURNAL_AUTO):
+    """
+    Registry next to json_path. The first open imports the JSON, so tools
+    switch over without a separate migration step, and later opens import it
+    again if it was written since: the asset database plugin still adds its
+    assets there. Only assets newer in the JSON than in the registry are taken.
+    """
+    registry = AssetRegistry(registry_path_for(json_path), journal_mode)
+    try:
+        json_mtime = os.path.getmtime(json_path)
+    except OSError:
+        return registry
+    if not registry.migrated_from() or json_mtime > registry.imported_mtime():
+        count = registry.migrate_json(json_path, force=True)
+        if count:
+            print(f"Asset registry: imported {count} assets from {json_path}")
+    return registry
+
+
+# -------------------------
+# CLI
+# -------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="2LOUD asset registry")
+    parser.add_argument("--db", help="Registry database (default: assetInfo.db next to the JSON)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    migrate = sub.add_parser("migrate", help="Import an assetInfo.json")
+    migrate.add_argument("json_path")
+    migrate.add_argument("--force", action="store_true",
+                         help="Import again; assets changed or deleted in the registry since the JSON was written are kept")
+
+    get = sub.add_parser("get", help="Print one asset")
+    get.add_argument("json_path")
+    get.add_argument("name")
+
+    listing = sub.add_parser("list", help="List assets, optionally of one type or matching a text")
+    listing.add_argument("json_path")
+    listing.add_argument("--type", dest="type_name")
+    listing.add_argument("--search")
+
+    args = parser.parse_args(argv)
+    registry = AssetRegistry(args.db or registry_path_for(args.json_path))
+    try:
+        if args.command == "migrate":
+            count = registry.migrate_json(args.json_path, force=args.force)
+            if count is None:
+                print(f"Already migrated from {registry.migrated_from()}, use --force to import again")
+            else:
+                print(f"Imported {count} assets into {registry.path}")
+        elif args.command == "get":
+            data = registry.get(args.name)
+            if data is None:
+                print(f"No asset named {args.name}")
+                return 1
+            print(json.dumps(data, indent=4))
+        elif args.command == "list":
+            if args.search is not None:
+                assets = registry.search(args.search, args.type_name)
+            elif args.type_name is not None:
+                assets = registry.list_by_type(args.type_name)
+            else:
+                assets = registry.all()
+            for name, data in assets.items():
+                print(f"{name}\t{asset_type(data) or ''}")
+    except AssetRegistryError as e:
+        print(e)
+        return 1
+    finally:
+        registry.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
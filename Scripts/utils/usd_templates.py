@@ -0,0 +1,275 @@
+import os
+import re
+
+try:
+    from pxr import Sdf
+except ImportError:
+    # Only needed to write .usdc: Maya and Houdini have it, Prism's Python does not
+    Sdf = None
+
+# ---------------------------------------------------------------------------
+# USD layer templates
+# ---------------------------------------------------------------------------
+# Templates are .usda files with two kinds of tags:
+#
+#   {{ name }}  {{ variant.material }}                a parameter, or a field of one
+#   {% for variant in mtl_variants %} ... {% endfor %}
+#   {% if subdivision %} ... {% else %} ... {% endif %}    also "if not"
+#
+# A block tag alone on its line takes the line with it. Each template is
+# compiled once per session into a Python function, so rendering is string
+# joins only. Parameters are typed and checked by asset_params(); templates
+# cannot run arbitrary code.
+#
+# TEMPLATES_DIR/<product>.usda is the template of a product, and
+# TEMPLATES_DIR/<asset type>/<product>.usda overrides it for one asset type.
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "usdTemplates")
+TEMPLATE_EXTENSION = ".usda"
+
+MASTER_REDIRECT = "master_redirect"
+
+USD_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_TAG = re.compile(r"(?P<lead>^[ \t]*)?\{%\s*(?P<block>.+?)\s*%\}(?P<trail>[ \t]*\n)?|\{\{\s*(?P<expr>.+?)\s*\}\}",
+                  re.MULTILINE)
+_EXPR = re.compile(r"^(?P<neg>not\s+)?(?P<path>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)$")
+
+
+class TemplateError(Exception):
+    pass
+
+
+# -------------------------
+# Compiler
+# -------------------------
+def _format(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+def _expression(text, loop_vars, template_name):
+    match = _EXPR.match(text.strip())
+    if not match:
+        raise TemplateError(f"{template_name}: unsupported expression {text!r}")
+    first, *fields = match.group("path").split(".")
+    code = f"_{first}" if first in loop_vars else f"params[{first!r}]"
+    code += "".join(f"[{field!r}]" for field in fields)
+    return f"not {code}" if match.group("neg") else code
+
+
+def compile_template(source, template_name="<template>"):
+    """
+    Compiles template source to a function render(params) -> str.
+    Raises TemplateError on a malformed template.
+    """
+    lines = ["def render(params):", "    out = []", "    append = out.append"]
+    stack = []          # open blocks: "for" / "if" / "else"
+    loop_vars = set()
+    pos = 0
+
+    def emit(line):
+        lines.append("    " * (len(stack) + 1) + line)
+
+    for match in _TAG.finditer(source):
+        text = source[pos:match.start()]
+        pos = match.end()
+        expr = match.group("expr")
+        if expr is not None:
+            if text:
+                emit(f"append({text!r})")
+            emit(f"append(_format({_expression(expr, loop_vars, template_name)}))")
+            continue
+
+        # A block tag only swallows its line when it is alone on it
+        lead, trail = match.group("lead"), match.group("trail")
+        if lead is None or trail is None:
+            text += lead or ""
+            if trail:
+                pos -= len(trail)
+        if text:
+            emit(f"append({text!r})")
+
+        words = match.group("block").split()
+        keyword = words[0]
+        if keyword == "for":
+            if len(words) != 4 or words[2] != "in" or not USD_IDENTIFIER.match(words[1]):
+                raise TemplateError(f"{template_name}: expected 'for NAME in EXPR', got {match.group('block')!r}")
+            emit(f"for _{words[1]} in {_expression(words[3], loop_vars, template_name)}:")
+            stack.append(("for", words[1]))
+            loop_vars.add(words[1])
+        elif keyword == "if":
+            emit(f"if {_expression(' '.join(words[1:]), loop_vars, template_name)}:")
+            stack.append(("if", None))
+        elif keyword == "else":
+            if not stack or stack[-1][0] != "if":
+                raise TemplateError(f"{template_name}: else without if")
+            stack.pop()
+            emit("else:")
+            stack.append(("else", None))
+        elif keyword in ("endfor", "endif"):
+            expected = ("for",) if keyword == "endfor" else ("if", "else")
+            if not stack or stack[-1][0] not in expected:
+                raise TemplateError(f"{template_name}: unexpected {keyword}")
+            emit("pass")
+            kind, var = stack.pop()
+            if kind == "for" and all(v != var for _, v in stack):
+                loop_vars.discard(var)
+        else:
+            raise TemplateError(f"{template_name}: unknown tag {keyword!r}")
+
+    if stack:
+        raise TemplateError(f"{template_name}: {stack[-1][0]} block is not closed")
+    if source[pos:]:
+        emit(f"append({source[pos:]!r})")
+    lines.append("    return ''.join(out)")
+
+    namespace = {"_format": _format}
+    try:
+        exec(compile("\n".join(lines), template_name, "exec"), namespace)
+    except SyntaxError as e:
+        raise TemplateError(f"{template_name}: {e}")
+    return namespace["render"]
+
+
+# -------------------------
+# Parameters
+# -------------------------
+def variant_names(count, prefix):
+    return [f"{prefix}{i + 1:02d}" for i in range(count)]
+
+
+def asset_params(name, geo_variants=1, mtl_variants=1, texture_size=1024, subdivision=False):
+    """
+    Typed template parameters of an asset. Names end up as USD prim names
+    and paths, so they must be USD identifiers.
+    """
+    if not USD_IDENTIFIER.match(name or ""):
+        raise TemplateError(f"{name!r} is not a valid USD prim name")
+    geo_variants, mtl_variants, texture_size = int(geo_variants), int(mtl_variants), int(texture_size)
+    if geo_variants < 1 or mtl_variants < 1:
+        raise TemplateError("Variant counts must be at least 1")
+
+    geo = variant_names(geo_variants, "geo")
+    mtl = [{"name": variant, "material": f"{name}_MTL" if i == 0 else f"{name}_{variant}_MTL"}
+           for i, variant in enumerate(variant_names(mtl_variants, "mtl"))]
+    return {
+        "name": name,
+        "texture_size": texture_size,
+        "subdivision": bool(subdivision),
+        "geo_variants": geo,
+        "geo_variant_set": len(geo) > 1,
+        "default_geo_variant": geo[0],
+        "mtl_variants": mtl,
+        "mtl_variant_set": len(mtl) > 1,
+        "default_mtl_variant": mtl[0]["name"],
+        "default_material": mtl[0]["material"],
+    }
+
+
+def with_single_material(params, material):
+    """
+    params for an asset whose materials layer was not rendered from the
+    template and defines only `material`: no mtlVariant set, geometry binds
+    to that material.
+    """
+    variant = {"name": params["default_mtl_variant"], "material": material}
+    return dict(params, mtl_variants=[variant], mtl_variant_set=False, default_material=material)
+
+
+# -------------------------
+# Library
+# -------------------------
+class TemplateLibrary:
+    """
+    The templates of a folder. The folder is listed once and every template
+    compiled on first use; both stay cached for the session, reload() picks
+    up edits. Templates live on the share, so no stat per render.
+    """
+
+    def __init__(self, folder=TEMPLATES_DIR):
+        self.folder = folder
+        self.reload()
+
+    def reload(self):
+        self.paths = {}         # (asset type or None, product) -> path
+        self.compiled = {}      # path -> render function
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError as e:
+            raise TemplateError(f"Unable to list templates in {self.folder}: {e}")
+        for entry in entries:
+            if entry.is_dir():
+                for sub in os.scandir(entry.path):
+                    if sub.name.endswith(TEMPLATE_EXTENSION):
+                        self.paths[(entry.name, sub.name[:-len(TEMPLATE_EXTENSION)])] = sub.path
+            elif entry.name.endswith(TEMPLATE_EXTENSION):
+                self.paths[(None, entry.name[:-len(TEMPLATE_EXTENSION)])] = entry.path
+
+    def path(self, product, asset_type=None):
+        return self.paths.get((asset_type, product)) or self.paths.get((None, product))
+
+    def has(self, product, asset_type=None):
+        return self.path(product, asset_type) is not None
+
+    def template(self, product, asset_type=None):
+        path = self.path(product, asset_type)
+        if path is None:
+            raise TemplateError(f"No template for {product}")
+        render = self.compiled.get(path)
+        if render is None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    source = f.read()
+            except OSError as e:
+                raise TemplateError(f"Unable to read template {path}: {e}")
+            render = self.compiled[path] = compile_template(source, os.path.relpath(path, self.folder))
+        return render
+
+    def render(self, product, params, asset_type=None):
+        try:
+            return self.template(product, asset_type)(params)
+        except KeyError as e:
+            raise TemplateError(f"Template {product} needs parameter {e}")
+
+    def render_asset(self, products, params, asset_type=None):
+        # {product: usda text} of every product that has a template
+        return {product: self.render(product, params, asset_type) for product in products
+                if self.has(product, asset_type)}
+
+    def write(self, product, params, path, asset_type=None):
+        write_layer(self.render(product, params, asset_type), path)
+
+
+_default_library = None
+
+
+def default_library():
+    # Library of TEMPLATES_DIR shared by the whole session
+    global _default_library
+    if _default_library is None:
+        _default_library = TemplateLibrary()
+    return _default_library
+
+
+def can_write_usdc():
+    return Sdf is not None
+
+
+def write_layer(text, path):
+    """
+    Writes usda text to path: as is for .usda, converted to the binary
+    crate format for .usdc (needs pxr).
+    """
+    if not path.lower().endswith(".usdc"):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return
+    if Sdf is None:
+        raise TemplateError(f"Writing {os.path.basename(path)} needs the USD Python bindings (pxr)")
+    layer = Sdf.Layer.CreateAnonymous(TEMPLATE_EXTENSION)
+    if not layer.ImportFromString(text):
+        raise TemplateError(f"Rendered layer for {os.path.basename(path)} is not valid USD")
+    if not layer.Export(path):
+        raise TemplateError(f"Unable to write {path}")